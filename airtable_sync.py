@@ -0,0 +1,141 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from logs import get_logger
+from metrics import span
+
+log = get_logger("airtable_sync")
+
+# Re-fetch a few seconds of history on every incremental sync so edits that
+# land while a sync is in flight are never missed.
+SYNC_OVERLAP_SECONDS = 5
+
+
+def modified_since_formula(since: datetime) -> str:
+    """Airtable formula matching rows modified after `since` (UTC)"""
+    stamp = since.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+    return f"IS_AFTER(LAST_MODIFIED_TIME(), DATETIME_PARSE('{stamp}'))"
+
+
+class TableSync:
+    """
+    Keeps an in-memory copy of an Airtable table.
+
+    The first sync pages through the whole table; later syncs only fetch rows
+    whose LAST_MODIFIED_TIME() is newer than the previous sync. Incremental
+    syncs can't see deletions, so a full sync is forced every
+    `full_sync_interval` seconds.
+    """
+
+    def __init__(self, get_table, fields=None, full_sync_interval=900):
+        self._get_table = get_table
+        self.fields = fields
+        self.full_sync_interval = full_sync_interval
+
+        self.records = {}
+        self.synced_at = 0.0
+        self.full_synced_at = 0.0
+        self._since = None
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    def on_change(self, listener):
+        """Register `listener(changed_records, full)` to run after each sync"""
+        self._listeners.append(listener)
+
+    def sync(self, full=False, max_age=None):
+        """
+        Fetch changes from Airtable. Returns the list of changed records.
+
+        With `max_age`, a caller that waited for the lock while another
+        sync ran relies on that sync instead of starting its own: if the
+        copy is younger than `max_age` once the lock is held, nothing is
+        fetched and [] is returned.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if max_age is not None and not full and self.synced_at and now - self.synced_at < max_age:
+                return []
+            if self._since is None or now - self.full_synced_at >= self.full_sync_interval:
+                full = True
+
+            started = datetime.now(timezone.utc)
+            table = self._get_table()
+            if full:
+                with span("airtable", "sync_full"):
+                    fetched = table.all(fields=self.fields)
+                self.records = {rec["id"]: rec for rec in fetched}
+                self.full_synced_at = now
+            else:
+                formula = modified_since_formula(self._since)
+                with span("airtable", "sync_incremental"):
+                    fetched = table.all(formula=formula, fields=self.fields)
+                for rec in fetched:
+                    self.records[rec["id"]] = rec
+
+            self._since = started - timedelta(seconds=SYNC_OVERLAP_SECONDS)
+            self.synced_at = now
+
+        for listener in self._listeners:
+            listener(fetched, full)
+        return fetched
+
+    def invalidate(self, full=False):
+        """Mark the copy as expired; `full=True` also forgets the sync cursor"""
+        with self._lock:
+            self.synced_at = 0.0
+            if full:
+                self._since = None
+                self.full_synced_at = 0.0
+
+    @property
+    def age(self):
+        if not self.synced_at:
+            return float("inf")
+        return time.monotonic() - self.synced_at
+
+
+class CachedTable:
+    """
+    TTL cache with stale-while-revalidate on top of a TableSync.
+
+    Within `ttl` seconds of the last sync reads are served from memory.
+    Up to `stale_ttl` seconds past that, the stale copy is still served while a
+    background thread syncs; beyond it the caller waits for a fresh sync.
+    """
+
+    def __init__(self, sync: TableSync, ttl=60, stale_ttl=600):
+        self.sync = sync
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._refreshing = threading.Lock()
+
+    def ensure_fresh(self):
+        age = self.sync.age
+        if age < self.ttl:
+            return
+        if age < self.ttl + self.stale_ttl:
+            self.refresh_in_background()
+            return
+        # Concurrent callers queue on the sync lock; all but the first find
+        # the copy fresh and return without fetching
+        self.sync.sync(max_age=self.ttl)
+
+    def refresh_in_background(self):
+        if not self._refreshing.acquire(blocking=False):
+            return False
+
+        def run():
+            try:
+                self.sync.sync(max_age=self.ttl)
+            except Exception as e:
+                log.warning("Background Airtable sync failed", error=str(e))
+            finally:
+                self._refreshing.release()
+
+        threading.Thread(target=run, daemon=True).start()
+        return True
+
+    def invalidate(self, full=False):
+        self.sync.invalidate(full=full)
@@ -0,0 +1,119 @@
+"""
+Per-contract CPU time: python-docx construction vs the compiled templates,
+and in-process PDF rendering vs converting the .docx with LibreOffice
+(when soffice is installed).
+
+    python bench/contract_render.py --iterations 200
+"""
+import argparse
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from docx import Document
+
+from contract import (
+    build_document, contract_engine, contract_values, convert_number_to_words, get_contract_type,
+    pdf_renderer, render_contract,
+)
+
+RECORD = {
+    "contractor_name": "Bella Kotak",
+    "signer_name": "",
+    "relationship_to_vendor": "Self",
+    "address": "123 Main St, San Francisco, CA 94102",
+    "email": "bella@example.com",
+    "vendor_account": "Needed",
+    "service": "Video Production",
+    "amount": "5000",
+    "due_date": "December 31, 2025",
+    "end_date": "December 31, 2025",
+    "number_of_content": "3",
+    "contract_type": "regular",
+    "po": "",
+}
+
+
+def render_python_docx(fields):
+    num_text = convert_number_to_words(fields.get("number_of_content", 1))
+    doc = build_document(get_contract_type(fields), fields, num_text)
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def paragraphs(docx_bytes):
+    doc = Document(io.BytesIO(docx_bytes))
+    return [(p.text, [r.bold for r in p.runs]) for p in doc.paragraphs]
+
+
+def cpu_time_per_call(fn, fields, iterations):
+    fn(fields)
+    started = time.process_time()
+    for _ in range(iterations):
+        fn(fields)
+    return (time.process_time() - started) / iterations
+
+
+def render_pdf(fields):
+    return pdf_renderer.render(get_contract_type(fields), contract_values(fields))
+
+
+def converter_seconds_per_call(soffice, fields, iterations):
+    with tempfile.TemporaryDirectory() as workdir:
+        docx_path = os.path.join(workdir, "contract.docx")
+        with open(docx_path, "wb") as f:
+            f.write(render_contract(fields))
+        started = time.perf_counter()
+        for _ in range(iterations):
+            subprocess.run(
+                [soffice, "--headless", "--convert-to", "pdf", "--outdir", workdir, docx_path],
+                check=True, capture_output=True,
+            )
+        return (time.perf_counter() - started) / iterations
+
+
+def run():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--converter-iterations", type=int, default=3)
+    args = parser.parse_args()
+    soffice = shutil.which("soffice") or shutil.which("libreoffice")
+
+    started = time.perf_counter()
+    contract_engine.warm()
+    print(f"template compile (all variants): {(time.perf_counter() - started) * 1000:.1f}ms")
+
+    for contract_type in ("regular", "campfire"):
+        fields = dict(RECORD, contract_type=contract_type)
+        if paragraphs(render_python_docx(fields)) != paragraphs(render_contract(fields)):
+            raise SystemExit(f"{contract_type}: compiled template output differs from python-docx")
+
+        legacy = cpu_time_per_call(render_python_docx, fields, args.iterations)
+        compiled = cpu_time_per_call(render_contract, fields, args.iterations)
+        print(
+            f"{contract_type:<9} python-docx {legacy * 1000:7.2f}ms  "
+            f"compiled {compiled * 1000:6.3f}ms  speedup {legacy / compiled:6.1f}x"
+        )
+
+        started = time.perf_counter()
+        for _ in range(args.iterations):
+            render_pdf(fields)
+        pdf = (time.perf_counter() - started) / args.iterations
+        line = f"{contract_type:<9} pdf (reportlab) {pdf * 1000:7.2f}ms"
+        if soffice:
+            converted = converter_seconds_per_call(soffice, fields, args.converter_iterations)
+            line += f"  docx->pdf via soffice {converted * 1000:8.1f}ms  speedup {converted / pdf:6.1f}x"
+        else:
+            line += "  (soffice not installed, converter not measured)"
+        print(line)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,393 @@
+"""
+Local stand-ins for the services the backend talks to, for benchmarks.
+
+One threaded HTTP server answers:
+
+* the Airtable REST API (list/get/create/update/upsert records) under /v0/,
+  with per-base rate limiting (429 like the real API) and injected latency;
+* the Drive v3 resumable upload protocol under /upload/drive/v3/files and
+  file deletes under /drive/v3/files/;
+* invoice PDFs of a fixed size under /pdf/<name>.pdf.
+
+Point the app at it with AIRTABLE_ENDPOINT_URL=http://127.0.0.1:<port> and
+GDRIVE_API_ROOT=http://127.0.0.1:<port>/ (see bench/run.py).
+
+    python bench/fakes.py --port 8790 --latency 0.1 --rate 5
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Table ids the benchmark configures the app with
+CONTRACTORS_TABLE = "tbl5Tl74DBlHg2805"
+PAYMENTS_TABLE = "tblBenchPayments"
+MEMBERS_TABLE = "tblBenchMembers"
+ORDERS_TABLE = "tblBenchOrders"
+
+PAGE_SIZE = 100
+
+EQ_RE = re.compile(r"(\{[^}]+\}|RECORD_ID\(\))\s*=\s*'((?:[^'\\]|\\.)*)'")
+AFTER_RE = re.compile(r"IS_AFTER\(LAST_MODIFIED_TIME\(\), DATETIME_PARSE\('([^']+)'\)\)")
+
+
+def seed_records(contractors=500, members=200, orders=50):
+    """Deterministic sample data, shared with the scenario scripts"""
+    tables = {
+        CONTRACTORS_TABLE: [
+            {
+                "Summary": f"Bench Contractor {i}",
+                "Email (from Community Member)": [f"member{i % members}@bench.test"],
+                "Date": "2025-01-31",
+                "Status": ["Active", "Pending", "Done"][i % 3],
+                "PO": f"PO-{i % orders}",
+                "Rate Formula": 100 + i,
+            }
+            for i in range(contractors)
+        ],
+        MEMBERS_TABLE: [
+            {"Email (from Community Member)": [f"member{i}@bench.test"], "Status": "Active"}
+            for i in range(members)
+        ],
+        ORDERS_TABLE: [{"Orders": f"PO-{i}", "Balance": 1_000_000} for i in range(orders)],
+        PAYMENTS_TABLE: [],
+    }
+    return tables
+
+
+class FakeAirtable:
+    def __init__(self, tables, rate=5.0, burst=5):
+        self.tables = {}
+        self.lock = threading.Lock()
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        now = time.time()
+        for table, rows in tables.items():
+            self.tables[table] = {}
+            for n, fields in enumerate(rows):
+                record_id = f"rec{table[-6:]}{n:06d}"
+                self.tables[table][record_id] = self._record(record_id, fields, now)
+
+    @staticmethod
+    def _record(record_id, fields, modified):
+        return {
+            "id": record_id,
+            "createdTime": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            "fields": dict(fields),
+            "_modified": modified,
+        }
+
+    @staticmethod
+    def public(record, fields=None):
+        out = {k: v for k, v in record.items() if k != "_modified"}
+        if fields:
+            out["fields"] = {k: v for k, v in record["fields"].items() if k in fields}
+        return out
+
+    def allow(self, base):
+        """Token bucket per base, like Airtable's 5 requests/second"""
+        if not self.rate:
+            return True
+        with self.lock:
+            tokens, stamp = self.buckets.get(base, (self.burst, time.monotonic()))
+            now = time.monotonic()
+            tokens = min(self.burst, tokens + (now - stamp) * self.rate)
+            if tokens < 1:
+                self.buckets[base] = (tokens, now)
+                return False
+            self.buckets[base] = (tokens - 1, now)
+            return True
+
+    def table(self, table_id):
+        with self.lock:
+            return self.tables.setdefault(table_id, {})
+
+    @staticmethod
+    def matches(record, formula):
+        if not formula:
+            return True
+        after = AFTER_RE.search(formula)
+        if after:
+            since = datetime.strptime(after.group(1), "%Y-%m-%dT%H:%M:%S.%fZ").replace(tzinfo=timezone.utc)
+            return record["_modified"] > since.timestamp()
+        for target, raw in EQ_RE.findall(formula):
+            value = re.sub(r"\\(.)", r"\1", raw)
+            if target == "RECORD_ID()":
+                if record["id"] == value:
+                    return True
+                continue
+            current = record["fields"].get(target[1:-1])
+            if current == value or (isinstance(current, list) and value in current):
+                return True
+        return False
+
+    def list(self, table_id, formula=None, fields=None, offset=0, max_records=None, page_size=PAGE_SIZE):
+        with self.lock:
+            rows = [r for r in self.tables.get(table_id, {}).values() if self.matches(r, formula)]
+        if max_records:
+            rows = rows[:int(max_records)]
+        page = rows[offset:offset + page_size]
+        body = {"records": [self.public(r, fields) for r in page]}
+        if offset + page_size < len(rows):
+            body["offset"] = str(offset + page_size)
+        return body
+
+    def create(self, table_id, fields):
+        record_id = f"rec{uuid.uuid4().hex[:14]}"
+        record = self._record(record_id, fields, time.time())
+        with self.lock:
+            self.tables.setdefault(table_id, {})[record_id] = record
+        return self.public(record)
+
+    def update(self, table_id, record_id, fields):
+        with self.lock:
+            record = self.tables.get(table_id, {}).get(record_id)
+            if record is None:
+                return None
+            record["fields"].update(fields)
+            record["_modified"] = time.time()
+            return self.public(record)
+
+    def upsert(self, table_id, records, merge_on):
+        out, created, updated = [], [], []
+        for rec in records:
+            key = tuple(rec["fields"].get(f) for f in merge_on)
+            with self.lock:
+                existing = next(
+                    (r for r in self.tables.setdefault(table_id, {}).values()
+                     if tuple(r["fields"].get(f) for f in merge_on) == key),
+                    None,
+                )
+            if existing:
+                out.append(self.update(table_id, existing["id"], rec["fields"]))
+                updated.append(existing["id"])
+            else:
+                new = self.create(table_id, rec["fields"])
+                out.append(new)
+                created.append(new["id"])
+        return {"records": out, "createdRecords": created, "updatedRecords": updated}
+
+
+class FakeDrive:
+    def __init__(self):
+        self.sessions = {}
+        self.files = {}
+        self.lock = threading.Lock()
+
+    def start(self, metadata):
+        upload_id = uuid.uuid4().hex
+        with self.lock:
+            self.sessions[upload_id] = {"metadata": metadata, "data": bytearray()}
+        return upload_id
+
+    def put(self, upload_id, content_range, body):
+        """Returns (status, headers, payload) for one chunk of a resumable upload"""
+        with self.lock:
+            session = self.sessions.get(upload_id)
+        if session is None:
+            return 404, {}, {"error": {"code": 404, "message": "Upload session not found"}}
+
+        match = re.match(r"bytes (\d+)-(\d+)/(\d+|\*)", content_range or "")
+        total = None
+        if match:
+            start = int(match.group(1))
+            del session["data"][start:]
+            session["data"] += body
+            total = None if match.group(3) == "*" else int(match.group(3))
+        elif content_range and content_range.startswith("bytes */"):
+            total = int(content_range.split("/")[1])
+        else:
+            session["data"] += body
+            total = len(session["data"])
+
+        if total is None or len(session["data"]) < total:
+            headers = {"Range": f"bytes=0-{len(session['data']) - 1}"} if session["data"] else {}
+            return 308, headers, None
+
+        file_id = uuid.uuid4().hex[:20]
+        data = bytes(session["data"])
+        with self.lock:
+            self.sessions.pop(upload_id, None)
+            self.files[file_id] = len(data)
+        return 200, {}, {
+            "id": file_id,
+            "webViewLink": f"https://drive.bench.test/file/d/{file_id}/view",
+            "md5Checksum": hashlib.md5(data).hexdigest(),
+            "size": str(len(data)),
+        }
+
+
+def make_handler(airtable, drive, latency, jitter, pdf_bytes, stats):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _delay(self):
+            if latency:
+                time.sleep(max(0.0, random.gauss(latency, latency * jitter)))
+
+        def _send(self, status, payload=None, headers=None, raw=None, content_type="application/json"):
+            body = raw if raw is not None else (json.dumps(payload).encode() if payload is not None else b"")
+            self.send_response(status)
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            with airtable.lock:
+                stats[status] = stats.get(status, 0) + 1
+
+        def _body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return self.rfile.read(length) if length else b""
+
+        def _json(self):
+            raw = self._body()
+            return json.loads(raw) if raw else {}
+
+        # ---------- routing ----------
+        def do_GET(self):
+            self._route("GET")
+
+        def do_POST(self):
+            self._route("POST")
+
+        def do_PATCH(self):
+            self._route("PATCH")
+
+        def do_PUT(self):
+            self._route("PUT")
+
+        def do_DELETE(self):
+            self._route("DELETE")
+
+        def _route(self, method):
+            url = urlsplit(self.path)
+            query = parse_qs(url.query)
+            parts = [p for p in url.path.split("/") if p]
+            try:
+                if parts[:1] == ["v0"] and len(parts) >= 3:
+                    return self._airtable(method, parts[1], parts[2], parts[3:], query)
+                if url.path.startswith("/upload/drive/v3/files"):
+                    return self._drive_upload(method, query)
+                if parts[:3] == ["drive", "v3", "files"] and method == "DELETE":
+                    self._delay()
+                    return self._send(204)
+                if parts[:1] == ["pdf"] and method == "GET":
+                    self._delay()
+                    return self._send(200, raw=pdf_bytes, content_type="application/pdf")
+                if parts == ["stats"]:
+                    return self._send(200, {"responses": stats, "drive_files": len(drive.files)})
+            except Exception as e:
+                return self._send(500, {"error": {"type": "BENCH_FAKE_ERROR", "message": str(e)}})
+            self._send(404, {"error": "NOT_FOUND"})
+
+        def _airtable(self, method, base, table, rest, query):
+            body = self._json() if method in ("POST", "PATCH") else {}
+            if not airtable.allow(base):
+                return self._send(429, {"errors": [{"error": "RATE_LIMIT_REACHED"}]})
+            self._delay()
+
+            if method == "GET" and not rest or method == "POST" and rest == ["listRecords"]:
+                options = body if method == "POST" else {
+                    "filterByFormula": (query.get("filterByFormula") or [None])[0],
+                    "fields": query.get("fields[]"),
+                    "offset": (query.get("offset") or [0])[0],
+                    "maxRecords": (query.get("maxRecords") or [None])[0],
+                    "pageSize": (query.get("pageSize") or [PAGE_SIZE])[0],
+                }
+                return self._send(200, airtable.list(
+                    table,
+                    formula=options.get("filterByFormula"),
+                    fields=options.get("fields"),
+                    offset=int(options.get("offset") or 0),
+                    max_records=options.get("maxRecords"),
+                    page_size=int(options.get("pageSize") or PAGE_SIZE),
+                ))
+            if method == "GET" and len(rest) == 1:
+                record = airtable.table(table).get(rest[0])
+                if record is None:
+                    return self._send(404, {"error": "NOT_FOUND"})
+                return self._send(200, airtable.public(record))
+            if method == "POST" and not rest:
+                if "records" in body:
+                    return self._send(200, {"records": [airtable.create(table, r["fields"]) for r in body["records"]]})
+                return self._send(200, airtable.create(table, body.get("fields", {})))
+            if method == "PATCH" and not rest:
+                if "performUpsert" in body:
+                    merge_on = body["performUpsert"]["fieldsToMergeOn"]
+                    return self._send(200, airtable.upsert(table, body["records"], merge_on))
+                updated = [airtable.update(table, r["id"], r["fields"]) for r in body["records"]]
+                if any(r is None for r in updated):
+                    return self._send(422, {"error": {"type": "ROW_DOES_NOT_EXIST"}})
+                return self._send(200, {"records": updated})
+            if method == "PATCH" and len(rest) == 1:
+                updated = airtable.update(table, rest[0], body.get("fields", {}))
+                if updated is None:
+                    return self._send(404, {"error": "NOT_FOUND"})
+                return self._send(200, updated)
+            return self._send(404, {"error": "NOT_FOUND"})
+
+        def _drive_upload(self, method, query):
+            upload_id = (query.get("upload_id") or [None])[0]
+            if method == "POST" and upload_id is None:
+                metadata = self._json()
+                self._delay()
+                upload_id = drive.start(metadata)
+                host = self.headers.get("Host")
+                location = f"http://{host}/upload/drive/v3/files?uploadType=resumable&upload_id={upload_id}"
+                return self._send(200, {}, headers={"Location": location})
+            if method == "PUT" and upload_id:
+                chunk = self._body()
+                self._delay()
+                status, headers, payload = drive.put(upload_id, self.headers.get("Content-Range"), chunk)
+                return self._send(status, payload, headers=headers)
+            return self._send(400, {"error": {"code": 400, "message": "Unsupported upload request"}})
+
+    return Handler
+
+
+def serve(port, latency=0.05, jitter=0.2, rate=5.0, burst=5, pdf_size=200_000, seed=None):
+    """Start the fake server on a background thread; returns the server"""
+    airtable = FakeAirtable(seed or seed_records(), rate=rate, burst=burst)
+    drive = FakeDrive()
+    pdf_bytes = b"%PDF-1.4\n" + random.Random(0).randbytes(max(0, pdf_size - 9))
+    handler = make_handler(airtable, drive, latency, jitter, pdf_bytes, {})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--latency", type=float, default=0.05, help="mean seconds added to every call")
+    parser.add_argument("--jitter", type=float, default=0.2, help="latency std-dev as a fraction of the mean")
+    parser.add_argument("--rate", type=float, default=5.0, help="Airtable requests/second per base (0 = unlimited)")
+    parser.add_argument("--burst", type=int, default=5)
+    parser.add_argument("--pdf-size", type=int, default=200_000)
+    args = parser.parse_args()
+
+    serve(args.port, args.latency, args.jitter, args.rate, args.burst, args.pdf_size)
+    print(f"Fake Airtable/Drive listening on http://127.0.0.1:{args.port}", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,130 @@
+"""
+Startup cost budget: how long `import main` takes in a fresh interpreter,
+which modules it spends that time on, and how long uvicorn takes to answer
+its first request.
+
+Exits non-zero if the import is over --budget-ms, or if it loads one of
+the libraries that are meant to be imported on first use (pyairtable,
+googleapiclient, python-docx, reportlab), so it can run as a CI check.
+
+    python bench/import_budget.py
+    python bench/import_budget.py --budget-ms 800 --top 15 --serve
+"""
+import argparse
+import http.client
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded by warmup or on first use, never by `import main`
+LAZY_MODULES = ["pyairtable", "googleapiclient", "docx", "reportlab"]
+
+IMPORTTIME_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def app_env(workdir):
+    env = dict(os.environ)
+    env.update({
+        "LOG_LEVEL": "WARNING",
+        "JOBS_DB_PATH": os.path.join(workdir, "jobs.db"),
+        "PO_LEDGER_DB_PATH": os.path.join(workdir, "po_ledger.db"),
+        "AIRTABLE_RATE_LIMIT_DB": os.path.join(workdir, "ratelimit.db"),
+        "CONTRACT_INDEX_PATH": os.path.join(workdir, "contract_index.db"),
+        "GENERATED_CONTRACTS_DIR": os.path.join(workdir, "generated_contracts"),
+    })
+    return env
+
+
+def measure_import(env):
+    """(total µs, [(cumulative µs, self µs, depth, module)], names of LAZY_MODULES that were loaded)"""
+    code = f"import main, sys; print(' '.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    modules = []
+    total = 0
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        if name == "main":
+            total = int(cumulative_us)
+        modules.append((int(cumulative_us), int(self_us), (len(indent) - 1) // 2, name))
+    loaded = proc.stdout.split()
+    return total, modules, loaded
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_serve(env, timeout=30.0):
+    """Seconds from starting uvicorn until GET / returns"""
+    port = free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+                conn.request("GET", "/")
+                conn.getresponse().read()
+                return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError(f"uvicorn did not answer within {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=1000, help="max time for `import main`")
+    parser.add_argument("--top", type=int, default=10, help="top-level imports to list")
+    parser.add_argument("--runs", type=int, default=3, help="imports to time; the fastest counts")
+    parser.add_argument("--serve", action="store_true", help="also time uvicorn startup to the first response")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="import-budget-") as workdir:
+        env = app_env(workdir)
+        best = None
+        for _ in range(args.runs):
+            result = measure_import(env)
+            if best is None or result[0] < best[0]:
+                best = result
+        total, modules, loaded = best
+
+        print(f"import main: {total / 1000:.0f} ms (budget {args.budget_ms:.0f} ms, best of {args.runs})")
+        direct = sorted((m for m in modules if m[2] == 1), reverse=True)
+        for cumulative_us, self_us, _, name in direct[:args.top]:
+            print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+        if args.serve:
+            print(f"uvicorn first response: {measure_serve(env) * 1000:.0f} ms")
+
+    failed = False
+    if total / 1000 > args.budget_ms:
+        print(f"FAIL: import main is over budget by {total / 1000 - args.budget_ms:.0f} ms")
+        failed = True
+    if loaded:
+        print(f"FAIL: import main loads {', '.join(loaded)}; these should be imported on first use")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,349 @@
+"""
+Benchmark scenarios against a real uvicorn server and local stand-ins.
+
+Starts bench/fakes.py (Airtable, Drive and the invoice PDF host) and the
+app in subprocesses, drives each scenario at the given concurrency, and
+prints throughput and latency percentiles. `--json` / `--csv` write the
+same numbers for comparing runs.
+
+    python bench/run.py --scenario invoice --concurrency 16 --duration 20
+    python bench/run.py --scenario all --json bench.json --csv bench.csv
+
+Scenarios:
+    contractors        GET /contractors?limit=50 (cached directory reads)
+    generate-contract  POST /generate-contract (distinct records unless --contract-cache hit)
+    invoice            POST /invoice against seeded members and POs
+    home               GET / only; with --probe this is what the other scenarios measure alongside
+"""
+import argparse
+import csv
+import http.client
+import itertools
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from fakes import CONTRACTORS_TABLE, MEMBERS_TABLE, ORDERS_TABLE, PAYMENTS_TABLE  # noqa: E402
+
+SEED_MEMBERS = 200
+SEED_ORDERS = 50
+
+CONTRACT_RECORD = {
+    "contractor_name": "Bench Contractor",
+    "signer_name": "Bench Signer",
+    "relationship_to_vendor": "Self",
+    "address": "1 Bench Street, Testville",
+    "email": "contractor@bench.test",
+    "vendor_account": "V-0001",
+    "service": "Community management",
+    "amount": "1000",
+    "due_date": "2025-02-28",
+    "end_date": "2025-12-31",
+    "number_of_content": 3,
+    "contract_type": "regular",
+    "po": "PO-1",
+}
+
+
+# ---------- process management ----------
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(port, path="/", timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", path)
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Nothing answered on port {port} within {timeout}s")
+
+
+def app_env(fake_port, workdir, extra):
+    fake = f"http://127.0.0.1:{fake_port}"
+    env = dict(os.environ)
+    env.update({
+        "AIRTABLE_API_KEY": "keyBench",
+        "AIRTABLE_ENDPOINT_URL": fake,
+        "AIRTABLE_BASE_1": "appBenchPayments",
+        "AIRTABLE_TABLE_1": PAYMENTS_TABLE,
+        "AIRTABLE_BASE_2": "appBenchMembers",
+        "AIRTABLE_TABLE_2": MEMBERS_TABLE,
+        "AIRTABLE_TABLE_3": ORDERS_TABLE,
+        "GDRIVE_API_ROOT": f"{fake}/",
+        "GDRIVE_OAUTH_TOKEN_JSON": json.dumps({
+            "token": "bench",
+            "refresh_token": "bench",
+            "client_id": "bench",
+            "client_secret": "bench",
+            "token_uri": f"{fake}/token",
+            "expiry": "2099-01-01T00:00:00Z",
+        }),
+        "JOBS_DB_PATH": os.path.join(workdir, "jobs.db"),
+        "PO_LEDGER_DB_PATH": os.path.join(workdir, "po_ledger.db"),
+        "AIRTABLE_RATE_LIMIT_DB": os.path.join(workdir, "ratelimit.db"),
+        "CONTRACT_INDEX_PATH": os.path.join(workdir, "contract_index.db"),
+        "GENERATED_CONTRACTS_DIR": os.path.join(workdir, "generated_contracts"),
+        "LOG_LEVEL": "WARNING",
+    })
+    env.update(extra)
+    return env
+
+
+def start(args, workdir):
+    fake_port = free_port()
+    fakes = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, "fakes.py"), "--port", str(fake_port),
+         "--latency", str(args.latency), "--rate", str(args.airtable_rate), "--pdf-size", str(args.pdf_size)],
+        stdout=subprocess.DEVNULL,
+    )
+    wait_for(fake_port, "/stats")
+
+    extra = dict(pair.split("=", 1) for pair in args.app_env)
+    app = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port),
+         "--workers", str(args.workers), "--log-level", "warning", "--no-access-log"],
+        cwd=ROOT,
+        env=app_env(fake_port, workdir, extra),
+    )
+    wait_for(args.port, "/", timeout=60)
+    return fakes, app, fake_port
+
+
+def stop(*procs):
+    for proc in procs:
+        if proc and proc.poll() is None:
+            proc.send_signal(signal.SIGINT)
+    for proc in procs:
+        if proc:
+            try:
+                proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+# ---------- load generation ----------
+def request(port, method, path, body=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=300)
+    headers = {"Content-Type": "application/json"} if body is not None else {}
+    started = time.perf_counter()
+    try:
+        conn.request(method, path, body=body, headers=headers)
+        resp = conn.getresponse()
+        payload = resp.read()
+        status = resp.status
+        # Handlers that catch their own errors answer 200 {"status": "error"}
+        if status == 200 and payload[:1] == b"{":
+            try:
+                if json.loads(payload).get("status") == "error":
+                    status = 599
+            except ValueError:
+                pass
+    except OSError:
+        status = 0
+    finally:
+        conn.close()
+    return time.perf_counter() - started, status
+
+
+def scenario_requests(name, args):
+    """Endless iterator of (method, path, body) for a scenario"""
+    counter = itertools.count()
+    if name == "home":
+        return (("GET", "/", None) for _ in counter)
+    if name == "contractors":
+        return (("GET", "/contractors?limit=50", None) for _ in counter)
+    if name == "generate-contract":
+        def contracts():
+            for n in counter:
+                record = dict(CONTRACT_RECORD)
+                if args.contract_cache == "miss":
+                    record["vendor_account"] = f"V-{os.getpid()}-{n}"
+                yield "POST", "/generate-contract", json.dumps({"record": record})
+        return contracts()
+    if name == "invoice":
+        suffix = "?mode=async" if args.invoice_mode == "async" else ""
+
+        def invoices():
+            for n in counter:
+                yield "POST", f"/invoice{suffix}", json.dumps({
+                    "paymentName": f"Bench invoice {n}",
+                    "invoiceDate": "2025-01-31",
+                    "description": "bench",
+                    "totalPayment": 1,
+                    "purchaseOrder": f"PO-{n % SEED_ORDERS}",
+                    "email": f"member{n % SEED_MEMBERS}@bench.test",
+                    "invoicePdfUrl": f"http://127.0.0.1:{args.fake_port}/pdf/{n}.pdf",
+                })
+        return invoices()
+    raise ValueError(f"Unknown scenario {name!r}")
+
+
+def drive_load(port, requests, concurrency, duration, max_requests=None):
+    """Run `concurrency` client threads; returns [(latency, status), ...] and elapsed seconds"""
+    lock = threading.Lock()
+    samples = []
+    issued = [0]
+    stop_at = time.monotonic() + duration
+
+    def client():
+        while time.monotonic() < stop_at:
+            with lock:
+                if max_requests is not None and len(samples) + issued[0] >= max_requests:
+                    return
+                issued[0] += 1
+                method, path, body = next(requests)
+            result = request(port, method, path, body)
+            with lock:
+                issued[0] -= 1
+                samples.append(result)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return samples, time.perf_counter() - started
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(scenario, samples, elapsed, concurrency):
+    ok = [latency for latency, status in samples if 200 <= status < 400]
+    statuses = {}
+    for _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": len(samples),
+        "errors": len(samples) - len(ok),
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(ok) / len(ok) * 1000, 2) if ok else None,
+        "p50_ms": round(percentile(ok, 50) * 1000, 2) if ok else None,
+        "p90_ms": round(percentile(ok, 90) * 1000, 2) if ok else None,
+        "p95_ms": round(percentile(ok, 95) * 1000, 2) if ok else None,
+        "p99_ms": round(percentile(ok, 99) * 1000, 2) if ok else None,
+        "max_ms": round(max(ok) * 1000, 2) if ok else None,
+        "statuses": statuses,
+    }
+
+
+def run_scenario(name, args):
+    if args.warmup:
+        drive_load(args.port, scenario_requests(name, args), args.concurrency, args.warmup)
+
+    probe = None
+    if args.probe and name != "home":
+        probe_result = {}
+
+        def run_probe():
+            samples, elapsed = drive_load(args.port, scenario_requests("home", args), 1, args.duration)
+            probe_result["summary"] = summarize(f"home (during {name})", samples, elapsed, 1)
+
+        probe = threading.Thread(target=run_probe)
+        probe.start()
+
+    samples, elapsed = drive_load(
+        args.port, scenario_requests(name, args), args.concurrency, args.duration, args.requests
+    )
+    results = [summarize(name, samples, elapsed, args.concurrency)]
+    if probe:
+        probe.join()
+        results.append(probe_result["summary"])
+    return results
+
+
+# ---------- reporting ----------
+COLUMNS = ["scenario", "concurrency", "requests", "errors", "throughput_rps",
+           "mean_ms", "p50_ms", "p90_ms", "p95_ms", "p99_ms", "max_ms"]
+
+
+def print_table(results):
+    widths = [max(len(c), *(len(str(r[c])) for r in results)) for c in COLUMNS]
+    print("  ".join(c.ljust(w) for c, w in zip(COLUMNS, widths)))
+    for r in results:
+        print("  ".join(str(r[c]).ljust(w) for c, w in zip(COLUMNS, widths)))
+
+
+def write_reports(results, args, meta):
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS + ["statuses"])
+            writer.writeheader()
+            for r in results:
+                writer.writerow({**{c: r[c] for c in COLUMNS}, "statuses": json.dumps(r["statuses"])})
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", default="all",
+                        help="comma separated: contractors, generate-contract, invoice, home, or all")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10, help="seconds per scenario")
+    parser.add_argument("--requests", type=int, help="stop a scenario after this many requests")
+    parser.add_argument("--warmup", type=float, default=2, help="seconds of unmeasured load first")
+    parser.add_argument("--probe", action="store_true", help="also measure GET / latency during each scenario")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--latency", type=float, default=0.05, help="stand-in latency per call (seconds)")
+    parser.add_argument("--airtable-rate", type=float, default=5.0, help="stand-in Airtable limit per base (0 = none)")
+    parser.add_argument("--pdf-size", type=int, default=200_000)
+    parser.add_argument("--contract-cache", choices=["hit", "miss"], default="miss")
+    parser.add_argument("--invoice-mode", choices=["sync", "async"], default="sync")
+    parser.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the app, e.g. AIRTABLE_RATE_LIMIT=50")
+    parser.add_argument("--json", help="write results as JSON to this path")
+    parser.add_argument("--csv", help="write results as CSV to this path")
+    args = parser.parse_args()
+
+    names = ["contractors", "generate-contract", "invoice"] if args.scenario == "all" else args.scenario.split(",")
+
+    with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+        fakes = app = None
+        try:
+            fakes, app, args.fake_port = start(args, workdir)
+            results = []
+            for name in names:
+                results.extend(run_scenario(name.strip(), args))
+        finally:
+            stop(app, fakes)
+
+    print_table(results)
+    meta = {
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        **{k: v for k, v in vars(args).items() if k not in ("json", "csv")},
+    }
+    write_reports(results, args, meta)
+
+
+if __name__ == "__main__":
+    run()
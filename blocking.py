@@ -0,0 +1,66 @@
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from metrics import span
+
+# Size of the shared thread pool used for blocking client libraries
+# (pyairtable, requests, googleapiclient, python-docx)
+BLOCKING_POOL_SIZE = int(os.getenv("BLOCKING_POOL_SIZE", "32"))
+
+# Max in-flight calls per dependency. Anything over the limit waits on the
+# event loop without holding a pool thread, so one slow dependency can't
+# starve the others.
+DEPENDENCY_LIMITS = {
+    "airtable": int(os.getenv("AIRTABLE_CONCURRENCY", "5")),
+    "drive": int(os.getenv("DRIVE_CONCURRENCY", "4")),
+    "http": int(os.getenv("HTTP_DOWNLOAD_CONCURRENCY", "8")),
+    "render": int(os.getenv("RENDER_CONCURRENCY", "4")),
+}
+DEFAULT_LIMIT = 4
+
+_executor = ThreadPoolExecutor(max_workers=BLOCKING_POOL_SIZE, thread_name_prefix="blocking")
+# Rate-limit bookings are a SQLite transaction that can wait on other
+# processes; they run on their own thread (they're serialized per bucket
+# anyway) so they neither block the loop nor take pool threads
+_reserve_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ratelimit")
+_semaphores = {}
+_rate_limits = {}
+
+
+def set_rate_limit(dependency, bucket):
+    """Make every run_blocking call for `dependency` take a token from `bucket`"""
+    _rate_limits[dependency] = bucket
+
+
+def _semaphore(dependency):
+    sem = _semaphores.get(dependency)
+    if sem is None:
+        sem = asyncio.Semaphore(DEPENDENCY_LIMITS.get(dependency, DEFAULT_LIMIT))
+        _semaphores[dependency] = sem
+    return sem
+
+
+async def run_blocking(dependency: str, fn, *args, **kwargs):
+    """
+    Run a blocking call on the shared thread pool without stalling the event
+    loop, limited to DEPENDENCY_LIMITS[dependency] concurrent calls and to
+    the dependency's rate limit, if one is set. Each call is timed as a
+    span named after `fn`.
+    """
+    loop = asyncio.get_running_loop()
+    bucket = _rate_limits.get(dependency)
+    if bucket is not None:
+        wait = await loop.run_in_executor(_reserve_executor, bucket.reserve)
+        if wait:
+            await asyncio.sleep(wait)
+
+    operation = getattr(fn, "__qualname__", None) or type(fn).__name__
+    async with _semaphore(dependency):
+        # Run in a copy of the caller's context so nested spans and log
+        # records are attributed to the request
+        context = contextvars.copy_context()
+        with span(dependency, operation):
+            return await loop.run_in_executor(_executor, partial(context.run, fn, *args, **kwargs))
@@ -0,0 +1,258 @@
+import hashlib
+import json
+import math
+import os
+import re
+import string
+from types import MappingProxyType
+
+# Contract wording shared with generate_contract.js
+CLAUSES_PATH = os.getenv(
+    "CONTRACT_CLAUSES_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates", "clauses.json"),
+)
+
+# Strings that count as whole numbers; ASCII digits only, so both renderers agree
+WHOLE_NUMBER_RE = re.compile(r"[ \t\n\r\f\v]*[+-]?[0-9]+[ \t\n\r\f\v]*")
+
+
+# Integers past this arrive in generate_contract.js already rounded to a double
+MAX_SAFE_INTEGER = 2 ** 53 - 1
+
+
+class InvalidFieldValue(ValueError):
+    """A contract field holds a list or object, which has no text form"""
+
+
+def field_text(value):
+    """
+    How a field value is written into a contract: null is empty, booleans
+    and numbers print as JavaScript's String() prints them, lists and
+    objects are rejected. Same rules as fieldText() in generate_contract.js.
+    """
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, str):
+        return value
+    if isinstance(value, int):
+        return str(value) if abs(value) <= MAX_SAFE_INTEGER else number_text(float(value))
+    if isinstance(value, float):
+        return number_text(value)
+    raise InvalidFieldValue("must be text, a number, a boolean or null")
+
+
+def number_text(value: float) -> str:
+    """`value` as JavaScript's Number.prototype.toString() prints it"""
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "Infinity" if value > 0 else "-Infinity"
+    if value == 0:
+        return "0"
+    sign = "-" if value < 0 else ""
+    # repr() has the same shortest round-trip digits, only laid out differently
+    mantissa, _, exponent = repr(abs(value)).partition("e")
+    whole, _, fraction = mantissa.partition(".")
+    digits = (whole + fraction).lstrip("0")
+    # Position of the decimal point relative to the first significant digit
+    point = len(whole) + int(exponent or 0) - (len(whole + fraction) - len(digits))
+    digits = digits.rstrip("0")
+    count = len(digits)
+
+    if count <= point <= 21:
+        return sign + digits + "0" * (point - count)
+    if 0 < point <= 21:
+        return sign + digits[:point] + "." + digits[point:]
+    if -6 < point <= 0:
+        return sign + "0." + "0" * -point + digits
+    e = point - 1
+    mantissa = digits if count == 1 else digits[0] + "." + digits[1:]
+    return f"{sign}{mantissa}e{'+' if e >= 0 else '-'}{abs(e)}"
+
+
+def whole_number(num):
+    """
+    `num` as an int if it is a number (truncated) or a string of digits,
+    else None. Same rules as wholeNumber() in generate_contract.js.
+    """
+    if isinstance(num, bool):
+        return None
+    if isinstance(num, int):
+        return num
+    if isinstance(num, float):
+        return int(num) if math.isfinite(num) else None
+    if isinstance(num, str) and WHOLE_NUMBER_RE.fullmatch(num):
+        return int(num)
+    return None
+
+
+class _Frozen:
+    """Slotted objects whose attributes can't change after __init__"""
+
+    __slots__ = ()
+
+    def _init(self, **attrs):
+        for name, value in attrs.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+
+class PlanParagraph(_Frozen):
+    """One paragraph of a render plan; `text` has str.format {field} placeholders"""
+
+    __slots__ = ("text", "fields", "bold", "space_before", "space_after")
+
+    def __init__(self, text, bold=False, space_before=0, space_after=0):
+        fields = []
+        for _, name, spec, conversion in string.Formatter().parse(text):
+            if name is None:
+                continue
+            # Only bare {field} placeholders, so the JS side can fill them the same way
+            if not name.isidentifier() or spec or conversion:
+                raise ValueError(f"Unsupported placeholder {{{name}}} in clause text: {text!r}")
+            fields.append(name)
+        self._init(
+            text=text,
+            fields=tuple(fields),
+            bold=bool(bold),
+            space_before=space_before,
+            space_after=space_after,
+        )
+
+    def render(self, values):
+        return self.text.format_map(values)
+
+
+class RenderPlan(_Frozen):
+    """The paragraphs of one contract type, in order, and the fields they use"""
+
+    __slots__ = ("contract_type", "paragraphs", "fields")
+
+    def __init__(self, contract_type, paragraphs):
+        fields = []
+        for paragraph in paragraphs:
+            fields.extend(name for name in paragraph.fields if name not in fields)
+        self._init(contract_type=contract_type, paragraphs=tuple(paragraphs), fields=tuple(fields))
+
+
+class NumberWords(_Frozen):
+    """Spells out whole numbers: 3 -> "three (3)", 125 -> "one hundred twenty-five (125)" """
+
+    __slots__ = ("ones", "tens", "hundred", "scales", "format", "fallback")
+
+    def __init__(self, ones, tens, hundred, scales, format, fallback):
+        self._init(
+            ones=tuple(ones), tens=tuple(tens), hundred=hundred, scales=tuple(scales),
+            format=format, fallback=fallback,
+        )
+
+    def _below_thousand(self, n):
+        words = []
+        if n >= 100:
+            words += [self.ones[n // 100], self.hundred]
+            n %= 100
+        if n >= 20:
+            words.append(self.tens[n // 10] + (f"-{self.ones[n % 10]}" if n % 10 else ""))
+        elif n:
+            words.append(self.ones[n])
+        return words
+
+    def spell(self, n):
+        """Words for a non-negative int, or None if it is beyond the largest scale"""
+        if n == 0:
+            return self.ones[0]
+        if n >= 1000 ** len(self.scales):
+            return None
+        words = []
+        for power in range(len(self.scales) - 1, -1, -1):
+            group = n // 1000 ** power % 1000
+            if group:
+                words += self._below_thousand(group)
+                if self.scales[power]:
+                    words.append(self.scales[power])
+        return " ".join(words)
+
+    def __call__(self, num):
+        """`format` applied to `num`; input that isn't a whole number gets `fallback`"""
+        number = whole_number(num)
+        if number is None:
+            return self.fallback
+        words = self.spell(number) if number >= 0 else None
+        if words is None:
+            return str(number)
+        return self.format.format(words=words, number=number)
+
+
+class ClauseLibrary(_Frozen):
+    """
+    The clause library compiled into one RenderPlan per contract type.
+    `digest` identifies the library's content, so rendered output can be
+    cached against it.
+    """
+
+    __slots__ = ("plans", "default_type", "number_words", "digest")
+
+    def __init__(self, plans, default_type, number_words, digest):
+        if default_type not in plans:
+            raise ValueError(f"Default contract type {default_type!r} has no clauses")
+        self._init(
+            plans=MappingProxyType(dict(plans)),
+            default_type=default_type,
+            number_words=number_words,
+            digest=digest,
+        )
+
+    @property
+    def contract_types(self):
+        return tuple(self.plans)
+
+    @property
+    def fields(self):
+        """Every placeholder used by any contract type, in first-use order"""
+        fields = []
+        for plan in self.plans.values():
+            fields.extend(name for name in plan.fields if name not in fields)
+        return tuple(fields)
+
+    def resolve_type(self, requested):
+        """The contract type to render for a record's `contract_type` value"""
+        contract_type = str(requested or "").strip().lower()
+        return contract_type if contract_type in self.plans else self.default_type
+
+    def plan(self, contract_type):
+        return self.plans[contract_type]
+
+
+def compile_library(raw: bytes) -> ClauseLibrary:
+    """Compile the JSON clause library; unknown clause names are an error"""
+    spec = json.loads(raw)
+    clauses = {
+        name: tuple(PlanParagraph(**paragraph) for paragraph in paragraphs)
+        for name, paragraphs in spec["clauses"].items()
+    }
+    plans = {}
+    for contract_type, clause_names in spec["contract_types"].items():
+        missing = [name for name in clause_names if name not in clauses]
+        if missing:
+            raise ValueError(f"Contract type {contract_type!r} uses unknown clauses: {', '.join(missing)}")
+        plans[contract_type] = RenderPlan(
+            contract_type, [paragraph for name in clause_names for paragraph in clauses[name]]
+        )
+    return ClauseLibrary(
+        plans,
+        spec["default_contract_type"],
+        NumberWords(**spec["number_words"]),
+        hashlib.sha256(raw).hexdigest()[:16],
+    )
+
+
+def load_clause_library(path=CLAUSES_PATH) -> ClauseLibrary:
+    with open(path, "rb") as f:
+        return compile_library(f.read())
@@ -1,38 +1,47 @@
+import io
 import os
+import re
 from datetime import datetime
-from docx import Document
-from docx.shared import Pt, Inches
-from docx.enum.text import WD_ALIGN_PARAGRAPH
+
+from clauses import InvalidFieldValue, field_text, load_clause_library
+from contract_engine import TEMPLATE_VERSION, ContractTemplateEngine
+from contract_pdf import PdfContractRenderer
+from contract_store import ContractStore, content_key
+from logs import get_logger
+from metrics import span
+
+log = get_logger("contract")
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-GENERATED_CONTRACTS_DIR = os.path.join(BASE_DIR, "generated_contracts")
-
-os.makedirs(GENERATED_CONTRACTS_DIR, exist_ok=True)
-
-# Number to words conversion - just the final number
-NUMBER_TO_WORDS = {
-    1: "one (1)",
-    2: "two (2)",
-    3: "three (3)",
-    4: "four (4)",
-    5: "five (5)",
-    6: "six (6)",
-    7: "seven (7)",
-    8: "eight (8)",
-    9: "nine (9)",
-    10: "ten (10)"
-}
+# Root of the contract store (see ContractStore)
+GENERATED_CONTRACTS_DIR = os.getenv("GENERATED_CONTRACTS_DIR", os.path.join(BASE_DIR, "generated_contracts"))
+
+# Content-addressed contract cache limits and index location
+CONTRACT_INDEX_PATH = os.getenv("CONTRACT_INDEX_PATH", os.path.join(BASE_DIR, "contract_index.db"))
+CONTRACT_CACHE_MAX_BYTES = int(os.getenv("CONTRACT_CACHE_MAX_BYTES", str(500 * 1024 * 1024)))
+CONTRACT_CACHE_MAX_AGE = int(os.getenv("CONTRACT_CACHE_MAX_AGE", str(30 * 24 * 3600)))
+# Seconds between background retention sweeps of the store
+CONTRACT_SWEEP_INTERVAL = int(os.getenv("CONTRACT_SWEEP_INTERVAL", "600"))
+
+# Clause library shared with generate_contract.js, compiled into one render
+# plan per contract type
+CLAUSES = load_clause_library()
+
+# Fields substituted into the compiled templates
+TEMPLATE_FIELDS = list(CLAUSES.fields)
+REQUIRED_FIELDS = ["contractor_name", "address", "email"]
+CONTRACT_TYPES = list(CLAUSES.contract_types)
+
 
 def convert_number_to_words(num):
-    """Convert number to words format"""
-    try:
-        number = int(num)
-        return NUMBER_TO_WORDS.get(number, f"{number}")
-    except (ValueError, TypeError):
-        return "one (1)"
+    """Convert number to words format, e.g. 3 -> three (3)"""
+    return CLAUSES.number_words(num)
+
 
 def add_paragraph(doc, text, bold=False, space_before=0, space_after=0):
     """Helper to add a paragraph with formatting"""
+    from docx.shared import Pt
+
     para = doc.add_paragraph()
     run = para.add_run(text)
     run.font.name = 'Arial'
@@ -48,78 +57,17 @@ def add_paragraph(doc, text, bold=False, space_before=0, space_after=0):
     
     return para
 
-def generate_regular_contract(doc, data, num_text):
-    """Generate Regular template contract"""
-    
-    # Header info
-    add_paragraph(doc, f"Artist/vendor name: {data['contractor_name']}")
-    add_paragraph(doc, f"Name of person signing the contract (if not the artist/vendor): {data.get('signer_name', '')}")
-    add_paragraph(doc, f"Relationship to artist/vendor: {data.get('relationship_to_vendor', '')}")
-    add_paragraph(doc, f"Address: {data['address']}")
-    add_paragraph(doc, f"Email address: {data['email']}")
-    add_paragraph(doc, f"Vendor account: {data.get('vendor_account', '')}", space_after=12)
-    
-    # Summary
-    add_paragraph(doc, "Summary:", bold=True, space_before=12)
-    add_paragraph(doc, f"Vendor will create and provide to Adobe {num_text} video(s) with content to promote select Adobe products.", space_after=12)
-    
-    # Deliverables
-    add_paragraph(doc, "Deliverables:", bold=True, space_before=12)
-    add_paragraph(doc, f"Vendor will provide Adobe with {num_text} pre-recorded video(s) that will be between 30 seconds and one minute in length that highlight Adobe products. Specific details, including Adobe product(s), will be selected by Adobe in writing. For each video, Vendor will (1) orally disclose the relationship between Vendor and Adobe and (2) include a clearly visible written overlay disclosing the relationship. Unless otherwise specified by Adobe in writing, each video's aspect ratio will be 9:16.")
-    
-    add_paragraph(doc, "Vendor will post the video(s) on various social media channels owned and controlled by the Vendor, which the parties will agree to in writing. [The video(s) must be authenticated via the CreatorIQ website for analytic purposes, with a 30-day Ad code for all video created on applicable social media platforms provided to Adobe to track performance.]", space_after=12)
-    
-    add_paragraph(doc, "For clarity, Adobe shall have the right to like, favorite, share, repost, redistribute, syndicate, amplify (paid promotion or allow listing) or otherwise use all video described hereunder in any manner enabled by the applicable platform. Adobe can use the video and may redistribute to other Adobe owned accounts, channels, and/or platforms. Vendor will allow 1 round of edits per video.", space_after=12)
-    
-    add_paragraph(doc, "In the event that all pre-recorded video(s) are not delivered, Adobe will pay a pro-rated rate for content delivered in accordance with this Agreement.", space_after=12)
-    
-    add_paragraph(doc, 'Beginning on the Effective Date, and concluding thirty (30) days after Vendor\'s publication of the video(s) with Adobe\'s authorization, Vendor will not provide services on behalf of, appear or participate in any advertising, publicity or promotion of, endorse, or authorize or permit the use of Vendor\'s Likeness in connection with the following (the "Restricted Category"): (a) any software and online creative development and cloud service companies (for clarity, the Restricted Category includes, without limitation, Spline, Womp, Canva, Affinity, CapCut, Autodesk, DaVinci, Final Cut Pro, Figma, Procreate, Capture One Pro); or (b) any product or service that in its advertising or publicity denigrates Adobe or its products. For clarity, the aforementioned does not preclude Vendor from merely appearing in any entertainment portion of any news, TV, or film program or attending an event, regardless of sponsorship.', space_after=12)
-    
-    # Delivery Schedule
-    add_paragraph(doc, "Delivery Schedule:", bold=True, space_before=12)
-    add_paragraph(doc, f"Unless otherwise directed in writing by Adobe, {data.get('due_date', '')}", space_after=12)
-    
-    # Price and End Date
-    add_paragraph(doc, f"Price and currency: ${data.get('amount', '')} USD")
-    add_paragraph(doc, f"End Date: {data.get('end_date', '')}")
 
-def generate_campfire_contract(doc, data, num_text):
-    """Generate Campfire template contract"""
-    
-    # Header info
-    add_paragraph(doc, f"Artist/vendor name: {data['contractor_name']}")
-    add_paragraph(doc, f"Name of person signing the contract (if not the artist/vendor): {data.get('signer_name', '')}")
-    add_paragraph(doc, f"Relationship to artist/vendor: {data.get('relationship_to_vendor', '')}")
-    add_paragraph(doc, f"Address: {data['address']}")
-    add_paragraph(doc, f"Email address: {data['email']}")
-    add_paragraph(doc, f"Vendor account: {data.get('vendor_account', '')}", space_after=12)
-    
-    # Summary
-    add_paragraph(doc, "Summary:", bold=True, space_before=12)
-    add_paragraph(doc, f"Vendor will create and provide to Adobe {num_text} video(s) with content to promote select Adobe products.", space_after=12)
-    
-    # Deliverables
-    add_paragraph(doc, "Deliverables:", bold=True, space_before=12)
-    add_paragraph(doc, f"Vendor will provide Adobe with {num_text} pre-recorded video(s) that will be between 30 seconds and one minute in length that highlight Adobe products. Specific details, including Adobe product(s), will be selected by Adobe in writing. For each video, Vendor will (1) orally disclose the relationship between Vendor and Adobe and (2) include a clearly visible written overlay disclosing the relationship. Unless otherwise specified by Adobe in writing, each video's aspect ratio will be 9:16.")
-    
-    add_paragraph(doc, "Vendor will post the video(s) on various social media channels owned and controlled by the Vendor, which the parties will agree to in writing. The video(s) must include a 30-day Ad code for all video created on applicable social media platforms provided to Adobe.", space_after=12)
-    
-    # Delivery Schedule
-    add_paragraph(doc, "Delivery Schedule:", bold=True, space_before=12)
-    add_paragraph(doc, f"Unless otherwise directed in writing by Adobe, {data.get('due_date', '')}", space_after=12)
-    
-    # Price and End Date
-    add_paragraph(doc, f"Price and currency: ${data.get('amount', '')}")
-    add_paragraph(doc, f"End Date: {data.get('end_date', '')}")
+def get_contract_type(fields: dict) -> str:
+    return CLAUSES.resolve_type(fields.get('contract_type'))
 
-def generate_contract(fields: dict) -> str:
-    """
-    Generates contract Word document (.docx) using python-docx
-    Required fields in dict:
-    contractor_name, signer_name, relationship_to_vendor,
-    address, email, vendor_account, service, amount, due_date, end_date,
-    number_of_content, contract_type, po
-    """
+
+def build_document(contract_type: str, data: dict, num_text: str) -> "Document":
+    """Builds the contract with python-docx (used to compile the templates)"""
+    # python-docx is only needed to compile the templates, so it isn't
+    # imported until the first compile
+    from docx import Document
+    from docx.shared import Inches
 
     # Create document
     doc = Document()
@@ -132,25 +80,119 @@ def generate_contract(fields: dict) -> str:
         section.left_margin = Inches(1)
         section.right_margin = Inches(1)
     
-    # Convert number to words
-    num_text = convert_number_to_words(fields.get('number_of_content', 1))
-    
-    # Generate appropriate template
-    contract_type = fields.get('contract_type', 'regular').lower()
-    if contract_type == 'campfire':
-        generate_campfire_contract(doc, fields, num_text)
-    else:
-        generate_regular_contract(doc, fields, num_text)
-    
-    # Save document
-    safe_name = fields["contractor_name"].replace(" ", "_")
+    plan = CLAUSES.plan(contract_type)
+    values = {name: data.get(name, '') for name in plan.fields}
+    values["num_text"] = num_text
+    for paragraph in plan.paragraphs:
+        add_paragraph(
+            doc,
+            paragraph.render(values),
+            bold=paragraph.bold,
+            space_before=paragraph.space_before,
+            space_after=paragraph.space_after,
+        )
+    
+    return doc
+
+
+def _build_template_docx(contract_type: str, tokens: dict) -> bytes:
+    doc = build_document(contract_type, tokens, tokens["num_text"])
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def _build_template_model(contract_type: str, tokens: dict) -> list:
+    # Straight from the render plan; the PDF path never needs python-docx
+    return [
+        (paragraph.render(tokens), paragraph.bold, paragraph.space_before, paragraph.space_after)
+        for paragraph in CLAUSES.plan(contract_type).paragraphs
+    ]
+
+
+contract_engine = ContractTemplateEngine(_build_template_docx, CONTRACT_TYPES, TEMPLATE_FIELDS)
+pdf_renderer = PdfContractRenderer(_build_template_model, CONTRACT_TYPES, TEMPLATE_FIELDS)
+
+# Output format -> (file extension, renderer)
+OUTPUT_FORMATS = {
+    "docx": (".docx", contract_engine),
+    "pdf": (".pdf", pdf_renderer),
+}
+
+
+contract_store = ContractStore(
+    GENERATED_CONTRACTS_DIR,
+    CONTRACT_INDEX_PATH,
+    max_bytes=CONTRACT_CACHE_MAX_BYTES,
+    max_age=CONTRACT_CACHE_MAX_AGE,
+)
+
+
+def contract_values(fields: dict) -> dict:
+    """
+    The template values for a record as the strings that get rendered; these
+    alone determine the output, and are what the store key is hashed from.
+    A missing or null field renders empty (see clauses.field_text); a list
+    or object raises InvalidFieldValue.
+    """
+    for name in REQUIRED_FIELDS:
+        if name not in fields:
+            raise KeyError(name)
+
+    values = {}
+    for name in TEMPLATE_FIELDS:
+        try:
+            values[name] = field_text(fields.get(name))
+        except InvalidFieldValue as e:
+            raise InvalidFieldValue(f"{name} {e}") from None
+    values["num_text"] = convert_number_to_words(fields.get('number_of_content', 1))
+    return values
+
+
+def render_contract(fields: dict) -> bytes:
+    """Renders the contract .docx bytes from the compiled template"""
+    return contract_engine.render(get_contract_type(fields), contract_values(fields))
+
+
+# Anything else in a contractor's name becomes "_" in file and ZIP entry
+# names, so a name can't carry path separators or "../"
+UNSAFE_FILENAME_CHARS = re.compile(r"[^A-Za-z0-9._-]")
+
+
+def contract_filename(fields: dict, output_format: str = "docx") -> str:
+    safe_name = UNSAFE_FILENAME_CHARS.sub("_", str(fields["contractor_name"]))
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"contract_{safe_name}_{timestamp}.docx"
-    output_path = os.path.join(GENERATED_CONTRACTS_DIR, filename)
-    
-    doc.save(output_path)
-    print(f"✅ Contract generated: {output_path}")
-    
+    return f"contract_{safe_name}_{timestamp}{OUTPUT_FORMATS[output_format][0]}"
+
+
+def generate_contract(fields: dict, output_format: str = "docx") -> str:
+    """
+    Generates contract Word document (.docx), or a PDF with
+    output_format="pdf", from the compiled templates
+    Required fields in dict:
+    contractor_name, signer_name, relationship_to_vendor,
+    address, email, vendor_account, service, amount, due_date, end_date,
+    number_of_content, contract_type, po
+
+    Identical requests are served from the content-addressed store, so the
+    returned path is named after the content hash, not the contractor. The
+    PDF of a record is stored next to its .docx under the same hash.
+    """
+    ext, renderer = OUTPUT_FORMATS[output_format]
+    values = contract_values(fields)
+    contract_type = get_contract_type(fields)
+    key = content_key(values, contract_type, f"{TEMPLATE_VERSION}.{CLAUSES.digest}")
+
+    cached_path = contract_store.get(key, ext)
+    if cached_path:
+        log.info("Contract served from cache", path=cached_path, sample=True)
+        return cached_path
+
+    with span("render", output_format):
+        content = renderer.render(contract_type, values)
+    output_path = contract_store.put(key, ext, content)
+    log.info("Contract generated", path=output_path, sample=True)
+
     return output_path
 
 
@@ -0,0 +1,164 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from contract import contract_engine, contract_filename, render_contract
+from metrics import DEPENDENCY_SECONDS
+
+BATCH_MAX_RECORDS = int(os.getenv("BATCH_MAX_RECORDS", "500"))
+RENDER_PROCESSES = int(os.getenv("RENDER_PROCESSES", str(os.cpu_count() or 1)))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def resolve_batch_records(items, defaults, contractors, lookup_error=None):
+    """
+    Turns the request's records into {"record_id", "fields", "error"} dicts.
+
+    An item may reference a Community Leaders record with `record_id`; its
+    email, amount and PO fill in anything the item and `defaults` don't set.
+    The contractor cache has nothing else, so contractor_name, address and
+    the rest of the contract fields must still come from the item or
+    `defaults`. If the contractors couldn't be loaded, `lookup_error` is
+    reported for every item that references one.
+    """
+    resolved = []
+    for item in items:
+        if not isinstance(item, dict):
+            resolved.append({"error": "record must be an object"})
+            continue
+
+        record_id = item.get("record_id")
+        fields = dict(defaults)
+        if record_id:
+            if lookup_error is not None:
+                resolved.append({"record_id": record_id, "error": f"Community Leaders lookup failed: {lookup_error}"})
+                continue
+            contractor = contractors.get(record_id)
+            if contractor is None:
+                resolved.append({"record_id": record_id, "error": "Unknown Community Leaders record"})
+                continue
+            fields.update(email=contractor["email"], amount=contractor["amount"], po=contractor["po"])
+
+        fields.update({k: v for k, v in item.items() if k != "record_id"})
+        if not fields.get("contractor_name"):
+            resolved.append({"record_id": record_id, "fields": fields, "error": "missing field 'contractor_name'"})
+            continue
+        resolved.append({"record_id": record_id, "fields": fields})
+    return resolved
+
+
+def _warm_worker():
+    contract_engine.warm()
+
+
+def get_render_pool():
+    """Process pool for batch rendering, started on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=RENDER_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm_worker,
+            )
+    return _pool
+
+
+def shutdown_render_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+class _ZipStream:
+    """Write-only sink for zipfile; zipfile falls back to data descriptors
+    because it can't seek, so entries can be handed out as soon as written"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+async def stream_contracts_zip(records):
+    """
+    Renders `records` on the process pool and yields a ZIP archive in pieces,
+    adding each contract as soon as it is done. Records that fail to render
+    are reported in manifest.json instead of aborting the batch.
+
+    Each record is a dict with `fields` (the contract data), and optionally
+    `record_id` and a pre-resolved `error`.
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_render_pool()
+    sink = _ZipStream()
+    archive = zipfile.ZipFile(sink, mode="w")
+    manifest = []
+    pending = {}
+
+    for index, record in enumerate(records):
+        entry = {
+            "index": index,
+            "record_id": record.get("record_id"),
+            "contractor_name": (record.get("fields") or {}).get("contractor_name"),
+            "status": "pending",
+        }
+        manifest.append(entry)
+        if record.get("error"):
+            entry.update(status="error", error=record["error"])
+            continue
+        future = asyncio.wrap_future(pool.submit(render_contract, record["fields"]), loop=loop)
+        pending[future] = (entry, record["fields"], time.perf_counter())
+
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                entry, fields, submitted = pending.pop(future)
+                # Includes time queued behind the rest of the batch
+                outcome = "error" if future.exception() else "ok"
+                DEPENDENCY_SECONDS.observe(time.perf_counter() - submitted, "render", "batch_docx", outcome)
+                try:
+                    content = future.result()
+                    filename = f"{entry['index'] + 1:03d}_{contract_filename(fields)}"
+                except Exception as e:
+                    if isinstance(e, BrokenProcessPool):
+                        # Start a fresh pool for the next batch
+                        shutdown_render_pool()
+                    error = f"missing field {e}" if isinstance(e, KeyError) else str(e)
+                    entry.update(status="error", error=error)
+                    continue
+
+                # .docx files are already deflated, so store them as-is
+                info = zipfile.ZipInfo(filename, date_time=time.localtime()[:6])
+                archive.writestr(info, content, compress_type=zipfile.ZIP_STORED)
+                entry.update(status="ok", filename=filename)
+                yield sink.drain()
+
+        archive.writestr("manifest.json", json.dumps(manifest, indent=2))
+        archive.close()
+        yield sink.drain()
+    finally:
+        # Client went away or something failed: don't render the rest
+        for future in pending:
+            future.cancel()
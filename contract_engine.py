@@ -0,0 +1,154 @@
+import io
+import re
+import struct
+import threading
+import zipfile
+import zlib
+from xml.sax.saxutils import escape
+
+# Bump whenever the contract layout changes; wording changes in
+# templates/clauses.json are picked up through the library's digest
+TEMPLATE_VERSION = "3"
+
+DOCUMENT_PART = "word/document.xml"
+
+PLACEHOLDER = "@@{}@@"
+PLACEHOLDER_RE = re.compile(rb"@@(\w+)@@")
+
+# Characters python-docx would reject in a run
+INVALID_XML_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+# Fixed DOS timestamp (1980-01-01 00:00) for every zip member
+ZIP_TIME, ZIP_DATE = 0, (0 << 9) | (1 << 5) | 1
+
+
+def _deflate(data):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _text_xml(value):
+    """XML for a substituted value, matching what python-docx's add_run writes"""
+    text = INVALID_XML_CHARS.sub("", str(value))
+    text = escape(text)
+    text = text.replace("\t", '</w:t><w:tab/><w:t xml:space="preserve">')
+    text = text.replace("\n", '</w:t><w:br/><w:t xml:space="preserve">')
+    return text
+
+
+class _ZipMember:
+    __slots__ = ("name", "crc", "data", "size")
+
+    def __init__(self, name, raw):
+        self.name = name.encode("utf-8")
+        self.crc = zlib.crc32(raw)
+        self.data = _deflate(raw)
+        self.size = len(raw)
+
+    def local_header(self):
+        return struct.pack(
+            "<4s5H3L2H", b"PK\x03\x04", 20, 0, zipfile.ZIP_DEFLATED, ZIP_TIME, ZIP_DATE,
+            self.crc, len(self.data), self.size, len(self.name), 0,
+        ) + self.name
+
+    def central_header(self, offset):
+        return struct.pack(
+            "<4s6H3L5H2L", b"PK\x01\x02", 20, 20, 0, zipfile.ZIP_DEFLATED, ZIP_TIME, ZIP_DATE,
+            self.crc, len(self.data), self.size, len(self.name), 0, 0, 0, 0, 0, offset,
+        ) + self.name
+
+
+class CompiledTemplate:
+    """
+    A contract variant reduced to byte segments.
+
+    Every package part except word/document.xml is compressed once. The
+    document part is kept as static XML chunks with the variable fields
+    between them, so rendering is string joins plus one small deflate.
+    """
+
+    def __init__(self, docx_bytes):
+        self._static = []
+        document_xml = None
+        with zipfile.ZipFile(io.BytesIO(docx_bytes)) as package:
+            for name in package.namelist():
+                raw = package.read(name)
+                if name == DOCUMENT_PART:
+                    document_xml = raw
+                else:
+                    self._static.append(_ZipMember(name, raw))
+
+        if document_xml is None:
+            raise ValueError("Template has no word/document.xml")
+
+        # Substituted values may start or end with spaces, so every text
+        # node has to preserve whitespace
+        document_xml = document_xml.replace(b"<w:t>", b'<w:t xml:space="preserve">')
+
+        parts = PLACEHOLDER_RE.split(document_xml)
+        self._chunks = [part.decode("utf-8") for part in parts[0::2]]
+        self.fields = [name.decode("ascii") for name in parts[1::2]]
+
+        # Static members go first, so their bytes and central directory
+        # entries never move
+        self._prefix = bytearray()
+        self._central = bytearray()
+        for member in self._static:
+            self._central += member.central_header(len(self._prefix))
+            self._prefix += member.local_header() + member.data
+        self._prefix = bytes(self._prefix)
+        self._central = bytes(self._central)
+
+    def render(self, values: dict) -> bytes:
+        """Fill the placeholders with `values` and return the .docx bytes"""
+        out = [self._chunks[0]]
+        for name, chunk in zip(self.fields, self._chunks[1:]):
+            out.append(_text_xml(values.get(name, "")))
+            out.append(chunk)
+
+        document = _ZipMember(DOCUMENT_PART, "".join(out).encode("utf-8"))
+        header = document.local_header()
+        central = self._central + document.central_header(len(self._prefix))
+        body_size = len(self._prefix) + len(header) + len(document.data)
+        end = struct.pack(
+            "<4s4H2LH", b"PK\x05\x06", 0, 0, len(self._static) + 1, len(self._static) + 1,
+            len(central), body_size, 0,
+        )
+        return b"".join((self._prefix, header, document.data, central, end))
+
+
+class ContractTemplateEngine:
+    """
+    Compiles each contract variant once and renders contracts from the
+    compiled byte skeletons.
+
+    `build_docx(variant, values)` must produce the variant's .docx bytes
+    for the given field values; the engine calls it once per variant with
+    placeholder tokens as the values.
+    """
+
+    def __init__(self, build_docx, variants, fields):
+        self._build_docx = build_docx
+        self.variants = tuple(variants)
+        self.fields = tuple(fields)
+        self._compiled = {}
+        self._lock = threading.Lock()
+
+    def template(self, variant):
+        compiled = self._compiled.get(variant)
+        if compiled is None:
+            with self._lock:
+                compiled = self._compiled.get(variant)
+                if compiled is None:
+                    tokens = {name: PLACEHOLDER.format(name) for name in self.fields}
+                    compiled = CompiledTemplate(self._build_docx(variant, tokens))
+                    self._compiled[variant] = compiled
+        return compiled
+
+    def warm(self):
+        """Compile every variant up front (called at startup)"""
+        for variant in self.variants:
+            self.template(variant)
+
+    def render(self, variant, values: dict) -> bytes:
+        return self.template(variant).render(values)
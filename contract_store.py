@@ -0,0 +1,349 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import stat
+import threading
+import time
+from collections import OrderedDict
+
+# Stored files are `<sha256 key><ext>`; anything else is never served
+FILENAME_RE = re.compile(r"[0-9a-f]{64}\.(?:docx|pdf)")
+# Download names handed out by /generate-contract (contract_filename()),
+# which is also how contracts were named on disk before the store existed
+DOWNLOAD_NAME_RE = re.compile(r"contract_[A-Za-z0-9._-]*_\d{8}_\d{6}\.(?:docx|pdf)")
+# Partial writes left by put() when a process died mid-write
+TMP_FILENAME_RE = re.compile(r"[0-9a-f]{64}\.(?:docx|pdf)\.\d+\.tmp")
+# Files live under root/<first SHARD_CHARS of the key>/, so no single
+# directory grows past a few hundred entries per 256 shards
+SHARD_CHARS = 2
+SHARD_RE = re.compile(rf"[0-9a-f]{{{SHARD_CHARS}}}")
+# Last-access times are kept in memory and written to the index at most this
+# often (and by sweep()), in one statement, instead of once per download
+ACCESS_FLUSH_INTERVAL = 30
+# Store files on disk the index doesn't know (crashed writes, entries
+# another process dropped) are deleted by the sweeper once they are this old
+ORPHAN_GRACE = 3600
+
+
+def content_key(values: dict, variant: str, template_version: str) -> str:
+    """
+    Hash of everything that determines a rendered contract's bytes.
+    `values` must be exactly what the renderer is given, already normalized:
+    values that render the same but hash differently only cost a cache miss,
+    while normalizing here alone would let different documents share a key.
+    """
+    payload = json.dumps([template_version, variant, values], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ContractStore:
+    """
+    Content-addressed store for rendered contracts.
+
+    Files are named `<key><ext>` and sharded by key prefix under `root`.
+    The index (size, content hash, created and last-access times) lives in
+    memory as an LRU-ordered dict, so lookups and downloads never touch the
+    directory; it is persisted to SQLite to survive restarts. Access times
+    are written back in batches, so after a crash the LRU order can be up
+    to ACCESS_FLUSH_INTERVAL seconds behind. `put()` evicts
+    least-recently-used entries once the store is over `max_bytes`; expired
+    entries (older than `max_age` seconds) and orphaned files are removed
+    by `sweep()`, which the app runs in the background.
+
+    The directory and index are opened on first use (or by `open()` during
+    startup warmup), not at construction. Files left flat in `root` by the
+    previous layout are moved into their shard when the index is loaded.
+
+    Only names the store itself writes (`<key><ext>` and its `.tmp` partial
+    writes) are ever deleted. Anything else in `root`, such as the
+    `contract_<name>_<timestamp>.docx` files written before the store
+    existed, is left alone and can be archived or removed by hand.
+
+    Links from before the store keep working: `alias()` records the
+    `contract_<name>_<timestamp>` download name a stored file was handed
+    out under, and `lookup()` resolves such names through those aliases,
+    falling back to a legacy file of that name in `root`.
+
+    Several processes can share `root` and the index file, but each keeps
+    its own in-memory index, so a file one process lists may have been
+    evicted by another; `lookup()` checks the file is still there.
+    """
+
+    def __init__(self, root, index_path, max_bytes, max_age):
+        self.root = root
+        self.index_path = index_path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._total = 0
+        # filename -> accessed_at not yet written to the index
+        self._accessed = {}
+        self._accessed_flushed_at = time.time()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0, "orphans_removed": 0}
+        self._db = None
+
+    def open(self):
+        """Create the directory and load the index; idempotent"""
+        with self._lock:
+            self._open()
+
+    def _open(self):
+        if self._db is not None:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        db = sqlite3.connect(self.index_path, check_same_thread=False, isolation_level=None)
+        db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS contracts (
+                filename    TEXT PRIMARY KEY,
+                size        INTEGER NOT NULL,
+                created_at  REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                sha256      TEXT
+            )
+            """
+        )
+        columns = {row[1] for row in db.execute("PRAGMA table_info(contracts)")}
+        if "sha256" not in columns:
+            db.execute("ALTER TABLE contracts ADD COLUMN sha256 TEXT")
+        # Download names -> stored filenames; shared by every process
+        db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS aliases (
+                name        TEXT PRIMARY KEY,
+                filename    TEXT NOT NULL,
+                created_at  REAL NOT NULL
+            )
+            """
+        )
+        self._db = db
+        self._load()
+
+    def _load(self):
+        rows = self._db.execute(
+            "SELECT filename, size, created_at, accessed_at, sha256 FROM contracts ORDER BY accessed_at"
+        ).fetchall()
+        for filename, size, created_at, accessed_at, sha256 in rows:
+            path = self.path_for(filename)
+            if not os.path.exists(path):
+                legacy_path = os.path.join(self.root, filename)
+                if not os.path.exists(legacy_path):
+                    self._db.execute("DELETE FROM contracts WHERE filename = ?", (filename,))
+                    continue
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(legacy_path, path)
+            self._entries[filename] = {
+                "size": size, "created_at": created_at, "accessed_at": accessed_at, "sha256": sha256,
+            }
+            self._total += size
+
+    def path_for(self, filename):
+        return os.path.join(self.root, filename[:SHARD_CHARS], filename)
+
+    def get(self, key, ext):
+        """Path of the stored file for `key`, or None on a miss"""
+        entry = self.lookup(key + ext)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return entry["path"]
+
+    def alias(self, name, filename):
+        """Make the download name `name` resolve to the stored `filename`"""
+        if not (DOWNLOAD_NAME_RE.fullmatch(name) and FILENAME_RE.fullmatch(filename)):
+            raise ValueError(f"Can't alias {name!r} to {filename!r}")
+        with self._lock:
+            self._open()
+            self._db.execute(
+                "INSERT OR REPLACE INTO aliases (name, filename, created_at) VALUES (?, ?, ?)",
+                (name, filename, time.time()),
+            )
+
+    def lookup(self, filename):
+        """
+        Index entry for a stored file as a dict (path, size, sha256,
+        created_at, stat), or None if `filename` isn't a live entry or its
+        file is gone. Names that aren't `<key><ext>` or a download name are
+        rejected before any path is built, so client-supplied names can be
+        passed straight in. Legacy files have no recorded hash; their
+        sha256 is None.
+        """
+        if DOWNLOAD_NAME_RE.fullmatch(filename):
+            return self._lookup_download_name(filename)
+        if not FILENAME_RE.fullmatch(filename):
+            return None
+        now = time.time()
+        with self._lock:
+            self._open()
+            entry = self._entries.get(filename)
+            if entry is None:
+                return None
+            if now - entry["created_at"] > self.max_age:
+                self._remove(filename)
+                self.stats["expired"] += 1
+                return None
+            entry["accessed_at"] = now
+            self._entries.move_to_end(filename)
+            self._accessed[filename] = now
+            if now - self._accessed_flushed_at >= ACCESS_FLUSH_INTERVAL:
+                self._flush_accessed(now)
+            sha256 = entry["sha256"]
+        path = self.path_for(filename)
+
+        try:
+            # Another process sharing the directory may have evicted it
+            stat_result = os.stat(path)
+            if sha256 is None:
+                # Indexed before hashes were recorded
+                with open(path, "rb") as f:
+                    sha256 = hashlib.sha256(f.read()).hexdigest()
+                with self._lock:
+                    entry["sha256"] = sha256
+                    self._db.execute("UPDATE contracts SET sha256 = ? WHERE filename = ?", (sha256, filename))
+        except FileNotFoundError:
+            with self._lock:
+                if self._entries.get(filename) is entry:
+                    self._remove(filename)
+            return None
+        return {
+            "path": path, "size": stat_result.st_size, "sha256": sha256,
+            "created_at": entry["created_at"], "stat": stat_result,
+        }
+
+    def _lookup_download_name(self, name):
+        with self._lock:
+            self._open()
+            row = self._db.execute("SELECT filename FROM aliases WHERE name = ?", (name,)).fetchone()
+        if row:
+            return self.lookup(row[0])
+
+        # Written flat into root before the store existed
+        path = os.path.join(self.root, name)
+        try:
+            stat_result = os.stat(path)
+        except FileNotFoundError:
+            return None
+        if not stat.S_ISREG(stat_result.st_mode):
+            return None
+        return {
+            "path": path, "size": stat_result.st_size, "sha256": None,
+            "created_at": stat_result.st_mtime, "stat": stat_result,
+        }
+
+    def put(self, key, ext, content: bytes):
+        """Store `content` under `key` and return its path"""
+        filename = key + ext
+        path = self.path_for(filename)
+        sha256 = hashlib.sha256(content).hexdigest()
+        self.open()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+        now = time.time()
+        with self._lock:
+            previous = self._entries.pop(filename, None)
+            if previous:
+                self._total -= previous["size"]
+            self._entries[filename] = {
+                "size": len(content), "created_at": now, "accessed_at": now, "sha256": sha256,
+            }
+            self._total += len(content)
+            self._db.execute(
+                """
+                INSERT OR REPLACE INTO contracts (filename, size, created_at, accessed_at, sha256)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (filename, len(content), now, now, sha256),
+            )
+            self._evict(keep=filename)
+        return path
+
+    def flush(self):
+        """Write access times still held in memory to the index"""
+        with self._lock:
+            if self._db is not None:
+                self._flush_accessed(time.time())
+
+    def _flush_accessed(self, now):
+        if self._accessed:
+            self._db.executemany(
+                "UPDATE contracts SET accessed_at = ? WHERE filename = ?",
+                [(accessed_at, filename) for filename, accessed_at in self._accessed.items()],
+            )
+            self._accessed.clear()
+        self._accessed_flushed_at = now
+
+    def _remove(self, filename):
+        self._accessed.pop(filename, None)
+        entry = self._entries.pop(filename)
+        self._total -= entry["size"]
+        self._db.execute("DELETE FROM contracts WHERE filename = ?", (filename,))
+        try:
+            os.remove(self.path_for(filename))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self, keep=None):
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                break
+            self._remove(oldest)
+            self.stats["evictions"] += 1
+
+    def sweep(self):
+        """
+        Apply the retention quotas: drop entries older than `max_age`,
+        evict down to `max_bytes`, and delete store files the index doesn't
+        know about. Blocking; returns what was removed.
+        """
+        now = time.time()
+        with self._lock:
+            self._open()
+            self._flush_accessed(now)
+            expired = [f for f, e in self._entries.items() if now - e["created_at"] > self.max_age]
+            for filename in expired:
+                self._remove(filename)
+            self.stats["expired"] += len(expired)
+            evictions = self.stats["evictions"]
+            self._evict()
+            evicted = self.stats["evictions"] - evictions
+            # Files other processes sharing the directory have stored are in
+            # the shared index even if this process hasn't seen them
+            known = set(self._entries) | {row[0] for row in self._db.execute("SELECT filename FROM contracts")}
+            self._db.execute(
+                "DELETE FROM aliases WHERE created_at < ? OR filename NOT IN (SELECT filename FROM contracts)",
+                (now - self.max_age,),
+            )
+
+        orphans = 0
+        shards = [e.path for e in os.scandir(self.root) if e.is_dir() and SHARD_RE.fullmatch(e.name)]
+        for directory in [self.root] + shards:
+            for entry in os.scandir(directory):
+                if not entry.is_file() or entry.name in known:
+                    continue
+                if not (FILENAME_RE.fullmatch(entry.name) or TMP_FILENAME_RE.fullmatch(entry.name)):
+                    continue
+                try:
+                    if now - entry.stat().st_mtime < ORPHAN_GRACE:
+                        continue
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    continue
+                orphans += 1
+        with self._lock:
+            self.stats["orphans_removed"] += orphans
+        return {"expired": len(expired), "evicted": evicted, "orphans": orphans}
+
+    def usage(self):
+        with self._lock:
+            if self._db is None:
+                return {"files": 0, "bytes": 0, **self.stats}
+            return {"files": len(self._entries), "bytes": self._total, **self.stats}
@@ -0,0 +1,199 @@
+import base64
+import bisect
+import threading
+from operator import itemgetter
+
+from airtable_sync import CachedTable, TableSync
+from logs import get_logger
+
+log = get_logger("contractors")
+
+# Contractor dict key -> Community Leaders column it is built from
+CONTRACTOR_FIELD_MAP = {
+    "id": None,
+    "summary": "Summary",
+    "email": "Email (from Community Member)",
+    "date": "Date",
+    "status": "Status",
+    "po": "PO",
+    "amount": "Rate Formula",
+}
+
+
+class InvalidQuery(ValueError):
+    pass
+
+
+def source_fields_for(fields):
+    """Airtable columns needed to build the given contractor keys"""
+    return [CONTRACTOR_FIELD_MAP[f] for f in fields if CONTRACTOR_FIELD_MAP.get(f)]
+
+
+def parse_fields(fields_param):
+    """Parse a comma separated `fields=` projection, or None for all fields"""
+    if not fields_param:
+        return None
+    fields = [f.strip() for f in fields_param.split(",") if f.strip()]
+    unknown = [f for f in fields if f not in CONTRACTOR_FIELD_MAP]
+    if unknown:
+        raise InvalidQuery(f"Unknown fields: {', '.join(unknown)}")
+    # Always keep the id so the dropdown can refer back to the record
+    if "id" not in fields:
+        fields.insert(0, "id")
+    return fields
+
+
+# Only these columns are requested from Airtable; anything else on the
+# Community Leaders table (attachments, notes, ...) is never downloaded
+CONTRACTOR_SOURCE_FIELDS = source_fields_for(CONTRACTOR_FIELD_MAP)
+
+
+def encode_cursor(last_id):
+    """Cursor resuming after the contractor with record id `last_id`"""
+    return base64.urlsafe_b64encode(f"k:{last_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        kind, last_id = base64.urlsafe_b64decode(padded).decode().split(":", 1)
+        if kind != "k" or not last_id:
+            raise ValueError(cursor)
+        return last_id
+    except ValueError:
+        raise InvalidQuery("Invalid cursor")
+
+
+def query_contractors(contractors, status=None, po=None, email_prefix=None,
+                      fields=None, cursor=None, limit=None):
+    """
+    Filter, paginate and project a contractor list.
+    Returns (page, next_cursor); next_cursor is None on the last page.
+
+    Paginated results are ordered by record id and the cursor holds the
+    last id served, so a sync that adds or removes contractors between
+    requests doesn't make later pages skip or repeat rows.
+    """
+    if status:
+        status = status.lower()
+        contractors = [c for c in contractors if str(c['status']).lower() == status]
+    if po:
+        contractors = [c for c in contractors if str(c['po']) == po]
+    if email_prefix:
+        email_prefix = email_prefix.lower()
+        contractors = [c for c in contractors if str(c['email']).lower().startswith(email_prefix)]
+
+    if limit is not None and limit < 1:
+        raise InvalidQuery("limit must be at least 1")
+    if limit is not None or cursor:
+        contractors = sorted(contractors, key=itemgetter('id'))
+        if cursor:
+            start = bisect.bisect_right(contractors, decode_cursor(cursor), key=itemgetter('id'))
+            contractors = contractors[start:]
+
+    next_cursor = None
+    if limit is not None:
+        page = contractors[:limit]
+        if len(contractors) > limit:
+            next_cursor = encode_cursor(page[-1]['id'])
+    else:
+        page = contractors
+
+    projection = parse_fields(fields)
+    if projection:
+        page = [{f: c[f] for f in projection} for c in page]
+
+    return page, next_cursor
+
+
+def transform_contractor(record):
+    """Turn a Community Leaders record into the simplified dropdown format"""
+    fields = record.get('fields', {})
+
+    # Extract email
+    email_field = fields.get('Email (from Community Member)', [])
+
+    # Handle different formats
+    if isinstance(email_field, list) and len(email_field) > 0:
+        email = email_field[0]
+    elif isinstance(email_field, str):
+        email = email_field
+    else:
+        email = ""
+
+    # Extract rate/amount from Rate Formula field - with extra safety
+    rate_formula = fields.get('Rate Formula', '')
+    amount = ""
+
+    if rate_formula:
+        if isinstance(rate_formula, (int, float)):
+            # If it's already a number, just convert to string
+            amount = str(rate_formula)
+        elif isinstance(rate_formula, str):
+            # If it's a string like "$3,000.00", clean it up
+            amount = rate_formula.replace('$', '').replace(',', '').strip()
+        else:
+            # Unknown type, convert to string
+            amount = str(rate_formula)
+
+    return {
+        'id': record['id'],
+        'summary': fields.get('Summary', ''),
+        'email': email,
+        'date': fields.get('Date', ''),
+        'status': fields.get('Status', ''),
+        'po': fields.get('PO', ''),
+        'amount': amount,
+    }
+
+
+class ContractorCache:
+    """
+    In-process contractor directory.
+
+    Records are transformed once when they are synced, so reads hand back
+    the ready-made contractor dicts without touching Airtable.
+    """
+
+    def __init__(self, get_table, ttl=60, stale_ttl=600, full_sync_interval=900):
+        self._sync = TableSync(
+            get_table,
+            fields=CONTRACTOR_SOURCE_FIELDS,
+            full_sync_interval=full_sync_interval,
+        )
+        self._cache = CachedTable(self._sync, ttl=ttl, stale_ttl=stale_ttl)
+        self._contractors = {}
+        self._snapshot = []
+        self._lock = threading.Lock()
+        self._sync.on_change(self._apply)
+
+    def _apply(self, records, full):
+        with self._lock:
+            contractors = {} if full else dict(self._contractors)
+            for record in records:
+                try:
+                    contractors[record['id']] = transform_contractor(record)
+                except Exception as record_error:
+                    # Skip this record but continue processing others
+                    log.warning("Error processing record", record_id=record.get('id', 'unknown'), error=str(record_error))
+                    contractors.pop(record.get('id'), None)
+
+            self._contractors = contractors
+            self._snapshot = list(contractors.values())
+
+    def get_all(self):
+        """Return the contractor list, syncing with Airtable if it is due"""
+        self._cache.ensure_fresh()
+        return self._snapshot
+
+    def invalidate(self, full=False):
+        self._cache.invalidate(full=full)
+
+    @property
+    def needs_blocking_sync(self):
+        """True if the next get_all() will wait on Airtable"""
+        return self._sync.age >= self._cache.ttl + self._cache.stale_ttl
+
+    @property
+    def age(self):
+        return self._sync.age
@@ -0,0 +1,398 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import uuid
+import weakref
+from datetime import datetime, timedelta, timezone
+
+import google.auth.transport.requests
+import httplib2
+import requests
+from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.http import MediaFileUpload, MediaIoBaseUpload, MediaUpload
+
+from logs import get_logger
+from metrics import span
+
+log = get_logger("drive")
+
+# Google Drive OAuth config
+DRIVE_FOLDER_ID = os.getenv("GDRIVE_FOLDER_ID", "1eKDgZvxW8lecck_CiqdDWVWOmiZjFNry")
+OAUTH_TOKEN_JSON = os.getenv("GDRIVE_OAUTH_TOKEN_JSON")  # contents of token.json
+
+SCOPES = ["https://www.googleapis.com/auth/drive.file"]
+
+# Seconds to wait on the invoice PDF host (connect, read)
+DOWNLOAD_TIMEOUT = (5, 60)
+
+# Resumable uploads must use a multiple of 256 KiB per chunk
+CHUNK_ALIGNMENT = 256 * 1024
+DRIVE_UPLOAD_CHUNK_SIZE = int(os.getenv("DRIVE_UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+
+# Invoices larger than this are rejected before or during the transfer
+MAX_INVOICE_PDF_BYTES = int(os.getenv("MAX_INVOICE_PDF_BYTES", str(50 * 1024 * 1024)))
+
+# The fallback spool stays in memory up to this size, then rolls over to disk
+SPOOL_MEMORY_LIMIT = int(os.getenv("PDF_SPOOL_MEMORY_LIMIT", str(4 * 1024 * 1024)))
+
+UPLOAD_NUM_RETRIES = 3
+
+# Refresh the OAuth access token this many seconds before it expires
+DRIVE_TOKEN_REFRESH_MARGIN = int(os.getenv("DRIVE_TOKEN_REFRESH_MARGIN", "300"))
+DRIVE_HTTP_TIMEOUT = 60
+# Alternative Google API root URL, e.g. the local stand-in used by bench/.
+# Replaces rootUrl in the discovery document, so uploads go there as well.
+DRIVE_API_ROOT = os.getenv("GDRIVE_API_ROOT")
+
+
+class PdfTooLarge(ValueError):
+    pass
+
+
+class ChecksumMismatch(IOError):
+    pass
+
+
+class StreamRewindError(IOError):
+    """Drive asked for bytes that have already left the streaming window"""
+
+
+def aligned_chunk_size(chunk_size):
+    return max(CHUNK_ALIGNMENT, chunk_size - chunk_size % CHUNK_ALIGNMENT)
+
+
+# ============= GOOGLE DRIVE HELPERS (OAuth) =============
+class DriveClientManager:
+    """
+    Process-wide source of Drive clients.
+
+    Credentials are parsed once and shared. The access token is refreshed
+    under a lock shortly before it expires, so uploads never pay for a
+    refresh. Each worker thread gets its own Drive service built from the
+    bundled (static) discovery document, on its own keep-alive httplib2
+    connection, because httplib2 objects are not thread-safe.
+    """
+
+    def __init__(self, token_json, refresh_margin=DRIVE_TOKEN_REFRESH_MARGIN, timeout=DRIVE_HTTP_TIMEOUT):
+        self._token_json = token_json
+        self._refresh_margin = timedelta(seconds=refresh_margin)
+        self._timeout = timeout
+        self._creds = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._https = weakref.WeakSet()
+        self._token_request = None
+        self.stats = {
+            "token_refreshes": 0,
+            "token_refresh_failures": 0,
+            "clients_built": 0,
+            "client_reuses": 0,
+        }
+
+    def _credentials(self):
+        if self._creds is None:
+            info = json.loads(self._token_json)
+            self._creds = Credentials.from_authorized_user_info(info, scopes=SCOPES)
+            self._token_request = google.auth.transport.requests.Request()
+        return self._creds
+
+    def _needs_refresh(self, creds):
+        if not creds.token:
+            return True
+        if creds.expiry is None:
+            return False
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return creds.expiry - now <= self._refresh_margin
+
+    def ensure_token(self):
+        """Refresh the shared access token if it is missing or about to expire"""
+        with self._lock:
+            creds = self._credentials()
+            if not self._needs_refresh(creds) or not creds.refresh_token:
+                return creds
+            try:
+                creds.refresh(self._token_request)
+            except Exception:
+                self.stats["token_refresh_failures"] += 1
+                raise
+            self.stats["token_refreshes"] += 1
+            return creds
+
+    def client(self):
+        """Drive service for the calling thread, reused across calls"""
+        creds = self.ensure_token()
+        service = getattr(self._local, "service", None)
+        if service is not None:
+            with self._lock:
+                self.stats["client_reuses"] += 1
+            return service
+
+        http = httplib2.Http(timeout=self._timeout)
+        with self._lock:
+            self._https.add(http)
+            self.stats["clients_built"] += 1
+        if DRIVE_API_ROOT:
+            document = json.loads(get_static_doc("drive", "v3"))
+            document["rootUrl"] = DRIVE_API_ROOT
+            service = build_from_document(document, http=AuthorizedHttp(creds, http=http))
+        else:
+            service = build(
+                "drive",
+                "v3",
+                http=AuthorizedHttp(creds, http=http),
+                static_discovery=True,
+                cache_discovery=False,
+            )
+        self._local.service = service
+        return service
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["open_connections"] = sum(len(http.connections) for http in self._https)
+            stats["token_expiry"] = self._creds.expiry.isoformat() if self._creds and self._creds.expiry else None
+        return stats
+
+
+drive_clients = DriveClientManager(OAUTH_TOKEN_JSON) if OAUTH_TOKEN_JSON else None
+
+
+def get_drive_client():
+    """
+    Returns an authenticated Drive client using OAuth user credentials
+    stored in the GDRIVE_OAUTH_TOKEN_JSON env var.
+    """
+    if drive_clients is None:
+        log.warning("No GDRIVE_OAUTH_TOKEN_JSON set, skipping Drive upload")
+        return None
+
+    try:
+        return drive_clients.client()
+    except Exception as e:
+        log.error("Failed to create Drive client from OAuth token", error=str(e))
+        return None
+
+
+def upload_pdf_to_drive(pdf_path: str, folder_id: str = DRIVE_FOLDER_ID, raise_errors: bool = False):
+    """
+    Uploads PDF to Google Drive folder using OAuth credentials.
+    With raise_errors=True upload failures propagate instead of returning None.
+    """
+    drive = get_drive_client()
+    if not drive:
+        return None
+
+    if not os.path.exists(pdf_path):
+        log.warning("File not found, skipping Drive upload", path=pdf_path)
+        return None
+
+    metadata = {
+        "name": os.path.basename(pdf_path),
+        "parents": [folder_id],
+    }
+    media = MediaFileUpload(pdf_path, mimetype="application/pdf")
+
+    try:
+        with span("drive", "upload"):
+            file = (
+                drive.files()
+                .create(body=metadata, media_body=media, fields="id, webViewLink")
+                .execute()
+            )
+        log.info("Uploaded to Drive", file_id=file.get("id"))
+        return file
+    except Exception as e:
+        log.error("Drive upload failed", error=str(e))
+        if raise_errors:
+            raise
+        return None
+
+
+# ============= STREAMING URL -> DRIVE =============
+class StreamingMediaUpload(MediaUpload):
+    """
+    Resumable MediaUpload fed from a non-seekable byte stream.
+
+    Only a window of about two chunks is kept in memory: the chunk being sent
+    (Drive may ask for part of it again after a 308) plus one chunk of
+    read-ahead, so the total size is known before the final chunk goes out.
+    The MD5 and byte count are computed as the data is read.
+    """
+
+    def __init__(self, read, mimetype="application/pdf", chunksize=DRIVE_UPLOAD_CHUNK_SIZE,
+                 max_bytes=MAX_INVOICE_PDF_BYTES):
+        self._read = read
+        self._mimetype = mimetype
+        self._chunksize = aligned_chunk_size(chunksize)
+        self._max_bytes = max_bytes
+        self._buffer = bytearray()
+        self._buffer_start = 0
+        self._eof = False
+        self.bytes_read = 0
+        self.md5 = hashlib.md5()
+        self._fill(self._chunksize + 1)
+
+    def _fill(self, end):
+        while not self._eof and self._buffer_start + len(self._buffer) < end:
+            block = self._read(self._chunksize)
+            if not block:
+                self._eof = True
+                break
+            self.bytes_read += len(block)
+            if self.bytes_read > self._max_bytes:
+                raise PdfTooLarge(f"Invoice PDF exceeds {self._max_bytes} bytes")
+            self.md5.update(block)
+            self._buffer += block
+
+    def chunksize(self):
+        return self._chunksize
+
+    def mimetype(self):
+        return self._mimetype
+
+    def size(self):
+        return self.bytes_read if self._eof else None
+
+    def resumable(self):
+        return True
+
+    def getbytes(self, begin, length):
+        if begin < self._buffer_start:
+            raise StreamRewindError(f"Upload rewound to byte {begin}, window starts at {self._buffer_start}")
+
+        # Bytes before `begin` have been acknowledged by Drive
+        del self._buffer[:begin - self._buffer_start]
+        self._buffer_start = begin
+
+        self._fill(begin + length + self._chunksize + 1)
+        return bytes(self._buffer[:length])
+
+    def has_stream(self):
+        return False
+
+    def stream(self):
+        return None
+
+    def to_json(self):
+        # HttpRequest.to_json() lands here. Saving a request to resume it later
+        # can't work for this upload: the bytes already sent are not buffered
+        # and the source stream can't be reopened. The upload is only ever
+        # resumed in-process by _run_upload, so nothing here serializes it.
+        raise TypeError(
+            "StreamingMediaUpload can't be serialized: it reads a one-shot stream "
+            "and can only be resumed within the process that started it"
+        )
+
+
+def _run_upload(request):
+    response = None
+    with span("drive", "resumable_upload"):
+        while response is None:
+            _, response = request.next_chunk(num_retries=UPLOAD_NUM_RETRIES)
+    return response
+
+
+def _check_upload(drive, file, md5_hex, size):
+    remote_md5 = file.get("md5Checksum")
+    remote_size = int(file.get("size", size))
+    if (remote_md5 and remote_md5 != md5_hex) or remote_size != size:
+        try:
+            with span("drive", "delete"):
+                drive.files().delete(fileId=file["id"]).execute()
+        except Exception as e:
+            log.warning("Failed to delete corrupt Drive upload", file_id=file.get("id"), error=str(e))
+        raise ChecksumMismatch(
+            f"Drive copy ({remote_size} bytes, md5 {remote_md5}) does not match source ({size} bytes, md5 {md5_hex})"
+        )
+
+
+def _open_source(url):
+    with span("http", "download"):
+        resp = requests.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT)
+    resp.raise_for_status()
+    declared = resp.headers.get("Content-Length")
+    if declared and declared.isdigit() and int(declared) > MAX_INVOICE_PDF_BYTES:
+        resp.close()
+        raise PdfTooLarge(f"Invoice PDF is {declared} bytes, limit is {MAX_INVOICE_PDF_BYTES}")
+    return resp
+
+
+def _stream_upload(drive, url, metadata, chunk_size):
+    resp = _open_source(url)
+    try:
+        if resp.raw is None:
+            raise StreamRewindError("Source response has no readable stream")
+        media = StreamingMediaUpload(
+            lambda n: resp.raw.read(n, decode_content=True),
+            chunksize=chunk_size,
+        )
+        request = drive.files().create(
+            body=metadata, media_body=media, fields="id, webViewLink, md5Checksum, size"
+        )
+        file = _run_upload(request)
+        _check_upload(drive, file, media.md5.hexdigest(), media.bytes_read)
+        return file
+    finally:
+        resp.close()
+
+
+def _spooled_upload(drive, url, metadata, chunk_size):
+    resp = _open_source(url)
+    md5 = hashlib.md5()
+    size = 0
+    # The spool is deleted as soon as it is closed, including on errors
+    with resp, tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_LIMIT, suffix=".pdf") as spool:
+        for block in resp.iter_content(chunk_size=64 * 1024):
+            size += len(block)
+            if size > MAX_INVOICE_PDF_BYTES:
+                raise PdfTooLarge(f"Invoice PDF exceeds {MAX_INVOICE_PDF_BYTES} bytes")
+            md5.update(block)
+            spool.write(block)
+        spool.seek(0)
+
+        media = MediaIoBaseUpload(
+            spool, mimetype="application/pdf", chunksize=aligned_chunk_size(chunk_size), resumable=True
+        )
+        request = drive.files().create(
+            body=metadata, media_body=media, fields="id, webViewLink, md5Checksum, size"
+        )
+        file = _run_upload(request)
+        _check_upload(drive, file, md5.hexdigest(), size)
+        return file
+
+
+def stream_pdf_to_drive(url: str, folder_id: str = DRIVE_FOLDER_ID,
+                        chunk_size: int = DRIVE_UPLOAD_CHUNK_SIZE, raise_errors: bool = False):
+    """
+    Pipes the PDF at `url` into a resumable Drive upload chunk by chunk,
+    without writing it to disk. The Drive copy is checked against the MD5 and
+    size of the bytes read. If the source can't be streamed, the PDF is
+    spooled into a self-deleting temp file and uploaded from there.
+    """
+    drive = get_drive_client()
+    if not drive:
+        return None
+
+    metadata = {
+        "name": f"{uuid.uuid4()}.pdf",
+        "parents": [folder_id],
+    }
+
+    try:
+        try:
+            file = _stream_upload(drive, url, metadata, chunk_size)
+        except StreamRewindError as e:
+            log.warning("Streaming upload not possible, falling back to spooled upload", error=str(e))
+            file = _spooled_upload(drive, url, metadata, chunk_size)
+        log.info("Uploaded to Drive", file_id=file.get("id"))
+        return file
+    except Exception as e:
+        log.error("Invoice PDF transfer to Drive failed", error=str(e))
+        if raise_errors:
+            raise
+        return None
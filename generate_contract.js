@@ -1,104 +1,114 @@
-const { Document, Packer, Paragraph, TextRun } = require('docx');
 const fs = require('fs');
+const path = require('path');
 
-// Number to words conversion (handles 1-20, adjust as needed)
-const numberToWords = {
-    1: "One (1)",
-    2: "One (1) / Two (2)",
-    3: "One (1) / Two (2) / Three (3)",
-    4: "One (1) / Two (2) / Three (3) / Four (4)",
-    5: "One (1) / Two (2) / Three (3) / Four (4) / Five (5)",
-    6: "One (1) / Two (2) / Three (3) / Four (4) / Five (5) / Six (6)",
-    7: "One (1) / Two (2) / Three (3) / Four (4) / Five (5) / Six (6) / Seven (7)",
-    8: "One (1) / Two (2) / Three (3) / Four (4) / Five (5) / Six (6) / Seven (7) / Eight (8)",
-    9: "One (1) / Two (2) / Three (3) / Four (4) / Five (5) / Six (6) / Seven (7) / Eight (8) / Nine (9)",
-    10: "One (1) / Two (2) / Three (3) / Four (4) / Five (5) / Six (6) / Seven (7) / Eight (8) / Nine (9) / Ten (10)"
-};
+// Contract wording shared with contract.py: each contract type is an ordered
+// list of clauses, and each clause a list of paragraphs with {field} placeholders
+const CLAUSES = JSON.parse(fs.readFileSync(path.join(__dirname, 'templates', 'clauses.json'), 'utf8'));
+
+// Every placeholder used by any contract type, in first-use order, as
+// ClauseLibrary.fields in clauses.py
+const TEMPLATE_FIELDS = [...new Set(Object.values(CLAUSES.contract_types).flatMap(names =>
+    names.flatMap(name => CLAUSES.clauses[name]).flatMap(paragraph =>
+        [...paragraph.text.matchAll(/\{(\w+)\}/g)].map(match => match[1]))))];
+
+// Same rules as NumberWords in clauses.py: 3 -> "three (3)", 125 -> "one hundred twenty-five (125)"
+function spellBelowThousand(n, words) {
+    const out = [];
+    if (n >= 100) {
+        out.push(words.ones[Math.floor(n / 100)], words.hundred);
+        n %= 100;
+    }
+    if (n >= 20) {
+        out.push(words.tens[Math.floor(n / 10)] + (n % 10 ? `-${words.ones[n % 10]}` : ""));
+    } else if (n) {
+        out.push(words.ones[n]);
+    }
+    return out;
+}
+
+function spellNumber(n, words) {
+    if (n === 0) return words.ones[0];
+    if (n >= 1000 ** words.scales.length) return null;
+    const out = [];
+    for (let power = words.scales.length - 1; power >= 0; power--) {
+        const group = Math.floor(n / 1000 ** power) % 1000;
+        if (group) {
+            out.push(...spellBelowThousand(group, words));
+            if (words.scales[power]) out.push(words.scales[power]);
+        }
+    }
+    return out.join(" ");
+}
+
+// Strings that count as whole numbers; ASCII digits only, as in clauses.py
+const WHOLE_NUMBER_RE = /^[ \t\n\r\f\v]*[+-]?[0-9]+[ \t\n\r\f\v]*$/;
+
+// Same rules as whole_number() in clauses.py: a number (truncated) or a
+// string of digits, as a BigInt so large values print in full; else null
+function wholeNumber(num) {
+    if (typeof num === 'number') return Number.isFinite(num) ? BigInt(Math.trunc(num)) : null;
+    if (typeof num === 'string' && WHOLE_NUMBER_RE.test(num)) return BigInt(num.trim());
+    return null;
+}
+
+// Same rules as field_text() in clauses.py: null is empty, lists and
+// objects are rejected, anything else as String() prints it
+function fieldText(value, name) {
+    if (value === null || value === undefined) return "";
+    if (typeof value === 'object') throw new TypeError(`${name} must be text, a number, a boolean or null`);
+    return String(value);
+}
 
 function convertNumberToWords(num) {
-    const number = parseInt(num);
-    return numberToWords[number] || `${number}`;
+    const words = CLAUSES.number_words;
+    const number = wholeNumber(num);
+    if (number === null) return words.fallback;
+    const inRange = number >= 0n && number < 1000n ** BigInt(words.scales.length);
+    if (!inRange) return `${number}`;
+    const spelled = spellNumber(Number(number), words);
+    return words.format.replace("{words}", spelled).replace("{number}", `${number}`);
 }
 
-function generateRegularContract(data) {
-    const numText = data.number_of_content ? convertNumberToWords(data.number_of_content) : "one (1)";
-    
-    return [
-        new Paragraph({ children: [new TextRun({ text: `Artist/vendor name: ${data.contractor_name}`, break: 1 })] }),
-        new Paragraph({ children: [new TextRun({ text: `Name of person signing the contract (if not the artist/vendor): ${data.signer_name}`, break: 1 })] }),
-        new Paragraph({ children: [new TextRun({ text: `Relationship to artist/vendor: ${data.relationship_to_vendor}`, break: 1 })] }),
-        new Paragraph({ children: [new TextRun({ text: `Address: ${data.address}`, break: 1 })] }),
-        new Paragraph({ children: [new TextRun({ text: `Email address: ${data.email}`, break: 1 })] }),
-        new Paragraph({ children: [new TextRun({ text: `Vendor account: ${data.vendor_account}`, break: 2 })] }),
-        
-        new Paragraph({ children: [new TextRun({ text: "Summary:", bold: true, break: 1 })] }),
-        new Paragraph({ children: [new TextRun({ text: `Vendor will create and provide to Adobe ${numText} video(s) with content to promote select Adobe products.`, break: 2 })] }),
-        
-        new Paragraph({ children: [new TextRun({ text: "Deliverables:", bold: true, break: 1 })] }),
-        new Paragraph({ children: [new TextRun({ 
-            text: `Vendor will provide Adobe with ${numText} pre-recorded video(s) that will be between 30 seconds and one minute in length that highlight Adobe products. Specific details, including Adobe product(s), will be selected by Adobe in writing. For each video, Vendor will (1) orally disclose the relationship between Vendor and Adobe and (2) include a clearly visible written overlay disclosing the relationship. Unless otherwise specified by Adobe in writing, each video's aspect ratio will be 9:16.`,
-            break: 1
-        })] }),
-        new Paragraph({ children: [new TextRun({
-            text: `Vendor will post the video(s) on various social media channels owned and controlled by the Vendor, which the parties will agree to in writing. [The video(s) must be authenticated via the CreatorIQ website for analytic purposes, with a 30-day Ad code for all video created on applicable social media platforms provided to Adobe to track performance.]`,
-            break: 2
-        })] }),
-        new Paragraph({ children: [new TextRun({
-            text: `For clarity, Adobe shall have the right to like, favorite, share, repost, redistribute, syndicate, amplify (paid promotion or allow listing) or otherwise use all video described hereunder in any manner enabled by the applicable platform. Adobe can use the video and may redistribute to other Adobe owned accounts, channels, and/or platforms. Vendor will allow 1 round of edits per video.`,
-            break: 2
-        })] }),
-        new Paragraph({ children: [new TextRun({
-            text: `In the event that all pre-recorded video(s) are not delivered, Adobe will pay a pro-rated rate for content delivered in accordance with this Agreement.`,
-            break: 2
-        })] }),
-        new Paragraph({ children: [new TextRun({
-            text: `Beginning on the Effective Date, and concluding thirty (30) days after Vendor's publication of the video(s) with Adobe's authorization, Vendor will not provide services on behalf of, appear or participate in any advertising, publicity or promotion of, endorse, or authorize or permit the use of Vendor's Likeness in connection with the following (the "Restricted Category"): (a) any software and online creative development and cloud service companies (for clarity, the Restricted Category includes, without limitation, Spline, Womp, Canva, Affinity, CapCut, Autodesk, DaVinci, Final Cut Pro, Figma, Procreate, Capture One Pro); or (b) any product or service that in its advertising or publicity denigrates Adobe or its products. For clarity, the aforementioned does not preclude Vendor from merely appearing in any entertainment portion of any news, TV, or film program or attending an event, regardless of sponsorship.`,
-            break: 2
-        })] }),
-        
-        new Paragraph({ children: [new TextRun({ text: "Delivery Schedule:", bold: true, break: 1 })] }),
-        new Paragraph({ children: [new TextRun({ text: `Unless otherwise directed in writing by Adobe, ${data.due_date}`, break: 2 })] }),
-        
-        new Paragraph({ children: [new TextRun({ text: `Price and currency: $${data.amount} USD`, break: 1 })] }),
-        new Paragraph({ children: [new TextRun({ text: `End Date: ${data.end_date}`, break: 1 })] }),
-    ];
+function resolveContractType(requested) {
+    const contractType = String(requested || "").trim().toLowerCase();
+    return Object.hasOwn(CLAUSES.contract_types, contractType) ? contractType : CLAUSES.default_contract_type;
 }
 
-function generateCampfireContract(data) {
-    const numText = data.number_of_content ? convertNumberToWords(data.number_of_content) : "one (1)";
-    
-    return [
-        new Paragraph({ children: [new TextRun({ text: `Artist/vendor name: ${data.contractor_name}`, break: 1 })] }),
-        new Paragraph({ children: [new TextRun({ text: `Name of person signing the contract (if not the artist/vendor): ${data.signer_name}`, break: 1 })] }),
-        new Paragraph({ children: [new TextRun({ text: `Relationship to artist/vendor: ${data.relationship_to_vendor}`, break: 1 })] }),
-        new Paragraph({ children: [new TextRun({ text: `Address: ${data.address}`, break: 1 })] }),
-        new Paragraph({ children: [new TextRun({ text: `Email address: ${data.email}`, break: 1 })] }),
-        new Paragraph({ children: [new TextRun({ text: `Vendor account: ${data.vendor_account}`, break: 2 })] }),
-        
-        new Paragraph({ children: [new TextRun({ text: "Summary:", bold: true, break: 1 })] }),
-        new Paragraph({ children: [new TextRun({ text: `Vendor will create and provide to Adobe ${numText} video(s) with content to promote select Adobe products.`, break: 2 })] }),
-        
-        new Paragraph({ children: [new TextRun({ text: "Deliverables:", bold: true, break: 1 })] }),
-        new Paragraph({ children: [new TextRun({ 
-            text: `Vendor will provide Adobe with ${numText} pre-recorded video(s) that will be between 30 seconds and one minute in length that highlight Adobe products. Specific details, including Adobe product(s), will be selected by Adobe in writing. For each video, Vendor will (1) orally disclose the relationship between Vendor and Adobe and (2) include a clearly visible written overlay disclosing the relationship. Unless otherwise specified by Adobe in writing, each video's aspect ratio will be 9:16.`,
-            break: 1
-        })] }),
-        new Paragraph({ children: [new TextRun({
-            text: `Vendor will post the video(s) on various social media channels owned and controlled by the Vendor, which the parties will agree to in writing. The video(s) must include a 30-day Ad code for all video created on applicable social media platforms provided to Adobe.`,
-            break: 2
-        })] }),
-        
-        new Paragraph({ children: [new TextRun({ text: "Delivery Schedule:", bold: true, break: 1 })] }),
-        new Paragraph({ children: [new TextRun({ text: `Unless otherwise directed in writing by Adobe, ${data.due_date}`, break: 2 })] }),
-        
-        new Paragraph({ children: [new TextRun({ text: `Price and currency: $${data.amount}`, break: 1 })] }),
-        new Paragraph({ children: [new TextRun({ text: `End Date: ${data.end_date}`, break: 1 })] }),
-    ];
+function renderText(text, values) {
+    return text.replace(/\{(\w+)\}/g, (_, name) => fieldText(Object.hasOwn(values, name) ? values[name] : null, name));
+}
+
+// The contract's paragraphs as plain data: { text, bold, space_before, space_after }
+function renderParagraphs(data) {
+    // Rejects lists and objects in any template field, as contract_values() does
+    for (const name of TEMPLATE_FIELDS) fieldText(Object.hasOwn(data, name) ? data[name] : null, name);
+    const contractType = resolveContractType(data.contract_type);
+    const values = { ...data, num_text: convertNumberToWords(data.number_of_content ?? 1) };
+
+    return CLAUSES.contract_types[contractType].flatMap(name => CLAUSES.clauses[name]).map(paragraph => ({
+        text: renderText(paragraph.text, values),
+        bold: !!paragraph.bold,
+        space_before: paragraph.space_before || 0,
+        space_after: paragraph.space_after || 0,
+    }));
+}
+
+function buildParagraphs(data) {
+    // Only needed to write the .docx, so renderParagraphs() works without it
+    const { Paragraph, TextRun } = require('docx');
+
+    return renderParagraphs(data).map(paragraph =>
+        new Paragraph({
+            // Clause spacing is in points; docx wants twentieths of a point
+            spacing: { before: paragraph.space_before * 20, after: paragraph.space_after * 20 },
+            children: [new TextRun({ text: paragraph.text, bold: paragraph.bold })],
+        })
+    );
 }
 
 function generateContract(data, outputPath) {
-    const isCampfire = data.contract_type === 'campfire';
-    const content = isCampfire ? generateCampfireContract(data) : generateRegularContract(data);
+    const { Document, Packer } = require('docx');
+    const content = buildParagraphs(data);
     
     const doc = new Document({
         styles: {
@@ -149,4 +159,4 @@ if (require.main === module) {
         });
 }
 
-module.exports = { generateContract };
+module.exports = { generateContract, convertNumberToWords, renderParagraphs };
@@ -0,0 +1,141 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+
+IDEMPOTENCY_HEADER = "idempotency-key"
+# Client keys are opaque strings; anything longer is rejected
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyError(ValueError):
+    """The request's Idempotency-Key can't be used (answered with 422)"""
+
+
+class IdempotencyConflict(IdempotencyError):
+    """An Idempotency-Key was reused with a different request body"""
+
+
+def body_fingerprint(body: bytes) -> str:
+    """Hash of a request body; JSON bodies are canonicalized so key order and whitespace don't matter"""
+    try:
+        canonical = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        body = canonical.encode("utf-8")
+    except ValueError:
+        pass
+    return hashlib.sha256(body).hexdigest()
+
+
+def request_key(scope: str, headers, body: bytes):
+    """
+    (key, fingerprint, client_key) for a request. The key is the client's
+    Idempotency-Key header if it sent one, otherwise the body fingerprint,
+    so a double submit without a key is still collapsed; either way it is
+    namespaced by `scope` (the endpoint).
+    """
+    fingerprint = body_fingerprint(body)
+    client_key = (headers.get(IDEMPOTENCY_HEADER) or "").strip() or None
+    if client_key is not None and len(client_key) > MAX_KEY_LENGTH:
+        raise IdempotencyError(f"Idempotency-Key is longer than {MAX_KEY_LENGTH} characters")
+    if client_key is not None:
+        return (scope, "key", client_key), fingerprint, client_key
+    return (scope, "body", fingerprint), fingerprint, None
+
+
+class IdempotencyCache:
+    """
+    Single-flight execution plus a bounded TTL cache of completed results,
+    keyed per request (see `request_key`).
+
+    While a key is in flight, identical requests wait for the first one and
+    share its result instead of running again; once it completes, the result
+    is kept for `ttl` seconds (`hash_ttl` for keys derived from the body,
+    which only need to cover double submits) in an LRU of `max_entries`.
+    Failures are never cached, so a retry after an error runs again.
+
+    State is per process and lives on the event loop; with several workers
+    a repeat can land on another process and run again, so side effects
+    that must not repeat (PO debits) also carry the client key themselves.
+    """
+
+    def __init__(self, ttl=600, hash_ttl=60, max_entries=10000):
+        self.ttl = ttl
+        self.hash_ttl = hash_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self.stats = {"hits": 0, "joined": 0, "misses": 0, "conflicts": 0}
+
+    def _cached(self, key, fingerprint, valid):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, stored_fingerprint, value = entry
+        if time.monotonic() >= expires_at or (valid is not None and not valid(value)):
+            del self._entries[key]
+            return None
+        if stored_fingerprint != fingerprint:
+            self.stats["conflicts"] += 1
+            raise IdempotencyConflict("Idempotency-Key was already used with a different request body")
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key, fingerprint, value):
+        ttl = self.hash_ttl if key[1] == "body" else self.ttl
+        self._entries[key] = (time.monotonic() + ttl, fingerprint, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def run(self, key, fingerprint, fn, cacheable=None, valid=None):
+        """
+        Returns (result of `await fn()`, replayed). `replayed` is True when
+        the result came from the cache or from an identical in-flight
+        request. `cacheable(result)` decides whether a result is kept;
+        `valid(result)` re-checks a cached one (e.g. that a file still exists).
+        """
+        while True:
+            entry = self._cached(key, fingerprint, valid)
+            if entry is not None:
+                self.stats["hits"] += 1
+                return entry[2], True
+
+            pending = self._inflight.get(key)
+            if pending is None:
+                break
+            pending_fingerprint, future = pending
+            if pending_fingerprint != fingerprint:
+                self.stats["conflicts"] += 1
+                raise IdempotencyConflict("A request with this Idempotency-Key and a different body is in progress")
+            self.stats["joined"] += 1
+            try:
+                return await asyncio.shield(future), True
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The first request was cancelled (client went away); run it ourselves
+
+        self.stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        # Joiners see the exception; don't warn when there were none
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = (fingerprint, future)
+        try:
+            value = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+        if cacheable is None or cacheable(value):
+            self._store(key, fingerprint, value)
+        future.set_result(value)
+        return value, False
+
+    def usage(self):
+        return {"entries": len(self._entries), "in_flight": len(self._inflight), **self.stats}
@@ -0,0 +1,218 @@
+import asyncio
+import csv
+import io
+
+# Airtable accepts at most 10 records per create/update/upsert request
+AIRTABLE_BATCH_SIZE = 10
+
+# Values per OR(...) lookup formula; keeps the formula well under URL limits
+LOOKUP_CHUNK_SIZE = 50
+
+EMAIL_FIELD = "Email (from Community Member)"
+PO_FIELD = "Orders"
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def parse_invoice_csv(text):
+    """Invoices from a CSV whose header row uses the /invoice payload keys"""
+    invoices = []
+    for row in csv.DictReader(io.StringIO(text)):
+        invoice = {k.strip(): (v.strip() if isinstance(v, str) else v) for k, v in row.items() if k}
+        total = invoice.get("totalPayment")
+        if total not in (None, ""):
+            try:
+                invoice["totalPayment"] = float(total.replace("$", "").replace(",", ""))
+            except ValueError:
+                pass
+        invoices.append(invoice)
+    return invoices
+
+
+def _field_values(record, field):
+    value = record["fields"].get(field)
+    if isinstance(value, list):
+        return value
+    return [] if value is None else [value]
+
+
+class InvoiceBatch:
+    """
+    Bulk invoice ingestion with writes grouped per table.
+
+    Table 1 rows are created (or upserted on `upsert_fields`) 10 at a time.
+    Community members and purchase orders are looked up with one OR(...)
+    formula per chunk of distinct emails/POs. Members are updated 10 at a
+    time; the debits against each PO are summed and handed to the PO
+    `ledger`, which batches the balance writes.
+    Keys found in `member_index` / `po_index` skip the formula lookup.
+    `call(fn, *args)` runs each Airtable request (thread pool and rate
+    limiter); `transfer_pdf(url)` copies an invoice PDF to Drive.
+    """
+
+    def __init__(self, t1, t2, t3, call, transfer_pdf, ledger, upsert_fields=None, member_index=None, po_index=None):
+        self.t1 = t1
+        self.t2 = t2
+        self.t3 = t3
+        self.call = call
+        self.transfer_pdf = transfer_pdf
+        self.ledger = ledger
+        self.upsert_fields = upsert_fields
+        self.member_index = member_index
+        self.po_index = po_index
+
+    async def run(self, invoices, errors_by_index):
+        results = [
+            {"index": i, "status": "error" if errors_by_index.get(i) else "pending",
+             "errors": list(errors_by_index.get(i, []))}
+            for i in range(len(invoices))
+        ]
+        valid = [i for i in range(len(invoices)) if not errors_by_index.get(i)]
+
+        await asyncio.gather(
+            self._table1(invoices, valid, results),
+            self._table2(invoices, valid, results),
+            self._table3(invoices, valid, results),
+            self._drive(invoices, valid, results),
+        )
+
+        for result in results:
+            if result["status"] == "pending":
+                result["status"] = "error" if result["errors"] else "ok"
+        return results
+
+    # ---------- TABLE 1 INSERT ----------
+    async def _table1(self, invoices, valid, results):
+        for chunk in chunked(valid, AIRTABLE_BATCH_SIZE):
+            rows = [
+                {
+                    "Payment Name":    invoices[i].get("paymentName"),
+                    "Invoice Date":    invoices[i].get("invoiceDate"),
+                    "Description":     invoices[i].get("description"),
+                    "Total Payment":   invoices[i].get("totalPayment"),
+                    "Purchase Orders": invoices[i].get("purchaseOrder"),
+                }
+                for i in chunk
+            ]
+            try:
+                if self.upsert_fields:
+                    response = await self.call(
+                        self.t1.batch_upsert, [{"fields": row} for row in rows], key_fields=self.upsert_fields
+                    )
+                    created = response["records"]
+                else:
+                    created = await self.call(self.t1.batch_create, rows)
+            except Exception as e:
+                for i in chunk:
+                    results[i]["errors"].append(f"table1: {e}")
+                continue
+            for i, record in zip(chunk, created):
+                results[i]["airtable1_record"] = record["id"]
+
+    # ---------- TABLE 2 UPDATE ----------
+    async def _table2(self, invoices, valid, results):
+        by_email = {}
+        for i in valid:
+            by_email.setdefault(invoices[i]["email"], []).append(i)
+
+        matches = await self._lookup(self.t2, EMAIL_FIELD, by_email, results, "table2", self.member_index)
+
+        updates = {}
+        for email, indexes in by_email.items():
+            record = matches.get(email)
+            for i in indexes:
+                results[i]["airtable2_updated_records"] = 1 if record else 0
+            if record:
+                # Later invoices for the same member win, as they would one by one
+                updates[record["id"]] = (indexes, invoices[indexes[-1]].get("invoicePdfUrl"))
+
+        await self._batch_update(
+            self.t2,
+            [
+                (indexes, {"id": rid, "fields": {"Status": "Payment requested", "Invoice": [{"url": url}]}})
+                for rid, (indexes, url) in updates.items()
+            ],
+            results,
+            "table2",
+        )
+
+    # ---------- TABLE 3 BALANCE SUBTRACT ----------
+    async def _table3(self, invoices, valid, results):
+        by_po = {}
+        for i in valid:
+            by_po.setdefault(invoices[i]["purchaseOrder"], []).append(i)
+
+        matches = await self._lookup(self.t3, PO_FIELD, by_po, results, "table3", self.po_index)
+
+        async def debit(record, indexes):
+            try:
+                await self.ledger.debit(record["id"], sum(invoices[i]["totalPayment"] for i in indexes))
+            except Exception as e:
+                for i in indexes:
+                    results[i]["errors"].append(f"table3 update: {e}")
+
+        debits = []
+        for po, indexes in by_po.items():
+            record = matches.get(po)
+            for i in indexes:
+                results[i]["airtable3_balance_updated"] = 1 if record else 0
+            if record:
+                debits.append(debit(record, indexes))
+        await asyncio.gather(*debits)
+
+    # ---------- GOOGLE DRIVE UPLOAD OF INVOICE PDF ----------
+    async def _drive(self, invoices, valid, results):
+        async def transfer(i):
+            url = invoices[i].get("invoicePdfUrl")
+            if not url:
+                results[i]["drive_file"] = None
+                return
+            try:
+                results[i]["drive_file"] = await self.transfer_pdf(url)
+            except Exception as e:
+                results[i]["drive_file"] = None
+                results[i]["errors"].append(f"drive: {e}")
+
+        await asyncio.gather(*(transfer(i) for i in valid))
+
+    async def _lookup(self, table, field, indexes_by_value, results, label, index=None):
+        """First matching record per value; index misses are fetched one OR(...) formula per chunk"""
+        from pyairtable.formulas import EQ, OR, Field
+
+        matches = {}
+        missing = []
+        for value in indexes_by_value:
+            record = index.get(value) if index is not None else None
+            if record is None:
+                missing.append(value)
+            else:
+                matches[value] = record
+
+        for chunk in chunked(missing, LOOKUP_CHUNK_SIZE):
+            formula = OR(*(EQ(Field(field), value) for value in chunk))
+            try:
+                records = await self.call(table.all, formula=str(formula))
+            except Exception as e:
+                for value in chunk:
+                    for i in indexes_by_value[value]:
+                        results[i]["errors"].append(f"{label} lookup: {e}")
+                continue
+            for record in records:
+                for value in _field_values(record, field):
+                    if value in indexes_by_value:
+                        matches.setdefault(value, record)
+                if index is not None:
+                    index.remember(record)
+        return matches
+
+    async def _batch_update(self, table, updates, results, label):
+        for chunk in chunked(updates, AIRTABLE_BATCH_SIZE):
+            try:
+                await self.call(table.batch_update, [record for _, record in chunk])
+            except Exception as e:
+                for indexes, _ in chunk:
+                    for i in indexes:
+                        results[i]["errors"].append(f"{label} update: {e}")
@@ -0,0 +1,310 @@
+import asyncio
+import json
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+from blocking import run_blocking
+from logs import get_logger, request_id
+from metrics import JOB_SECONDS
+
+log = get_logger("jobs")
+
+
+class RetryableError(Exception):
+    """Raise from a job handler to have the job retried with backoff"""
+
+
+def is_retryable(exc):
+    """Airtable 429s/5xx, Drive API errors and network failures are retried"""
+    # Imported here so importing jobs doesn't pull in googleapiclient
+    import requests
+    from googleapiclient.errors import HttpError
+
+    if isinstance(exc, RetryableError):
+        return True
+    if isinstance(exc, HttpError):
+        return exc.resp.status == 429 or exc.resp.status >= 500
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        return exc.response.status_code == 429 or exc.response.status_code >= 500
+    return isinstance(exc, (requests.ConnectionError, requests.Timeout, ConnectionError, TimeoutError))
+
+
+def backoff_delay(attempt, base=2.0, cap=300.0):
+    """Exponential backoff with full jitter: 0..min(cap, base * 2**attempt)"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class JobQueue:
+    """
+    Durable job queue stored in SQLite.
+
+    Jobs move queued -> running -> succeeded | failed. A retried job goes back
+    to queued with a later next_run_at. Handlers can record progress (e.g.
+    completed steps) so a retry resumes where the last attempt stopped.
+
+    The database can be shared by several worker processes. A claim is one
+    `BEGIN IMMEDIATE` transaction, so a job is handed to exactly one worker,
+    together with a lease of `lease_seconds` and an owner token. The worker
+    renews the lease while the job runs (`heartbeat()`); a running job whose
+    lease has expired belonged to a worker that died and is claimed again,
+    unless it has used up its `max_attempts`, in which case it fails.
+    Updates made with a stale owner token are ignored.
+
+    Every method is blocking (SQLite, possibly waiting on other processes);
+    async callers run them with run_blocking("jobs", ...). The database is
+    opened on first use (or by `open()` during warmup), not at construction.
+    """
+
+    def __init__(self, db_path, max_attempts=6, lease_seconds=60):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._db = None
+
+    def open(self):
+        """Open the database and create or migrate the table; idempotent"""
+        with self._lock:
+            self._open()
+
+    def _open(self):
+        if self._db is not None:
+            return
+        db = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id          TEXT PRIMARY KEY,
+                kind        TEXT NOT NULL,
+                payload     TEXT NOT NULL,
+                status      TEXT NOT NULL,
+                attempts    INTEGER NOT NULL DEFAULT 0,
+                next_run_at REAL NOT NULL,
+                progress    TEXT NOT NULL DEFAULT '{}',
+                result      TEXT,
+                error       TEXT,
+                created_at  REAL NOT NULL,
+                updated_at  REAL NOT NULL,
+                owner       TEXT,
+                lease_until REAL
+            )
+            """
+        )
+        columns = {row[1] for row in db.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (("owner", "TEXT"), ("lease_until", "REAL")):
+            if column not in columns:
+                db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        # Jobs left running by a version without leases get one that has
+        # already expired, so they are picked up again
+        db.execute("UPDATE jobs SET lease_until = 0 WHERE status = 'running' AND lease_until IS NULL")
+        db.execute("CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, next_run_at)")
+        db.execute("CREATE INDEX IF NOT EXISTS jobs_leases ON jobs (status, lease_until)")
+        self._db = db
+
+    def enqueue(self, kind, payload):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._open()
+            self._db.execute(
+                "INSERT INTO jobs (id, kind, payload, status, next_run_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), now, now, now),
+            )
+        return job_id
+
+    def claim(self):
+        """
+        Mark the next due job as running and return it, or None. The job's
+        `owner` token must be passed to every later update of this attempt.
+        Blocking; may wait on other processes' transactions.
+        """
+        now = time.time()
+        owner = uuid.uuid4().hex
+        with self._lock:
+            self._open()
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                # A job that keeps killing its worker must not be retried forever
+                exhausted = self._db.execute(
+                    "UPDATE jobs SET status = 'failed', owner = NULL, updated_at = ?, "
+                    "error = 'Worker stopped renewing its lease on the last attempt' "
+                    "WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+                    (now, now, self.max_attempts),
+                ).rowcount
+                expired = self._db.execute(
+                    "UPDATE jobs SET status = 'queued', owner = NULL, updated_at = ? "
+                    "WHERE status = 'running' AND lease_until < ?",
+                    (now, now),
+                ).rowcount
+                row = self._db.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' AND next_run_at <= ? "
+                    "ORDER BY next_run_at LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, owner = ?, "
+                        "lease_until = ?, updated_at = ? WHERE id = ?",
+                        (owner, now + self.lease_seconds, now, row["id"]),
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        if exhausted:
+            log.warning("Failed jobs whose worker stopped renewing its lease on the last attempt", count=exhausted)
+        if expired:
+            log.info("Re-queued jobs whose worker stopped renewing its lease", count=expired)
+        if row is None:
+            return None
+        job = self._to_dict(row)
+        job["status"] = "running"
+        job["attempts"] += 1
+        job["owner"] = owner
+        return job
+
+    def _update_owned(self, job_id, owner, assignments, params):
+        """Apply an update to a running job if `owner` still holds it; returns whether it did"""
+        with self._lock:
+            self._open()
+            cur = self._db.execute(
+                f"UPDATE jobs SET {assignments}, updated_at = ? WHERE id = ? AND owner = ? AND status = 'running'",
+                (*params, time.time(), job_id, owner),
+            )
+        return cur.rowcount == 1
+
+    def heartbeat(self, job_id, owner):
+        """Extend the lease; False if the job was given to another worker"""
+        return self._update_owned(job_id, owner, "lease_until = ?", (time.time() + self.lease_seconds,))
+
+    def save_progress(self, job_id, owner, progress):
+        return self._update_owned(job_id, owner, "progress = ?", (json.dumps(progress),))
+
+    def complete(self, job_id, owner, result):
+        return self._update_owned(
+            job_id, owner, "status = 'succeeded', result = ?, error = NULL, owner = NULL", (json.dumps(result),)
+        )
+
+    def retry(self, job_id, owner, error, delay):
+        return self._update_owned(
+            job_id, owner, "status = 'queued', error = ?, next_run_at = ?, owner = NULL", (error, time.time() + delay)
+        )
+
+    def fail(self, job_id, owner, error):
+        return self._update_owned(job_id, owner, "status = 'failed', error = ?, owner = NULL", (error,))
+
+    def get(self, job_id):
+        with self._lock:
+            self._open()
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    @staticmethod
+    def _to_dict(row):
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["progress"] = json.loads(job["progress"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+
+class JobWorkers:
+    """
+    Pool of asyncio tasks draining a JobQueue.
+
+    `handlers` maps a job kind to `async handler(job, save_progress)`, where
+    `await save_progress(progress)` records the job's progress. Errors that
+    is_retryable() accepts are retried with exponential backoff until the
+    queue's max_attempts; anything else fails the job immediately. Every
+    queue call runs on the "jobs" pool, off the event loop.
+    """
+
+    def __init__(self, queue: JobQueue, handlers, concurrency=4, poll_interval=0.5):
+        self.queue = queue
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._tasks = []
+        self._wakeup = None
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """Wake idle workers after enqueueing"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await run_blocking("jobs", self.queue.claim)
+            except sqlite3.OperationalError as e:
+                # Another process held the database past the busy timeout
+                log.warning("Could not claim a job", error=str(e))
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _run(self, job):
+        job_id, owner = job["id"], job["owner"]
+        handler = self.handlers.get(job["kind"])
+        if handler is None:
+            await run_blocking("jobs", self.queue.fail, job_id, owner, f"No handler for job kind {job['kind']!r}")
+            return
+
+        async def save_progress(progress):
+            await run_blocking("jobs", self.queue.save_progress, job_id, owner, progress)
+
+        # Log records of the job carry its id
+        request_id.set(job_id)
+        start = time.perf_counter()
+        attempt = asyncio.ensure_future(handler(job, save_progress))
+        try:
+            # Renew the lease while the handler runs; if another worker has
+            # taken the job over, stop this attempt rather than run it twice
+            while not attempt.done():
+                await asyncio.wait({attempt}, timeout=self.queue.lease_seconds / 3)
+                if not attempt.done() and not await run_blocking("jobs", self.queue.heartbeat, job_id, owner):
+                    log.warning("Job lease lost, abandoning attempt", attempt=job["attempts"])
+                    attempt.cancel()
+                    await asyncio.gather(attempt, return_exceptions=True)
+                    return
+            result = attempt.result()
+        except Exception as e:
+            JOB_SECONDS.observe(time.perf_counter() - start, job["kind"], "error")
+            error = f"{type(e).__name__}: {e}"
+            if is_retryable(e) and job["attempts"] < self.queue.max_attempts:
+                delay = backoff_delay(job["attempts"])
+                log.warning("Job attempt failed, retrying", attempt=job["attempts"], delay=round(delay, 1), error=error)
+                await run_blocking("jobs", self.queue.retry, job_id, owner, error, delay)
+            else:
+                log.error("Job failed", attempt=job["attempts"], error=error)
+                await run_blocking("jobs", self.queue.fail, job_id, owner, error)
+            return
+        finally:
+            if not attempt.done():
+                attempt.cancel()
+
+        JOB_SECONDS.observe(time.perf_counter() - start, job["kind"], "ok")
+        await run_blocking("jobs", self.queue.complete, job_id, owner, result)
+        log.info("Job completed", kind=job["kind"])
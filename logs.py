@@ -0,0 +1,127 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Fraction of sampled (routine, per-request) info/debug events that are kept;
+# warnings and errors are always logged
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+# Records waiting for the writer thread; beyond this, new records are dropped
+# rather than blocking the request that logged them
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        rid = getattr(record, "request_id", None)
+        if rid:
+            entry["request_id"] = rid
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _DropWhenFull(logging.handlers.QueueHandler):
+    dropped = 0
+
+    def prepare(self, record):
+        # Formatting happens on the writer thread; only freeze the message
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _DropWhenFull.dropped += 1
+
+
+class Logger:
+    """
+    Structured logger: `log.info("event name", key=value, ...)`.
+
+    Records go onto a queue and are formatted and written as JSON lines by a
+    background thread, so logging never waits on stdout. Pass `sample=True`
+    for routine per-request events to apply LOG_SAMPLE_RATE to them.
+    """
+
+    def __init__(self, name):
+        self._logger = logging.getLogger(f"app.{name}")
+
+    def _log(self, level, event, sample=False, exc_info=None, **fields):
+        if not self._logger.isEnabledFor(level):
+            return
+        if sample and level < logging.WARNING and LOG_SAMPLE_RATE < 1.0 and random.random() >= LOG_SAMPLE_RATE:
+            return
+        self._logger.log(
+            level, event, exc_info=exc_info, extra={"fields": fields, "request_id": request_id.get()}
+        )
+
+    def debug(self, event, **fields):
+        self._log(logging.DEBUG, event, **fields)
+
+    def info(self, event, **fields):
+        self._log(logging.INFO, event, **fields)
+
+    def warning(self, event, **fields):
+        self._log(logging.WARNING, event, **fields)
+
+    def error(self, event, **fields):
+        self._log(logging.ERROR, event, **fields)
+
+    def exception(self, event, **fields):
+        self._log(logging.ERROR, event, exc_info=True, **fields)
+
+
+_listener = None
+
+
+def setup():
+    """Route the app's loggers through the background writer; idempotent"""
+    global _listener
+    if _listener is not None:
+        return
+
+    records = queue.Queue(LOG_QUEUE_SIZE)
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    _listener = logging.handlers.QueueListener(records, handler)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger("app")
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(_DropWhenFull(records))
+    root.propagate = False
+
+
+def get_logger(name):
+    setup()
+    return Logger(name)
+
+
+def new_request_id():
+    rid = f"{int(time.time() * 1000):x}-{random.getrandbits(32):08x}"
+    request_id.set(rid)
+    return rid
+
+
+def dropped():
+    return _DropWhenFull.dropped
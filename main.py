@@ -1,28 +1,58 @@
+import asyncio
+import csv
 import os
-import uuid
+import sys
+import threading
+from contextlib import asynccontextmanager
+from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
 import json
-import requests
+import hashlib
+from typing import Optional
 
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from fastapi.staticfiles import StaticFiles
-
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-
-from pyairtable import Api
-
-from contract import GENERATED_CONTRACTS_DIR, generate_contract
-
-app = FastAPI()
-
-app.mount(
-    "/generated_contracts",
-    StaticFiles(directory=GENERATED_CONTRACTS_DIR),
-    name="generated_contracts",
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+
+from blocking import run_blocking, set_rate_limit
+from contract import (
+    CONTRACT_CACHE_MAX_AGE,
+    CONTRACT_SWEEP_INTERVAL,
+    InvalidFieldValue,
+    contract_engine,
+    contract_filename,
+    contract_store,
+    generate_contract,
+    pdf_renderer,
 )
+from contract_batch import BATCH_MAX_RECORDS, resolve_batch_records, shutdown_render_pool, stream_contracts_zip
+from contractors import ContractorCache, InvalidQuery, query_contractors
+from idempotency import IdempotencyCache, IdempotencyError, request_key
+from invoice_batch import EMAIL_FIELD, PO_FIELD, InvoiceBatch, parse_invoice_csv
+from jobs import JobQueue, JobWorkers
+import logs
+import metrics
+from po_ledger import PoLedger
+from ratelimit import TokenBucket
+from record_index import RecordIndex
+from steps import StepScheduler
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    job_workers.start()
+    # Not awaited, so the server binds its port straight away; anything a
+    # request needs before warmup gets to it is loaded on first use
+    warmup = asyncio.create_task(warm_up())
+    sweeper = asyncio.create_task(sweep_contracts())
+    yield
+    warmup.cancel()
+    sweeper.cancel()
+    await job_workers.stop()
+    await run_blocking("storage", contract_store.flush)
+    shutdown_render_pool()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -30,11 +60,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Content-Disposition", "X-Contract-Id"],
 )
+app.add_middleware(metrics.RequestMetricsMiddleware)
+
+log = logs.get_logger("api")
 
 # ============= ENV VARS =============
 
 AIRTABLE_API_KEY = os.getenv("AIRTABLE_API_KEY")
+# Alternative API root, e.g. the local stand-in used by bench/
+AIRTABLE_ENDPOINT_URL = os.getenv("AIRTABLE_ENDPOINT_URL", "https://api.airtable.com")
 
 # table 1 = Dummy Adobe Freelancer Payments
 AIRTABLE_BASE_1  = os.getenv("AIRTABLE_BASE_1")
@@ -53,86 +89,203 @@ AIRTABLE_TABLE_3 = os.getenv("AIRTABLE_TABLE_3")
 COMMUNITY_LEADERS_BASE = "app7924YTWUI9YhMK"
 COMMUNITY_LEADERS_TABLE = "tbl5Tl74DBlHg2805"
 
+# Contractor cache: serve from memory for TTL seconds, then keep serving the
+# stale copy for up to STALE_TTL more seconds while refreshing in the background
+CONTRACTORS_CACHE_TTL = int(os.getenv("CONTRACTORS_CACHE_TTL", "60"))
+CONTRACTORS_CACHE_STALE_TTL = int(os.getenv("CONTRACTORS_CACHE_STALE_TTL", "600"))
+CONTRACTORS_FULL_SYNC_INTERVAL = int(os.getenv("CONTRACTORS_FULL_SYNC_INTERVAL", "900"))
+
+
+# Background invoice jobs (POST /invoice?mode=async)
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "jobs.db"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "6"))
+# A running job is handed to another worker if its worker hasn't renewed
+# the lease for this long (the worker renews it every third of it)
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "60"))
+
+# Airtable allows 5 requests/second per base; the bucket file is shared by
+# every worker process so the limit holds across the whole deployment
+AIRTABLE_RATE_LIMIT = float(os.getenv("AIRTABLE_RATE_LIMIT", "5"))
+AIRTABLE_RATE_BURST = int(os.getenv("AIRTABLE_RATE_BURST", "5"))
+AIRTABLE_RATE_LIMIT_DB = os.getenv(
+    "AIRTABLE_RATE_LIMIT_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ratelimit.db")
+)
 
-# Google Drive OAuth config
-DRIVE_FOLDER_ID = os.getenv("GDRIVE_FOLDER_ID", "1eKDgZvxW8lecck_CiqdDWVWOmiZjFNry")
-OAUTH_TOKEN_JSON = os.getenv("GDRIVE_OAUTH_TOKEN_JSON")  # contents of token.json
+# Max invoices per POST /invoices/batch
+INVOICE_BATCH_MAX = int(os.getenv("INVOICE_BATCH_MAX", "1000"))
 
-SCOPES = ["https://www.googleapis.com/auth/drive.file"]
+# Repeats of /invoice and /generate-contract (same Idempotency-Key, or the
+# same body when there is no key) are answered from the first response for
+# this long; body-hash keys only need to cover double submits
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "600"))
+IDEMPOTENCY_HASH_TTL = int(os.getenv("IDEMPOTENCY_HASH_TTL", "60"))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
 
-api = Api(AIRTABLE_API_KEY)
+_api = None
+_api_lock = threading.Lock()
 
 
-# ============= GOOGLE DRIVE HELPERS (OAuth) =============
-def get_drive_client():
-    """
-    Returns an authenticated Drive client using OAuth user credentials
-    stored in the GDRIVE_OAUTH_TOKEN_JSON env var.
-    """
-    if not OAUTH_TOKEN_JSON:
-        print("⚠️ No GDRIVE_OAUTH_TOKEN_JSON set — skipping Drive upload")
-        return None
+def airtable_api():
+    """Shared Airtable client, built on first use (pyairtable is slow to import)"""
+    global _api
+    if _api is None:
+        with _api_lock:
+            if _api is None:
+                from pyairtable import Api
 
-    try:
-        info = json.loads(OAUTH_TOKEN_JSON)
-        creds = Credentials.from_authorized_user_info(info, scopes=SCOPES)
+                _api = Api(AIRTABLE_API_KEY, endpoint_url=AIRTABLE_ENDPOINT_URL)
+    return _api
 
-        # If the token is expired but has a refresh token, it will auto-refresh
-        # when used by the Google API client.
-        return build("drive", "v3", credentials=creds)
-    except Exception as e:
-        print(f"❌ Failed to create Drive client from OAuth token: {e}")
-        return None
 
+# SQLite databases here and below are opened on first use or by warmup, so
+# importing main doesn't touch the disk
+airtable_rate_limit = TokenBucket(AIRTABLE_RATE_LIMIT, AIRTABLE_RATE_BURST, AIRTABLE_RATE_LIMIT_DB, name="airtable")
+set_rate_limit("airtable", airtable_rate_limit)
 
-def upload_pdf_to_drive(pdf_path: str, folder_id: str = DRIVE_FOLDER_ID):
-    """
-    Uploads PDF to Google Drive folder using OAuth credentials.
-    """
-    drive = get_drive_client()
-    if not drive:
-        return None
+contractor_cache = ContractorCache(
+    lambda: airtable_api().table(COMMUNITY_LEADERS_BASE, COMMUNITY_LEADERS_TABLE),
+    ttl=CONTRACTORS_CACHE_TTL,
+    stale_ttl=CONTRACTORS_CACHE_STALE_TTL,
+    full_sync_interval=CONTRACTORS_FULL_SYNC_INTERVAL,
+)
 
-    if not os.path.exists(pdf_path):
-        print(f"⚠️ File not found, skipping Drive upload: {pdf_path}")
-        return None
+# Email -> community member and PO -> purchase order lookups for /invoice,
+# served from memory and kept fresh by incremental syncs
+INVOICE_INDEX_TTL = int(os.getenv("INVOICE_INDEX_TTL", "30"))
+INVOICE_INDEX_FULL_SYNC_INTERVAL = int(os.getenv("INVOICE_INDEX_FULL_SYNC_INTERVAL", "900"))
+
+member_index = RecordIndex(
+    lambda: airtable_api().table(AIRTABLE_BASE_2, AIRTABLE_TABLE_2),
+    EMAIL_FIELD,
+    fields=[EMAIL_FIELD],
+    ttl=INVOICE_INDEX_TTL,
+    full_sync_interval=INVOICE_INDEX_FULL_SYNC_INTERVAL,
+)
+po_index = RecordIndex(
+    lambda: airtable_api().table(AIRTABLE_BASE_1, AIRTABLE_TABLE_3),
+    PO_FIELD,
+    fields=[PO_FIELD, "Balance"],
+    ttl=INVOICE_INDEX_TTL,
+    full_sync_interval=INVOICE_INDEX_FULL_SYNC_INTERVAL,
+)
 
-    metadata = {
-        "name": os.path.basename(pdf_path),
-        "parents": [folder_id],
-    }
-    media = MediaFileUpload(pdf_path, mimetype="application/pdf")
 
-    try:
-        file = (
-            drive.files()
-            .create(body=metadata, media_body=media, fields="id, webViewLink")
-            .execute()
-        )
-        print(f"☁️ Uploaded to Drive: {file}")
-        return file
-    except Exception as e:
-        print(f"❌ Drive upload failed: {e}")
-        return None
+async def warm_indexes():
+    """Initial full sync of the invoice indexes; lookups fall back to Airtable until it's done"""
+    for name, index in (("member", member_index), ("PO", po_index)):
+        try:
+            await run_blocking("airtable", index.sync, True)
+            log.info("Index warmed", index=name, records=index.usage()["records"])
+        except Exception as e:
+            log.warning("Could not warm index", index=name, error=str(e))
+
+
+def transfer_invoice_pdf(url, raise_errors=False):
+    """Stream an invoice PDF into Drive; blocking, and imports the Drive client on first use"""
+    from drive import stream_pdf_to_drive
+
+    return stream_pdf_to_drive(url, raise_errors=raise_errors)
+
+
+def drive_clients():
+    """The Drive client manager if the drive module has been loaded and is configured"""
+    drive = sys.modules.get("drive")
+    return drive.drive_clients if drive else None
+
+
+def _warm_drive():
+    import drive
+
+    if drive.drive_clients is not None:
+        drive.drive_clients.ensure_token()
 
 
-def download_temp_pdf(url: str):
+async def warm_up():
     """
-    Downloads the invoice PDF to /tmp and returns its filepath.
+    Startup work that runs in the background once the server is up: compile
+    the contract templates, load the Airtable and Drive clients, open the
+    contract store and the SQLite databases, sync the lookup indexes and
+    contractor cache, and write out PO debits recorded before a restart.
+    Each step is optional; a failure is logged and the work is redone on
+    first use.
     """
+    steps = [
+        ("contract_templates", "render", contract_engine.warm),
+        ("pdf_templates", "render", pdf_renderer.warm),
+        ("contract_store", "startup", contract_store.open),
+        ("rate_limit", "startup", airtable_rate_limit.open),
+        ("job_queue", "jobs", job_queue.open),
+        ("po_ledger", "ledger", po_ledger.open),
+        ("airtable_client", "startup", airtable_api),
+        ("drive_client", "drive", _warm_drive),
+    ]
+    for name, dependency, fn in steps:
+        try:
+            await run_blocking(dependency, fn)
+        except Exception as e:
+            log.warning("Warmup step failed", step=name, error=str(e))
+
+    await warm_indexes()
     try:
-        resp = requests.get(url)
-        resp.raise_for_status()
+        await run_blocking("airtable", contractor_cache.get_all)
+    except Exception as e:
+        log.warning("Warmup step failed", step="contractor_cache", error=str(e))
+    try:
+        # Debits recorded before a restart but never written to Airtable
+        await po_ledger.flush()
+    except Exception as e:
+        log.warning("Warmup step failed", step="po_ledger", error=str(e))
+    log.info("Warmup done")
 
-        tmp_path = f"/tmp/{uuid.uuid4()}.pdf"
-        with open(tmp_path, "wb") as f:
-            f.write(resp.content)
 
-        print(f"⬇️ Downloaded temporary PDF: {tmp_path}")
-        return tmp_path
-    except Exception as e:
-        print(f"❌ Failed to download invoice PDF: {e}")
-        return None
+async def lookup_record(index: RecordIndex, key) -> list:
+    """Index lookup with an Airtable fallback on a miss, as a list of matches"""
+    record = index.get(key)
+    if record is None:
+        record = await run_blocking("airtable", index.fetch, key)
+    return [record] if record else []
+
+
+job_queue = JobQueue(JOBS_DB_PATH, max_attempts=JOB_MAX_ATTEMPTS, lease_seconds=JOB_LEASE_SECONDS)
+
+# PO balance debits go through a local ledger; bursts against the same PO
+# within PO_LEDGER_FLUSH_DELAY seconds share one Airtable read and write
+PO_LEDGER_DB_PATH = os.getenv(
+    "PO_LEDGER_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "po_ledger.db")
+)
+PO_LEDGER_FLUSH_DELAY = float(os.getenv("PO_LEDGER_FLUSH_DELAY", "0.05"))
+
+
+async def call_airtable(fn, *args, **kwargs):
+    return await run_blocking("airtable", fn, *args, **kwargs)
+
+
+po_ledger = PoLedger(
+    PO_LEDGER_DB_PATH,
+    lambda: airtable_api().table(AIRTABLE_BASE_1, AIRTABLE_TABLE_3),
+    call_airtable,
+    flush_delay=PO_LEDGER_FLUSH_DELAY,
+    on_balance=lambda record_id, balance: po_index.update_fields(record_id, {"Balance": balance}),
+)
+
+
+idempotency = IdempotencyCache(
+    ttl=IDEMPOTENCY_TTL, hash_ttl=IDEMPOTENCY_HASH_TTL, max_entries=IDEMPOTENCY_CACHE_SIZE
+)
+
+
+def replay_headers(replayed: bool) -> dict:
+    return {"Idempotent-Replayed": "true"} if replayed else {}
+
+
+def etag_matches(if_none_match, etag):
+    """True if an If-None-Match header value matches the given ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (tag.strip() for tag in if_none_match.split(","))
 
 
 @app.get("/")
@@ -141,203 +294,568 @@ def home():
 
 # ============= CONTRACTORS ENDPOINT FOR DROPDOWN =============
 @app.get("/contractors")
-async def get_contractors():
+async def get_contractors(
+    request: Request,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    po: Optional[str] = None,
+    email_prefix: Optional[str] = None,
+    fields: Optional[str] = None,
+):
     """
-    Fetch all contractors from Community Leaders table for contract generation dropdown
+    Fetch contractors from Community Leaders table for contract generation dropdown.
+
+    Supports cursor pagination (limit/cursor), filters on status, PO and
+    email prefix, and a comma separated fields= projection. Responses carry a
+    strong ETag; a matching If-None-Match gets an empty 304.
     """
     try:
-        print("📋 Fetching contractors from Airtable...")
-        table = api.table(COMMUNITY_LEADERS_BASE, COMMUNITY_LEADERS_TABLE)
-        records = table.all()
-        
-        # Transform records to simplified format
-        contractors = []
-        for record in records:
-            try:
-                fields = record.get('fields', {})
-                
-                # Extract email
-                email_field = fields.get('Email (from Community Member)', [])
-                
-                # Handle different formats
-                if isinstance(email_field, list) and len(email_field) > 0:
-                    email = email_field[0]
-                elif isinstance(email_field, str):
-                    email = email_field
-                else:
-                    email = ""
-                
-                # Extract rate/amount from Rate Formula field - with extra safety
-                rate_formula = fields.get('Rate Formula', '')
-                amount = ""
-                
-                if rate_formula:
-                    if isinstance(rate_formula, (int, float)):
-                        # If it's already a number, just convert to string
-                        amount = str(rate_formula)
-                    elif isinstance(rate_formula, str):
-                        # If it's a string like "$3,000.00", clean it up
-                        amount = rate_formula.replace('$', '').replace(',', '').strip()
-                    else:
-                        # Unknown type, convert to string
-                        amount = str(rate_formula)
-                
-                contractor = {
-                    'id': record['id'],
-                    'summary': fields.get('Summary', ''),
-                    'email': email,
-                    'date': fields.get('Date', ''),
-                    'status': fields.get('Status', ''),
-                    'po': fields.get('PO', ''),
-                    'amount': amount,
-                }
-                contractors.append(contractor)
-                
-            except Exception as record_error:
-                # Skip this record but continue processing others
-                print(f"⚠️ Error processing record {record.get('id', 'unknown')}: {record_error}")
-                continue
-        
-        print(f"✅ Found {len(contractors)} contractors")
-        return {"status": "success", "contractors": contractors}
-    
+        if contractor_cache.needs_blocking_sync:
+            contractors = await run_blocking("airtable", contractor_cache.get_all)
+        else:
+            contractors = contractor_cache.get_all()
+        page, next_cursor = query_contractors(
+            contractors,
+            status=status,
+            po=po,
+            email_prefix=email_prefix,
+            fields=fields,
+            cursor=cursor,
+            limit=limit,
+        )
+    except InvalidQuery as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print("❌ Error fetching contractors:", e)
-        import traceback
-        traceback.print_exc()
+        log.exception("Error fetching contractors")
         return {"status": "error", "message": str(e)}
 
+    payload = {"status": "success", "contractors": page}
+    if next_cursor:
+        payload["next_cursor"] = next_cursor
+
+    body = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    log.info("Serving contractors", count=len(page), total=len(contractors), cache_age=round(contractor_cache.age), sample=True)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.post("/contractors/invalidate")
+async def invalidate_contractors(full: bool = False):
+    """
+    Drop the cached contractor list so the next read syncs with Airtable.
+    Pass full=true to re-fetch the whole table instead of only changed rows.
+    """
+    contractor_cache.invalidate(full=full)
+    log.info("Contractor cache invalidated", full=full)
+    return {"status": "success"}
+
 
 # ============= CREATE CONTRACT =============
+CONTRACT_MEDIA_TYPES = {
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "pdf": "application/pdf",
+}
+
+
 @app.post("/generate-contract")
 async def create_contract(request: Request):
     try:
-        data = await request.json()
+        body = await request.body()
+        data = json.loads(body)
         record = data.get("record")
 
         if not record:
             return {"error": "No record data provided"}
 
-        docx_path = generate_contract(record)
-        contractor = record.get("contractor_name", "Unknown contractor")
-        print(f"✅ Contract generated for {contractor}: {docx_path}")
+        output_format = data.get("format", "docx")
+        if output_format not in CONTRACT_MEDIA_TYPES:
+            raise HTTPException(status_code=400, detail=f"Unsupported format: {output_format}")
+
+        async def generate():
+            docx_path = await run_blocking("render", generate_contract, record, output_format)
+            contractor = record.get("contractor_name", "Unknown contractor")
+            log.info("Contract generated", contractor=contractor, path=docx_path, sample=True)
 
-        # Upload to Google Drive (optional - if PO folder feature is enabled)
-        # drive_file = upload_pdf_to_drive(docx_path)
+            # Upload to Google Drive (optional - if PO folder feature is enabled)
+            # drive_file = upload_pdf_to_drive(docx_path)
+            return docx_path
+
+        # Identical concurrent requests share one render; repeats within the
+        # TTL skip it, unless the stored file has since been evicted
+        key, fingerprint, _ = request_key("generate-contract", request.headers, body)
+        docx_path, replayed = await idempotency.run(key, fingerprint, generate, valid=os.path.exists)
 
         if not os.path.exists(docx_path):
             raise HTTPException(status_code=404, detail="Contract file not found")
         
-        filename = os.path.basename(docx_path)
+        filename = contract_filename(record, output_format)
+        # The file is stored under its content hash; X-Contract-Id is that
+        # name. /download-contract and /generated_contracts/ accept it, and
+        # the download name too, as older clients link to that
+        contract_id = os.path.basename(docx_path)
+        await run_blocking("storage", contract_store.alias, filename, contract_id)
+        headers = {**replay_headers(replayed), "X-Contract-Id": contract_id}
         return FileResponse(
             docx_path, 
-            media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-            filename=filename
+            media_type=CONTRACT_MEDIA_TYPES[output_format],
+            filename=filename,
+            headers=headers,
         )
 
+    except HTTPException:
+        raise
+    except (IdempotencyError, InvalidFieldValue) as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
-        print("❌ Error generating contract:", e)
-        import traceback
-        traceback.print_exc()
+        log.exception("Error generating contract")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/generate-contracts/batch")
+async def create_contracts_batch(request: Request):
+    """
+    Renders many contracts in one request and streams them back as a ZIP.
+
+    Body: {"records": [...], "defaults": {...}}. Each record holds the
+    contract fields, merged over `defaults`. A record may also carry the
+    `record_id` of a Community Leaders row, which fills in its email,
+    amount and PO; contractor_name, address and the other fields still
+    have to be sent. Per-record failures are listed in the archive's
+    manifest.json.
+    """
+    try:
+        data = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be valid JSON")
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=400, detail="Body must be a JSON object")
+    if "record_ids" in data:
+        raise HTTPException(
+            status_code=400,
+            detail="record_ids is not supported; send records with a record_id and the contract fields",
+        )
+    items = data.get("records") or []
+    defaults = data.get("defaults") or {}
+    if not isinstance(items, list) or not isinstance(defaults, dict):
+        raise HTTPException(status_code=400, detail="records must be a list, defaults an object")
+
+    if not items:
+        raise HTTPException(status_code=400, detail="No records provided")
+    if len(items) > BATCH_MAX_RECORDS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_RECORDS} records per batch")
+
+    contractors, lookup_error = {}, None
+    if any(isinstance(item, dict) and item.get("record_id") for item in items):
+        try:
+            if contractor_cache.needs_blocking_sync:
+                contractor_list = await run_blocking("airtable", contractor_cache.get_all)
+            else:
+                contractor_list = contractor_cache.get_all()
+            contractors = {c["id"]: c for c in contractor_list}
+        except Exception as e:
+            # Only the records that reference a contractor fail
+            log.warning("Contractor lookup failed for batch", error=str(e))
+            lookup_error = str(e)
+
+    records = resolve_batch_records(items, defaults, contractors, lookup_error)
+    log.info("Rendering contract batch", count=len(records))
+
+    archive_name = f"contracts_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+    return StreamingResponse(
+        stream_contracts_zip(records),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{archive_name}"'},
+    )
+
+
+def not_modified(request: Request, etag: str, modified_at: float) -> bool:
+    """Conditional GET: If-None-Match, or failing that If-Modified-Since"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(modified_at) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+async def contract_file_response(request: Request, filename: str, download: bool) -> Response:
+    """
+    Serves a stored contract from the store's index: the name must be a
+    live `<key><ext>` entry, or a `contract_<name>_<timestamp>` download
+    name the store resolves (an alias or a pre-store file in its root), so
+    nothing outside the store can be reached. The lookup stats the file
+    (another worker may have evicted it) and that stat is reused by
+    FileResponse, which handles Range and If-Range (and hands the path to
+    the server when it supports pathsend). The lookup can hit SQLite and
+    the disk, so it runs on the storage pool.
+    """
+    entry = await run_blocking("storage", contract_store.lookup, filename)
+    if entry is None:
+        log.warning("Contract not found", filename=filename)
+        raise HTTPException(status_code=404, detail="Contract not found")
+
+    output_format = os.path.splitext(filename)[1].lstrip(".")
+    if entry["sha256"]:
+        etag = f'"{entry["sha256"]}"'
+    else:
+        # Legacy file without a recorded hash
+        etag = f'"{entry["stat"].st_mtime_ns:x}-{entry["size"]:x}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(entry["created_at"], usegmt=True),
+        # Stored contracts never change: they are named by content hash or,
+        # for download names, by creation time. private: they hold personal
+        # details. no-transform: .docx is already deflated, so proxies
+        # shouldn't gzip it again.
+        "Cache-Control": f"private, max-age={CONTRACT_CACHE_MAX_AGE}, immutable, no-transform",
+    }
+    if not_modified(request, etag, entry["created_at"]):
+        return Response(status_code=304, headers=headers)
+
+    log.info("Serving contract download", path=entry["path"], sample=True)
+    return FileResponse(
+        entry["path"],
+        media_type=CONTRACT_MEDIA_TYPES[output_format],
+        filename=filename if download else None,
+        headers=headers,
+        stat_result=entry["stat"],
+    )
+
+
 @app.get("/download-contract")
-async def download_contract(filename: str):
-    file_path = os.path.join(GENERATED_CONTRACTS_DIR, filename)
+async def download_contract(request: Request, filename: str):
+    """`filename` is the X-Contract-Id returned by /generate-contract, or its download name"""
+    return await contract_file_response(request, filename, download=True)
 
-    if not os.path.exists(file_path):
-        print(f"⚠️ Contract not found: {filename}")
-        raise HTTPException(status_code=404, detail="Contract not found")
 
-    print(f"📄 Serving contract download: {file_path}")
-    return FileResponse(file_path, media_type="application/pdf", filename=filename)
+@app.get("/generated_contracts/{filename}")
+async def get_generated_contract(request: Request, filename: str):
+    """Stored contract served inline, at the path the directory used to be mounted on"""
+    return await contract_file_response(request, filename, download=False)
+
+
+async def sweep_contracts():
+    """Applies the contract store's age and size quotas every CONTRACT_SWEEP_INTERVAL seconds"""
+    while True:
+        await asyncio.sleep(CONTRACT_SWEEP_INTERVAL)
+        try:
+            removed = await run_blocking("storage", contract_store.sweep)
+            if any(removed.values()):
+                log.info("Contract store swept", **removed)
+        except Exception as e:
+            log.warning("Contract store sweep failed", error=str(e))
 
 
 # ============= INVOICE FLOW =============
-@app.post("/invoice")
-async def process_invoice(request: Request):
-    try:
-        print("📌 /invoice endpoint HIT")
-
-        data = await request.json()
-        print("📨 Incoming payload:", data)
-
-        paymentName   = data.get("paymentName")
-        invoiceDate   = data.get("invoiceDate")
-        description   = data.get("description")
-        totalPayment  = data.get("totalPayment")
-        purchaseOrder = data.get("purchaseOrder")
-        email         = data.get("email")
-        invoicePdfUrl = data.get("invoicePdfUrl")
-
-        # ---------- TABLE 1 INSERT ----------
-        print("➡️ inserting into Airtable1...")
-        t1 = api.table(AIRTABLE_BASE_1, AIRTABLE_TABLE_1)
-        r1 = t1.create({
+def build_invoice_steps(data: dict, strict: bool = False, ref: Optional[str] = None) -> StepScheduler:
+    """
+    Lays out the invoice side-effects as a step graph. The lookups and the
+    PDF transfer run concurrently; each update waits for its lookup, and the
+    PO debit also waits for the invoice row, so a PO is never charged for an
+    invoice that wasn't recorded.
+
+    With strict=True, Drive transfer failures raise instead of being
+    skipped, so a queued job can retry them. `ref` identifies the invoice in
+    the PO ledger so a retried job doesn't debit the PO twice.
+    """
+    paymentName   = data.get("paymentName")
+    invoiceDate   = data.get("invoiceDate")
+    description   = data.get("description")
+    totalPayment  = data.get("totalPayment")
+    purchaseOrder = data.get("purchaseOrder")
+    email         = data.get("email")
+    invoicePdfUrl = data.get("invoicePdfUrl")
+
+    t1 = airtable_api().table(AIRTABLE_BASE_1, AIRTABLE_TABLE_1)
+    t2 = airtable_api().table(AIRTABLE_BASE_2, AIRTABLE_TABLE_2)
+
+    # ---------- TABLE 1 INSERT ----------
+    async def table1_create():
+        r1 = await run_blocking("airtable", t1.create, {
             "Payment Name":    paymentName,
             "Invoice Date":    invoiceDate,
             "Description":     description,
             "Total Payment":   totalPayment,
             "Purchase Orders": purchaseOrder
         })
-        print("✅ Airtable1 insert OK:", r1)
-
-        # ---------- TABLE 2 UPDATE ----------
-        print(f"🔎 searching Airtable2 for email: {email}")
-        t2 = api.table(AIRTABLE_BASE_2, AIRTABLE_TABLE_2)
-        matches = t2.all(formula=f"{{Email (from Community Member)}} = '{email}'")
-        print("🔍 matches:", matches)
-
-        if matches:
-            rid = matches[0]["id"]
-            print("✏️ updating Airtable2 record:", rid)
-            t2.update(rid, {
-                "Status": "Payment requested",
-                "Invoice": [{"url": invoicePdfUrl}]
-            })
-            print("✅ Airtable2 update done")
-
-        # ---------- TABLE 3 BALANCE SUBTRACT ----------
-        print(f"🔎 searching Airtable3 for purchaseOrder: {purchaseOrder}")
-        t3 = api.table(AIRTABLE_BASE_1, AIRTABLE_TABLE_3)
-        po_matches = t3.all(formula=f"{{Orders}} = '{purchaseOrder}'")
-        print("🔍 PO matches:", po_matches)
-
-        if po_matches:
-            po_id = po_matches[0]["id"]
-            po_rec = po_matches[0]["fields"]
-            current_balance = po_rec.get("Balance", 0)
-
-            new_balance = current_balance - totalPayment
-            if new_balance < 0:
-                new_balance = 0
-
-            print(f"✏️ updating Airtable3 Balance: {current_balance} -> {new_balance}")
-            t3.update(po_id, {"Balance": new_balance})
-            print("✅ Airtable3 Balance updated")
-
-        # ---------- GOOGLE DRIVE UPLOAD OF INVOICE PDF ----------
-        drive_upload_file = None
-
-        if invoicePdfUrl:
-            print(f"⬇️ Downloading invoice PDF for Drive upload: {invoicePdfUrl}")
-            temp_pdf = download_temp_pdf(invoicePdfUrl)
-
-            if temp_pdf:
-                print(f"☁️ Uploading invoice PDF to Google Drive: {temp_pdf}")
-                drive_upload_file = upload_pdf_to_drive(temp_pdf)
-
-        print("🎉 /invoice COMPLETED")
-
-        return {
-            "ok": True,
-            "airtable1_created": r1,
-            "airtable2_updated_records": len(matches),
-            "airtable3_balance_updated": len(po_matches),
-            "drive_file": drive_upload_file,
-        }
+        log.info("Airtable1 insert OK", record_id=r1.get("id"), sample=True)
+        return r1
+
+    # ---------- TABLE 2 UPDATE ----------
+    async def table2_lookup():
+        matches = await lookup_record(member_index, email)
+        log.debug("Airtable2 matches", email=email, matches=[m["id"] for m in matches])
+        return matches
+
+    async def table2_update(matches):
+        if not matches:
+            return None
+        rid = matches[0]["id"]
+        await run_blocking("airtable", t2.update, rid, {
+            "Status": "Payment requested",
+            "Invoice": [{"url": invoicePdfUrl}]
+        })
+        log.info("Airtable2 update done", record_id=rid, sample=True)
+        return rid
+
+    # ---------- TABLE 3 BALANCE SUBTRACT ----------
+    async def table3_lookup():
+        po_matches = await lookup_record(po_index, purchaseOrder)
+        log.debug("Airtable3 PO matches", purchase_order=purchaseOrder, matches=[m["id"] for m in po_matches])
+        return po_matches
+
+    async def table3_update(po_matches, invoice):
+        if not po_matches:
+            return None
+        po_id = po_matches[0]["id"]
+
+        new_balance = await po_ledger.debit(po_id, totalPayment, ref=ref and f"{ref}:table3")
+        log.info("Airtable3 Balance updated", record_id=po_id, amount=totalPayment, balance=new_balance, sample=True)
+        return new_balance
+
+    # ---------- GOOGLE DRIVE UPLOAD OF INVOICE PDF ----------
+    async def drive_upload():
+        if not invoicePdfUrl:
+            return None
+        return await run_blocking("drive", transfer_invoice_pdf, invoicePdfUrl, raise_errors=strict)
+
+    steps = StepScheduler()
+    steps.add("table1_create", table1_create)
+    steps.add("table2_lookup", table2_lookup)
+    steps.add("table2_update", table2_update, depends_on=["table2_lookup"])
+    steps.add("table3_lookup", table3_lookup)
+    steps.add("table3_update", table3_update, depends_on=["table3_lookup", "table1_create"])
+    steps.add("drive_upload", drive_upload)
+    return steps
+
+
+# Number of steps added in build_invoice_steps, reported by /jobs/{id}
+INVOICE_STEP_COUNT = 6
+
+
+def invoice_response(steps: StepScheduler, results: dict, timings: dict) -> dict:
+    return {
+        "ok": True,
+        "airtable1_created": results["table1_create"],
+        "airtable2_updated_records": len(results["table2_lookup"]),
+        "airtable3_balance_updated": len(results["table3_lookup"]),
+        "drive_file": results["drive_upload"],
+        "timings": timings,
+        "critical_path": steps.critical_path(timings),
+    }
+
+
+def validate_invoice(data) -> list:
+    """Returns a list of problems with an invoice payload (empty if valid)"""
+    if not isinstance(data, dict):
+        return ["payload must be a JSON object"]
+
+    errors = []
+    for key in ("paymentName", "purchaseOrder", "email"):
+        if not data.get(key):
+            errors.append(f"{key} is required")
+    if not isinstance(data.get("totalPayment"), (int, float)) or isinstance(data.get("totalPayment"), bool):
+        errors.append("totalPayment must be a number")
+    if data.get("invoicePdfUrl") is not None and not isinstance(data["invoicePdfUrl"], str):
+        errors.append("invoicePdfUrl must be a string")
+    return errors
+
+
+def wants_async(request: Request) -> bool:
+    """Async mode is requested with ?mode=async or a `Prefer: respond-async` header"""
+    if request.query_params.get("mode") == "async":
+        return True
+    return "respond-async" in request.headers.get("prefer", "")
+
+
+async def run_invoice_job(job: dict, save_progress) -> dict:
+    """Job handler: runs the invoice steps, resuming from recorded progress"""
+    completed = dict(job["progress"])
+
+    async def on_step_done(name, result):
+        completed[name] = result
+        # A copy: other steps may finish while it is being saved
+        await save_progress(dict(completed))
+
+    steps = build_invoice_steps(job["payload"], strict=True, ref=job["id"])
+    results, timings = await steps.run(completed=completed, on_step_done=on_step_done)
+    return invoice_response(steps, results, timings)
+
+
+job_workers = JobWorkers(job_queue, {"invoice": run_invoice_job}, concurrency=JOB_WORKERS)
+
 
+@app.post("/invoice")
+async def process_invoice(request: Request):
+    """
+    Retries and double submits are collapsed: requests with the same
+    Idempotency-Key header (or, without one, the same body) share the first
+    request's response while it runs and for IDEMPOTENCY_TTL seconds after
+    it succeeds. Replayed responses carry `Idempotent-Replayed: true`.
+    """
+    try:
+        body = await request.body()
+        data = json.loads(body)
+        log.debug("Incoming invoice payload", payload=data)
+        queued = wants_async(request)
+        key, fingerprint, client_key = request_key("invoice:async" if queued else "invoice", request.headers, body)
+
+        async def handle():
+            """(status code, payload, headers)"""
+            if queued:
+                errors = validate_invoice(data)
+                if errors:
+                    return 422, {"status": "error", "errors": errors}, {}
+
+                job_id = await run_blocking("jobs", job_queue.enqueue, "invoice", data)
+                job_workers.notify()
+                log.info("Invoice queued", job_id=job_id)
+                return 202, {"status": "accepted", "job_id": job_id, "status_url": f"/jobs/{job_id}"}, {"Location": f"/jobs/{job_id}"}
+
+            # A client key also makes the PO debit idempotent in the ledger,
+            # which holds across processes and restarts
+            steps = build_invoice_steps(data, ref=client_key and f"invoice:{client_key}")
+            results, timings = await steps.run()
+
+            log.info("Invoice completed", critical_path=steps.critical_path(timings), sample=True)
+            return 200, invoice_response(steps, results, timings), {}
+
+        (status, payload, headers), replayed = await idempotency.run(
+            key, fingerprint, handle, cacheable=lambda response: response[0] < 400
+        )
+        if replayed:
+            log.info("Invoice replayed", idempotency_key=client_key, sample=True)
+        return JSONResponse(payload, status_code=status, headers={**headers, **replay_headers(replayed)})
+
+    except IdempotencyError as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=422)
     except Exception as e:
-        print("❌ Error in /invoice:", e)
+        log.exception("Error in /invoice")
         return {"status": "error", "message": str(e)}
+
+
+@app.post("/invoices/batch")
+async def process_invoices_batch(request: Request):
+    """
+    Bulk invoice import. Accepts `{"invoices": [...], "upsert_key": [...]}`
+    or a text/csv body with /invoice payload keys as headers. Airtable writes
+    are grouped per table, 10 records per request; the response has one
+    result per invoice, in input order.
+    """
+    upsert_key = request.query_params.getlist("upsert_key") or None
+    if request.headers.get("content-type", "").startswith("text/csv"):
+        try:
+            invoices = parse_invoice_csv((await request.body()).decode("utf-8-sig"))
+        except (UnicodeDecodeError, csv.Error) as e:
+            return JSONResponse({"status": "error", "message": f"invalid CSV: {e}"}, status_code=400)
+    else:
+        try:
+            body = json.loads(await request.body())
+        except ValueError:
+            return JSONResponse({"status": "error", "message": "body must be valid JSON"}, status_code=400)
+        if not isinstance(body, dict) or not isinstance(body.get("invoices"), list):
+            return JSONResponse({"status": "error", "message": "invoices must be a list"}, status_code=422)
+        invoices = body["invoices"]
+        upsert_key = body.get("upsert_key") or upsert_key
+    if upsert_key is not None and not (
+        isinstance(upsert_key, list) and all(isinstance(field, str) and field for field in upsert_key)
+    ):
+        return JSONResponse({"status": "error", "message": "upsert_key must be a list of field names"}, status_code=422)
+
+    if len(invoices) > INVOICE_BATCH_MAX:
+        return JSONResponse(
+            {"status": "error", "message": f"at most {INVOICE_BATCH_MAX} invoices per batch"},
+            status_code=413,
+        )
+
+    errors = {i: validate_invoice(invoice) for i, invoice in enumerate(invoices)}
+
+    async def transfer_pdf(url):
+        return await run_blocking("drive", transfer_invoice_pdf, url, raise_errors=True)
+
+    batch = InvoiceBatch(
+        airtable_api().table(AIRTABLE_BASE_1, AIRTABLE_TABLE_1),
+        airtable_api().table(AIRTABLE_BASE_2, AIRTABLE_TABLE_2),
+        airtable_api().table(AIRTABLE_BASE_1, AIRTABLE_TABLE_3),
+        call=call_airtable,
+        transfer_pdf=transfer_pdf,
+        upsert_fields=upsert_key,
+        member_index=member_index,
+        po_index=po_index,
+        ledger=po_ledger,
+    )
+    results = await batch.run(invoices, errors)
+
+    failed = sum(1 for r in results if r["status"] == "error")
+    log.info("Invoice batch completed", ok=len(results) - failed, failed=failed)
+    return {"status": "success" if not failed else "partial", "count": len(results), "failed": failed, "results": results}
+
+
+@app.get("/drive/metrics")
+async def drive_metrics():
+    """Token refresh and connection reuse counters for the shared Drive clients"""
+    clients = drive_clients()
+    if clients is None:
+        return {"status": "disabled" if "drive" in sys.modules else "not loaded"}
+    return {"status": "success", "metrics": clients.metrics()}
+
+
+@app.get("/invoice/indexes")
+async def invoice_indexes():
+    """Size, age and hit counters of the email and PO lookup indexes"""
+    return {"status": "success", "member": member_index.usage(), "po": po_index.usage()}
+
+
+@app.post("/po-ledger/reconcile")
+async def reconcile_po_ledger():
+    """Flush pending PO debits and list POs whose Airtable balance differs from the ledger"""
+    conflicts = await po_ledger.reconcile()
+    return {"status": "success", "conflicts": conflicts, "ledger": po_ledger.stats()}
+
+
+metrics.register_gauges("drive_client", lambda: drive_clients().metrics() if drive_clients() else {})
+metrics.register_gauges("contract_store", contract_store.usage)
+metrics.register_gauges("contractor_cache", lambda: {"age_seconds": contractor_cache.age})
+metrics.register_gauges("member_index", member_index.usage)
+metrics.register_gauges("po_index", po_index.usage)
+metrics.register_gauges("po_ledger", po_ledger.stats)
+metrics.register_gauges("idempotency", idempotency.usage)
+metrics.register_gauges("log", lambda: {"dropped_records": logs.dropped()})
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Request, dependency and job latency histograms plus cache/client gauges, Prometheus format"""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await run_blocking("jobs", job_queue.get, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return {
+        "id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "progress": {
+            "steps_completed": sorted(job["progress"]),
+            "steps_total": INVOICE_STEP_COUNT,
+        },
+        "result": job["result"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+    }
@@ -0,0 +1,237 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+from logs import get_logger, new_request_id
+
+access_log = get_logger("access")
+
+# Seconds; covers cache hits (sub-ms) up to slow Drive uploads
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{_escape(value)}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Prometheus histogram; `observe()` is a few dict/list operations under a lock"""
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+        for labels, counts, total, count in sorted(series):
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = _labels(self.labelnames, labels, [("le", _number(bound))])
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Time to produce a response, per endpoint",
+    ["method", "route", "status"],
+)
+DEPENDENCY_SECONDS = Histogram(
+    "dependency_call_duration_seconds",
+    "Time spent in calls to Airtable, Drive, PDF hosts and contract rendering",
+    ["dependency", "operation", "outcome"],
+)
+JOB_SECONDS = Histogram(
+    "job_duration_seconds",
+    "Time to run one attempt of a background job",
+    ["kind", "outcome"],
+)
+DEPENDENCY_ERRORS = Counter(
+    "dependency_call_errors_total",
+    "Failed dependency calls",
+    ["dependency", "operation", "error"],
+)
+
+_metrics = [REQUEST_SECONDS, DEPENDENCY_SECONDS, JOB_SECONDS, DEPENDENCY_ERRORS]
+_gauges = []
+
+# Spans recorded while handling the current request, if it is being traced
+_request_spans = contextvars.ContextVar("request_spans", default=None)
+
+
+def register_gauges(prefix, collect):
+    """
+    Export the numeric values of the dict returned by `collect()` as gauges
+    named `<prefix>_<key>`; collected on every scrape, so keep it cheap.
+    """
+    _gauges.append((prefix, collect))
+
+
+@contextmanager
+def span(dependency, operation):
+    """Times the enclosed call into DEPENDENCY_SECONDS and the current request's spans"""
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException as e:
+        outcome = "error"
+        DEPENDENCY_ERRORS.inc(dependency, operation, type(e).__name__)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        DEPENDENCY_SECONDS.observe(elapsed, dependency, operation, outcome)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((dependency, operation, elapsed))
+
+
+def start_request_trace():
+    """Collect spans for the current request; returns the list they are appended to"""
+    spans = []
+    _request_spans.set(spans)
+    return spans
+
+
+def server_timing(spans):
+    """
+    Server-Timing header value summing the request's spans per dependency
+    and operation. Spans can nest (a Drive transfer contains its download),
+    so entries are not meant to add up.
+    """
+    totals = {}
+    for dependency, operation, elapsed in spans:
+        key = f"{dependency}.{operation}"
+        count, total = totals.get(key, (0, 0.0))
+        totals[key] = (count + 1, total + elapsed)
+    return ", ".join(
+        f'{key};dur={total * 1000:.1f};desc="{count} call(s)"'
+        for key, (count, total) in totals.items()
+    )
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request into REQUEST_SECONDS, labelled
+    with the route template rather than the raw path. Responses get an
+    X-Request-ID and a Server-Timing header summing the dependency spans
+    recorded before the headers went out.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        spans = start_request_trace()
+        rid = new_request_id()
+        status = 500
+
+        async def send_with_headers(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", rid.encode()))
+                if spans:
+                    headers.append((b"server-timing", server_timing(spans).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            elapsed = time.perf_counter() - start
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            REQUEST_SECONDS.observe(elapsed, scope["method"], route, str(status))
+            access_log.info(
+                "request",
+                method=scope["method"],
+                route=route,
+                status=status,
+                duration_ms=round(elapsed * 1000, 1),
+                spans=len(spans),
+                sample=True,
+            )
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for prefix, collect in _gauges:
+        try:
+            values = collect() or {}
+        except Exception:
+            continue
+        for key, value in sorted(values.items()):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = f"{prefix}_{key}"
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {_number(value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,622 @@
+import asyncio
+import sqlite3
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from blocking import run_blocking
+from logs import get_logger
+
+log = get_logger("po_ledger")
+
+# Airtable accepts at most 10 records per update request
+AIRTABLE_BATCH_SIZE = 10
+# Record ids per OR(RECORD_ID()=...) balance read
+READ_CHUNK_SIZE = 50
+BALANCE_FIELD = "Balance"
+# Balances are currency; smaller differences are rounding, not conflicts
+BALANCE_EPSILON = 0.005
+# Debits claimed by a flush that hasn't finished after this long belonged to
+# a process that died (or is stuck); they are settled against Airtable
+CLAIM_TIMEOUT = 120
+# How often waiters re-check debits that another process is flushing
+POLL_INTERVAL = 0.25
+# Attempts at recording a write Airtable has accepted, before leaving it to
+# be settled as unknown
+RECORD_ATTEMPTS = 5
+
+
+class DebitNotWritten(RuntimeError):
+    """The debit was rolled back because its PO couldn't be read or written; it won't be applied"""
+
+
+class DebitOutcomeUnknown(RuntimeError):
+    """
+    The balance write for this debit may or may not have reached Airtable.
+    It is settled by the next flush or reconcile; retry with the same ref.
+    """
+
+
+class PoLedger:
+    """
+    Purchase order balances, debited through an append-only local ledger.
+
+    `debit()` appends to the `debits` table and waits for the flush that
+    writes it. A flush runs `flush_delay` seconds after the first pending
+    debit, claims every PO with pending debits, reads their current
+    balances in one formula per 50 records and writes the new ones 10
+    records per request, so a burst of invoices against one PO costs one
+    read and one write. Each write is appended to `writes` together with
+    the balance we expected Airtable to hold (our previous write); a
+    different observed value is a conflict, i.e. someone edited the balance
+    outside this service. The observed value wins and our debits are
+    applied on top of it. The ledger database is opened on first use (or
+    by `open()` during warmup), not at construction.
+
+    A debit goes pending -> claimed -> written | dropped (the PO no longer
+    exists) | failed | unknown. The ledger file can be shared by several
+    worker processes: a flush claims its debits in one `BEGIN IMMEDIATE`
+    transaction and skips POs another flush has claimed, so no two flushes
+    read-modify-write the same PO.
+
+    Before sending a balance, the flush records it (`observed` and
+    `target`) on the claimed debits. Whenever it can't tell whether the
+    write landed (the request failed, recording it failed, or the claim
+    went stale because its process died), the debits become `unknown`
+    and the PO is held until `settle_unknown()` compares Airtable's
+    balance with those two values: at the target the write landed and is
+    recorded, at the observed value it didn't and the debits are rolled
+    back (failed) or, for a dead process, requeued. Otherwise they stay
+    unknown for someone to look at. So no debit is ever applied twice. A
+    failed debit is never applied later; retrying with the same `ref`
+    re-arms it. Waiters are settled from the ledger, whichever process
+    flushed.
+    """
+
+    def __init__(self, db_path, get_table, call, flush_delay=0.05, on_balance=None):
+        self._get_table = get_table
+        self._call = call
+        self.flush_delay = flush_delay
+        self._on_balance = on_balance
+        # debit id -> futures of the debit() calls waiting for it
+        self._waiters = defaultdict(list)
+        # debit id -> exception of a failed flush in this process, until settled
+        self._failures = {}
+        self._flusher = None
+        self.db_path = db_path
+        self._db_lock = threading.Lock()
+        self._db = None
+
+    def open(self):
+        """Open the ledger database, creating or migrating its tables; idempotent"""
+        with self._db_lock:
+            self._open()
+
+    def _open(self):
+        if self._db is not None:
+            return
+        db = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS debits (
+                id          INTEGER PRIMARY KEY AUTOINCREMENT,
+                record_id   TEXT NOT NULL,
+                amount      REAL NOT NULL,
+                ref         TEXT UNIQUE,
+                created_at  REAL NOT NULL,
+                state       TEXT NOT NULL DEFAULT 'pending',
+                claim       TEXT,
+                claimed_at  REAL,
+                observed    REAL,
+                target      REAL,
+                write_id    INTEGER,
+                error       TEXT
+            )
+            """
+        )
+        db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS writes (
+                id             INTEGER PRIMARY KEY AUTOINCREMENT,
+                record_id      TEXT NOT NULL,
+                through_debit  INTEGER NOT NULL,
+                debits         INTEGER NOT NULL,
+                expected       REAL,
+                observed       REAL NOT NULL,
+                balance        REAL NOT NULL,
+                written_at     REAL NOT NULL
+            )
+            """
+        )
+        # Debits against POs that no longer exist in Airtable
+        db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS dropped (
+                id             INTEGER PRIMARY KEY AUTOINCREMENT,
+                record_id      TEXT NOT NULL,
+                through_debit  INTEGER NOT NULL,
+                reason         TEXT NOT NULL,
+                dropped_at     REAL NOT NULL
+            )
+            """
+        )
+        self._migrate(db)
+        db.execute("CREATE INDEX IF NOT EXISTS debits_record ON debits (record_id, id)")
+        db.execute("CREATE INDEX IF NOT EXISTS debits_state ON debits (state, record_id)")
+        db.execute("CREATE INDEX IF NOT EXISTS debits_claim ON debits (claim)")
+        db.execute("CREATE INDEX IF NOT EXISTS writes_record ON writes (record_id, id)")
+        self._db = db
+
+    def _migrate(self, db):
+        """Ledgers from before debit states: derive them from `writes` and `dropped`"""
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            columns = {row[1] for row in db.execute("PRAGMA table_info(debits)")}
+            if "state" not in columns:
+                db.execute("ALTER TABLE debits ADD COLUMN state TEXT NOT NULL DEFAULT 'pending'")
+                for column, kind in (("claim", "TEXT"), ("claimed_at", "REAL"), ("write_id", "INTEGER"), ("error", "TEXT")):
+                    db.execute(f"ALTER TABLE debits ADD COLUMN {column} {kind}")
+                db.execute(
+                    """
+                    UPDATE debits SET state = 'written', write_id = (
+                        SELECT MIN(w.id) FROM writes w WHERE w.record_id = debits.record_id AND w.through_debit >= debits.id
+                    )
+                    WHERE id <= COALESCE((SELECT MAX(w.through_debit) FROM writes w WHERE w.record_id = debits.record_id), 0)
+                    """
+                )
+                db.execute(
+                    """
+                    UPDATE debits SET state = 'dropped'
+                    WHERE state = 'pending'
+                    AND id <= COALESCE((SELECT MAX(x.through_debit) FROM dropped x WHERE x.record_id = debits.record_id), 0)
+                    """
+                )
+            for column in ("observed", "target"):
+                if column not in columns:
+                    db.execute(f"ALTER TABLE debits ADD COLUMN {column} REAL")
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    # ---------- ledger (blocking; run on the thread pool) ----------
+    def _transaction(self, fn, *args):
+        with self._db_lock:
+            self._open()
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(*args)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return result
+
+    def _append_debit(self, record_id, amount, ref):
+        """Id of the ledger row for this debit (the existing one if `ref` was seen)"""
+        def append():
+            if ref is not None:
+                row = self._db.execute("SELECT id, state FROM debits WHERE ref = ?", (ref,)).fetchone()
+                if row:
+                    if row[1] == "failed":
+                        # Rolled back earlier; this retry submits it again
+                        self._db.execute(
+                            "UPDATE debits SET state = 'pending', error = NULL, claim = NULL, "
+                            "observed = NULL, target = NULL WHERE id = ?",
+                            (row[0],),
+                        )
+                    return row[0]
+            cur = self._db.execute(
+                "INSERT INTO debits (record_id, amount, ref, created_at) VALUES (?, ?, ?, ?)",
+                (record_id, amount, ref, time.time()),
+            )
+            return cur.lastrowid
+
+        return self._transaction(append)
+
+    def _claim(self, claim):
+        """
+        Claim the pending debits of every PO no other flush is working on
+        and that has no unknown write; returns {record_id: (total, count)}.
+        """
+        def take():
+            now = time.time()
+            # A stale claim that never recorded a target never sent one, so
+            # it can safely go again; one that did may have landed
+            requeued = self._db.execute(
+                "UPDATE debits SET state = 'pending', claim = NULL "
+                "WHERE state = 'claimed' AND claimed_at < ? AND target IS NULL",
+                (now - CLAIM_TIMEOUT,),
+            ).rowcount
+            unknown = self._db.execute(
+                "UPDATE debits SET state = 'unknown', error = 'flush did not finish' "
+                "WHERE state = 'claimed' AND claimed_at < ?",
+                (now - CLAIM_TIMEOUT,),
+            ).rowcount
+            self._db.execute(
+                """
+                UPDATE debits SET state = 'claimed', claim = ?, claimed_at = ?
+                WHERE state = 'pending'
+                AND record_id NOT IN (
+                    SELECT record_id FROM debits
+                    WHERE (state = 'claimed' AND claim IS NOT ?) OR state = 'unknown'
+                )
+                """,
+                (claim, now, claim),
+            )
+            rows = self._db.execute(
+                "SELECT record_id, SUM(amount), COUNT(*) FROM debits WHERE claim = ? AND state = 'claimed' GROUP BY record_id",
+                (claim,),
+            ).fetchall()
+            return requeued, unknown, rows
+
+        requeued, unknown, rows = self._transaction(take)
+        if requeued:
+            log.warning("Re-queued PO debits from a flush that never sent them", debits=requeued)
+        if unknown:
+            log.warning("PO debits from a flush that never finished are unknown until settled", debits=unknown)
+        return {record_id: (total, count) for record_id, total, count in rows}
+
+    def _record_intent(self, claim, intents):
+        """
+        Note the balance about to be sent for each (record_id, observed,
+        target); returns the record ids this claim still holds.
+        """
+        def record():
+            held = []
+            for record_id, observed, target in intents:
+                cur = self._db.execute(
+                    "UPDATE debits SET observed = ?, target = ? WHERE claim = ? AND record_id = ? AND state = 'claimed'",
+                    (observed, target, claim, record_id),
+                )
+                if cur.rowcount:
+                    held.append(record_id)
+            return held
+
+        return self._transaction(record)
+
+    def _through_debit(self, claim, record_id):
+        return self._db.execute(
+            "SELECT MAX(id) FROM debits WHERE claim = ? AND record_id = ?", (claim, record_id)
+        ).fetchone()[0]
+
+    def _record_write(self, claim, record_id, count, observed, balance):
+        """Mark a PO's claimed (or unknown) debits written; returns the balance our previous write left (or None)"""
+        def record():
+            previous = self._db.execute(
+                "SELECT balance FROM writes WHERE record_id = ? ORDER BY id DESC LIMIT 1", (record_id,)
+            ).fetchone()
+            expected = previous[0] if previous else None
+            cur = self._db.execute(
+                """
+                INSERT INTO writes (record_id, through_debit, debits, expected, observed, balance, written_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (record_id, self._through_debit(claim, record_id), count, expected, observed, balance, time.time()),
+            )
+            self._db.execute(
+                "UPDATE debits SET state = 'written', write_id = ?, claim = NULL, error = NULL "
+                "WHERE claim = ? AND record_id = ? AND state IN ('claimed', 'unknown')",
+                (cur.lastrowid, claim, record_id),
+            )
+            return expected
+
+        return self._transaction(record)
+
+    def _record_drop(self, claim, record_id, reason):
+        def record():
+            self._db.execute(
+                "INSERT INTO dropped (record_id, through_debit, reason, dropped_at) VALUES (?, ?, ?, ?)",
+                (record_id, self._through_debit(claim, record_id), reason, time.time()),
+            )
+            self._db.execute(
+                "UPDATE debits SET state = 'dropped', error = ?, claim = NULL "
+                "WHERE claim = ? AND record_id = ? AND state = 'claimed'",
+                (reason, claim, record_id),
+            )
+
+        self._transaction(record)
+
+    def _record_outcome(self, claim, record_ids, state, error):
+        """
+        Move the claimed or unknown debits of `record_ids` to `state`
+        (failed, pending or unknown); returns their ids.
+        """
+        def record():
+            marks = ",".join("?" * len(record_ids))
+            where = f"claim = ? AND state IN ('claimed', 'unknown') AND record_id IN ({marks})"
+            ids = [row[0] for row in self._db.execute(f"SELECT id FROM debits WHERE {where}", (claim, *record_ids))]
+            if state == "unknown":
+                self._db.execute(f"UPDATE debits SET state = 'unknown', error = ? WHERE {where}", (error, claim, *record_ids))
+            else:
+                self._db.execute(
+                    f"UPDATE debits SET state = ?, error = ?, claim = NULL, observed = NULL, target = NULL WHERE {where}",
+                    (state, error, claim, *record_ids),
+                )
+            return ids
+
+        return self._transaction(record)
+
+    def _unknown(self):
+        """[(claim, record_id, count, observed, target)] for writes whose outcome is unknown"""
+        with self._db_lock:
+            self._open()
+            return self._db.execute(
+                """
+                SELECT claim, record_id, COUNT(*), MAX(observed), MAX(target)
+                FROM debits WHERE state = 'unknown' GROUP BY claim, record_id
+                """
+            ).fetchall()
+
+    def _outcomes(self, debit_ids):
+        """(id, state, error, written balance) for each debit"""
+        marks = ",".join("?" * len(debit_ids))
+        with self._db_lock:
+            self._open()
+            return self._db.execute(
+                f"""
+                SELECT d.id, d.state, d.error, w.balance
+                FROM debits d LEFT JOIN writes w ON w.id = d.write_id
+                WHERE d.id IN ({marks})
+                """,
+                debit_ids,
+            ).fetchall()
+
+    def _has_pending(self):
+        with self._db_lock:
+            self._open()
+            return self._db.execute("SELECT EXISTS (SELECT 1 FROM debits WHERE state = 'pending')").fetchone()[0] == 1
+
+    def _last_writes(self):
+        """{record_id: last balance written} for POs without a flush in progress or an unknown write"""
+        with self._db_lock:
+            self._open()
+            rows = self._db.execute(
+                """
+                SELECT record_id, balance FROM writes
+                WHERE id IN (SELECT MAX(id) FROM writes GROUP BY record_id)
+                AND record_id NOT IN (SELECT record_id FROM debits WHERE state IN ('claimed', 'unknown'))
+                """
+            ).fetchall()
+        return dict(rows)
+
+    # ---------- debits ----------
+    async def debit(self, record_id, amount, ref=None):
+        """
+        Subtract `amount` from a PO's balance and return the balance written
+        to Airtable. `ref` makes the debit idempotent: retrying with the same
+        ref waits for (or returns) the original debit instead of adding one.
+        Raises LookupError if the PO doesn't exist, the Airtable error (or
+        DebitNotWritten) if the debit was rolled back, and
+        DebitOutcomeUnknown while it can't be told whether it was written.
+        """
+        debit_id = await run_blocking("ledger", self._append_debit, record_id, amount, ref)
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[debit_id].append(future)
+        self._schedule()
+        return await future
+
+    def _schedule(self, delay=None):
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_soon(self.flush_delay if delay is None else delay))
+
+    async def _flush_soon(self, delay):
+        await asyncio.sleep(delay)
+        written = 0
+        try:
+            written = await self.flush()
+        except Exception as e:
+            log.error("PO ledger flush failed", error=str(e))
+        try:
+            await self._settle()
+            again = bool(self._waiters) or await run_blocking("ledger", self._has_pending)
+        except Exception as e:
+            log.error("PO ledger settle failed", error=str(e))
+            again = True
+        self._flusher = None
+        # Keep going while anything is left; if this flush got nowhere (the
+        # rest is claimed by another process), poll rather than spin
+        if again:
+            self._schedule(self.flush_delay if written else max(self.flush_delay, POLL_INTERVAL))
+
+    async def _settle(self):
+        """Resolve the waiters whose debits have been written, dropped, rolled back or become unknown"""
+        if not self._waiters:
+            return
+        outcomes = await run_blocking("ledger", self._outcomes, list(self._waiters))
+        failures, self._failures = self._failures, {}
+        for debit_id, state, error, balance in outcomes:
+            if state in ("pending", "claimed"):
+                continue
+            for future in self._waiters.pop(debit_id, []):
+                if future.done():
+                    continue
+                if state == "written":
+                    future.set_result(balance)
+                elif state == "dropped":
+                    future.set_exception(LookupError(error))
+                elif state == "unknown":
+                    future.set_exception(DebitOutcomeUnknown(error))
+                else:
+                    future.set_exception(failures.get(debit_id) or DebitNotWritten(error))
+
+    async def _mark(self, claim, record_ids, state, error):
+        ids = await run_blocking(
+            "ledger", self._record_outcome, claim, record_ids, state, f"{type(error).__name__}: {error}"
+        )
+        log.warning(f"PO debits {state}", record_ids=record_ids, debits=len(ids), error=str(error))
+        if state == "failed":
+            for debit_id in ids:
+                self._failures[debit_id] = error
+
+    async def _record_written(self, claim, record_id, count, current, balance):
+        """
+        Record a write Airtable accepted, retrying if the ledger is busy;
+        if it still can't be recorded the debits are settled as unknown.
+        """
+        for attempt in range(RECORD_ATTEMPTS):
+            try:
+                expected = await run_blocking("ledger", self._record_write, claim, record_id, count, current, balance)
+                break
+            except sqlite3.Error as e:
+                log.warning("Could not record PO balance write, retrying", record_id=record_id, attempt=attempt + 1, error=str(e))
+                await asyncio.sleep(0.1 * 2 ** attempt)
+        else:
+            log.error("PO balance written but not recorded; left to be settled", record_id=record_id)
+            return False
+
+        if expected is not None and abs(expected - current) > BALANCE_EPSILON:
+            log.warning("PO balance changed outside the ledger", record_id=record_id, expected=expected, found=current)
+        log.info("PO balance written", record_id=record_id, previous=current, balance=balance, debits=count)
+        if self._on_balance:
+            self._on_balance(record_id, balance)
+        return True
+
+    async def settle_unknown(self, error=None):
+        """
+        Decide every unknown write from Airtable's current balance: at the
+        target it landed, at the observed value it didn't (the debits go
+        back to pending, or are failed with `error` when a live flush
+        reports it). Returns the writes that still can't be decided.
+        """
+        unknown = await run_blocking("ledger", self._unknown)
+        if not unknown:
+            return []
+        actual = await self._read_balances(sorted({record_id for _, record_id, *_ in unknown}))
+
+        undecided = []
+        for claim, record_id, count, observed, target in unknown:
+            balance = actual.get(record_id)
+            if balance is not None and target is not None and abs(balance - target) <= BALANCE_EPSILON:
+                await self._record_written(claim, record_id, count, observed, target)
+            elif balance is not None and observed is not None and abs(balance - observed) <= BALANCE_EPSILON:
+                if error is None:
+                    await run_blocking("ledger", self._record_outcome, claim, [record_id], "pending", None)
+                    log.info("Unknown PO write did not land; debits requeued", record_id=record_id, debits=count)
+                else:
+                    await self._mark(claim, [record_id], "failed", error)
+            else:
+                log.warning("Unknown PO write can't be decided", record_id=record_id, observed=observed, target=target, found=balance)
+                undecided.append({"record_id": record_id, "observed": observed, "target": target, "actual": balance})
+        return undecided
+
+    async def flush(self):
+        """Write every pending debit to Airtable; returns the number of POs written"""
+        if await run_blocking("ledger", self._unknown):
+            try:
+                await self.settle_unknown()
+            except Exception as e:
+                log.warning("Could not settle unknown PO writes", error=str(e))
+
+        claim = uuid.uuid4().hex
+        pending = await run_blocking("ledger", self._claim, claim)
+        if not pending:
+            return 0
+
+        record_ids = sorted(pending)
+        try:
+            observed = await self._read_balances(record_ids)
+        except Exception as e:
+            await self._mark(claim, record_ids, "failed", e)
+            raise
+
+        updates = []
+        for record_id in record_ids:
+            total, count = pending[record_id]
+            if record_id not in observed:
+                reason = f"Purchase order {record_id} not found"
+                log.warning("Dropping debits for missing PO", record_id=record_id, debits=count)
+                await run_blocking("ledger", self._record_drop, claim, record_id, reason)
+                continue
+            current = observed[record_id]
+            balance = max(current - total, 0)
+            updates.append((record_id, count, current, balance))
+
+        written = 0
+        for start in range(0, len(updates), AIRTABLE_BATCH_SIZE):
+            chunk = updates[start:start + AIRTABLE_BATCH_SIZE]
+            # Nothing is sent until its target is on record
+            held = set(await run_blocking(
+                "ledger", self._record_intent, claim, [(record_id, current, balance) for record_id, _, current, balance in chunk]
+            ))
+            chunk = [update for update in chunk if update[0] in held]
+            if not chunk:
+                continue
+            try:
+                await self._call(
+                    self._get_table().batch_update,
+                    [{"id": record_id, "fields": {BALANCE_FIELD: balance}} for record_id, _, _, balance in chunk],
+                )
+            except Exception as e:
+                # The request may have been applied before it failed
+                await self._mark(claim, [record_id for record_id, *_ in chunk], "unknown", e)
+                try:
+                    await self.settle_unknown(error=e)
+                except Exception as read_error:
+                    log.warning("Could not settle unknown PO writes", error=str(read_error))
+                continue
+
+            for record_id, count, current, balance in chunk:
+                if await self._record_written(claim, record_id, count, current, balance):
+                    written += 1
+        return written
+
+    async def _read_balances(self, record_ids):
+        from pyairtable.formulas import EQ, OR, RECORD_ID
+
+        table = self._get_table()
+        balances = {}
+        for start in range(0, len(record_ids), READ_CHUNK_SIZE):
+            chunk = record_ids[start:start + READ_CHUNK_SIZE]
+            formula = OR(*(EQ(RECORD_ID(), record_id) for record_id in chunk))
+            records = await self._call(table.all, formula=str(formula), fields=[BALANCE_FIELD])
+            for record in records:
+                balances[record["id"]] = record["fields"].get(BALANCE_FIELD, 0)
+        return balances
+
+    # ---------- reconciliation ----------
+    async def reconcile(self):
+        """
+        Flush pending debits and settle unknown writes, then compare
+        Airtable's balance for every PO the ledger has written with the
+        last value written. Returns the POs that differ, including unknown
+        writes that couldn't be decided; POs with a flush in progress are
+        skipped.
+        """
+        await self.flush()
+        undecided = await self.settle_unknown()
+        await self._settle()
+        conflicts = [{**write, "unknown_write": True} for write in undecided]
+
+        expected = await run_blocking("ledger", self._last_writes)
+        if not expected:
+            return conflicts
+
+        record_ids = sorted(expected)
+        observed = await self._read_balances(record_ids)
+        for record_id in record_ids:
+            actual = observed.get(record_id)
+            if actual is None or abs(actual - expected[record_id]) > BALANCE_EPSILON:
+                conflicts.append({"record_id": record_id, "expected": expected[record_id], "actual": actual})
+        return conflicts
+
+    def stats(self):
+        with self._db_lock:
+            if self._db is None:
+                return {"debits": 0, "failed": 0, "unknown": 0, "writes": 0, "conflicts": 0, "pending_pos": 0}
+            debits, failed, unknown, pending_pos = self._db.execute(
+                """
+                SELECT COUNT(*), COALESCE(SUM(state = 'failed'), 0), COALESCE(SUM(state = 'unknown'), 0),
+                       COUNT(DISTINCT CASE WHEN state IN ('pending', 'claimed') THEN record_id END)
+                FROM debits
+                """
+            ).fetchone()
+            writes, conflicts = self._db.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(expected IS NOT NULL AND ABS(expected - observed) > {BALANCE_EPSILON}), 0) FROM writes"
+            ).fetchone()
+        return {
+            "debits": debits, "failed": failed, "unknown": unknown, "writes": writes,
+            "conflicts": conflicts, "pending_pos": pending_pos,
+        }
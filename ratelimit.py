@@ -0,0 +1,63 @@
+import sqlite3
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket for outgoing API calls, shared between processes.
+
+    Implemented as GCRA: the bucket is a single "theoretical arrival time"
+    stored in SQLite, so every uvicorn worker that points at the same file
+    draws from the same budget. `reserve()` never rejects; it books the
+    next free slot and returns how long the caller must wait for it.
+
+    The database is opened on first use (or by `open()` during warmup), not
+    at construction.
+    """
+
+    def __init__(self, rate, burst, path, name="default"):
+        self.interval = 1.0 / rate
+        self.tolerance = self.interval * (burst - 1)
+        self.name = name
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = None
+
+    def open(self):
+        """Open the database; idempotent"""
+        with self._lock:
+            self._open()
+
+    def _open(self):
+        if self._db is not None:
+            return
+        db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=10)
+        db.execute("CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tat REAL NOT NULL)")
+        self._db = db
+
+    def reserve(self, tokens=1):
+        """Book `tokens` calls; returns the seconds to wait before making them"""
+        with self._lock:
+            self._open()
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT tat FROM buckets WHERE name = ?", (self.name,)).fetchone()
+                now = time.time()
+                tat = max(row[0] if row else now, now)
+                wait = max(0.0, tat - self.tolerance - now)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO buckets (name, tat) VALUES (?, ?)",
+                    (self.name, tat + self.interval * tokens),
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return wait
+
+    def acquire(self, tokens=1):
+        """Blocking variant of reserve() for use from worker threads"""
+        wait = self.reserve(tokens)
+        if wait:
+            time.sleep(wait)
@@ -0,0 +1,100 @@
+import threading
+
+from airtable_sync import CachedTable, TableSync
+
+
+def _keys(record, field):
+    value = record["fields"].get(field)
+    if isinstance(value, list):
+        return [v for v in value if isinstance(v, str)]
+    return [value] if isinstance(value, str) else []
+
+
+class RecordIndex:
+    """
+    In-memory index of an Airtable table by one column (e.g. email or PO).
+
+    The index is rebuilt on every full sync and patched on incremental ones,
+    so `get()` is a dict lookup. It never waits on Airtable: a stale index
+    schedules a background sync and still answers from memory. `fetch()` is
+    the fallback for keys the index doesn't know yet, using an escaped
+    formula, and adds whatever it finds.
+    """
+
+    def __init__(self, get_table, key_field, fields=None, ttl=60, full_sync_interval=900):
+        self._get_table = get_table
+        self.key_field = key_field
+        self.fields = fields
+        self._sync = TableSync(get_table, fields=fields, full_sync_interval=full_sync_interval)
+        # Never blocks on stale data; see get()
+        self._cache = CachedTable(self._sync, ttl=ttl, stale_ttl=float("inf"))
+        self._records = {}
+        self._ids_by_key = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "fallback_hits": 0}
+        self._sync.on_change(self._apply)
+
+    def _apply(self, records, full):
+        with self._lock:
+            if full:
+                self._records = {}
+                self._ids_by_key = {}
+            for record in records:
+                self._put(record)
+
+    def _put(self, record):
+        previous = self._records.get(record["id"])
+        if previous is not None:
+            for key in _keys(previous, self.key_field):
+                if self._ids_by_key.get(key) == record["id"]:
+                    del self._ids_by_key[key]
+        self._records[record["id"]] = record
+        for key in _keys(record, self.key_field):
+            # Same as matches[0]: the first record seen for a key keeps it
+            self._ids_by_key.setdefault(key, record["id"])
+
+    def sync(self, full=False):
+        return self._sync.sync(full=full)
+
+    def get(self, key):
+        """The indexed record for `key`, or None if it isn't in the index"""
+        if self._sync.synced_at:
+            self._cache.ensure_fresh()
+        with self._lock:
+            record_id = self._ids_by_key.get(key)
+            record = self._records.get(record_id) if record_id else None
+            self.stats["hits" if record else "misses"] += 1
+        return record
+
+    def fetch(self, key):
+        """Look `key` up in Airtable (index miss fallback); blocking"""
+        from pyairtable.formulas import EQ, Field
+
+        formula = EQ(Field(self.key_field), key)
+        matches = self._get_table().all(formula=str(formula), fields=self.fields, max_records=1)
+        if not matches:
+            return None
+        self.remember(matches[0])
+        self.stats["fallback_hits"] += 1
+        return matches[0]
+
+    def remember(self, record):
+        """Add or replace a record fetched outside of a sync"""
+        with self._lock:
+            self._put(record)
+
+    def update_fields(self, record_id, fields):
+        """Mirror a write we just made to Airtable into the index"""
+        with self._lock:
+            record = self._records.get(record_id)
+            if record is not None:
+                self._put({**record, "fields": {**record["fields"], **fields}})
+
+    @property
+    def ready(self):
+        return bool(self._sync.synced_at)
+
+    def usage(self):
+        age = self._sync.age if self.ready else None
+        with self._lock:
+            return {"records": len(self._records), "keys": len(self._ids_by_key), "age": age, **self.stats}
@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+
+class StepScheduler:
+    """
+    Runs named async steps concurrently, starting each one as soon as the
+    steps it depends on have finished. A step receives its dependencies'
+    results as positional arguments, in the order they were listed.
+    """
+
+    def __init__(self):
+        self._steps = {}
+
+    def add(self, name, fn, depends_on=()):
+        for dep in depends_on:
+            if dep not in self._steps:
+                raise ValueError(f"Step {name!r} depends on unknown step {dep!r}")
+        self._steps[name] = (fn, tuple(depends_on))
+        return self
+
+    async def run(self, completed=None, on_step_done=None):
+        """
+        Run every step. Returns (results, timings) where timings maps each
+        step to its start/end offsets in milliseconds. If any step fails, the
+        first error is raised once the remaining steps have settled.
+
+        Steps named in `completed` are not run again; their recorded result
+        is used instead. `await on_step_done(name, result)` runs as each step
+        succeeds, before the steps that depend on it start.
+        """
+        completed = completed or {}
+        origin = time.perf_counter()
+        tasks = {}
+        timings = {}
+
+        async def run_step(name, fn, deps):
+            if name in completed:
+                return completed[name]
+            args = [await tasks[dep] for dep in deps]
+            started = time.perf_counter()
+            try:
+                result = await fn(*args)
+                if on_step_done is not None:
+                    await on_step_done(name, result)
+                return result
+            finally:
+                ended = time.perf_counter()
+                timings[name] = {
+                    "start_ms": round((started - origin) * 1000, 1),
+                    "end_ms": round((ended - origin) * 1000, 1),
+                    "duration_ms": round((ended - started) * 1000, 1),
+                }
+
+        for name, (fn, deps) in self._steps.items():
+            tasks[name] = asyncio.ensure_future(run_step(name, fn, deps))
+
+        outcomes = await asyncio.gather(*tasks.values(), return_exceptions=True)
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException):
+                raise outcome
+
+        return dict(zip(tasks, outcomes)), timings
+
+    def critical_path(self, timings):
+        """The chain of steps that determined the total run time"""
+        if not timings:
+            return []
+        name = max(timings, key=lambda n: timings[n]["end_ms"])
+        path = [name]
+        while True:
+            deps = [d for d in self._steps[name][1] if d in timings]
+            if not deps:
+                break
+            name = max(deps, key=lambda n: timings[n]["end_ms"])
+            path.append(name)
+        return path[::-1]
@@ -0,0 +1,20 @@
+// Renders tests/fixtures/contract_parity.json with generate_contract.js for test_contract_parity.py
+const fs = require('fs');
+const path = require('path');
+const { convertNumberToWords, renderParagraphs } = require(path.join(__dirname, '..', 'generate_contract.js'));
+
+const fixture = JSON.parse(fs.readFileSync(process.argv[2], 'utf8'));
+function rejection(record) {
+    try {
+        renderParagraphs(record);
+        return null;
+    } catch (e) {
+        return e.message;
+    }
+}
+
+console.log(JSON.stringify({
+    records: fixture.records.map(renderParagraphs),
+    numbers: fixture.numbers.map(convertNumberToWords),
+    rejected: fixture.rejected.map(rejection),
+}));
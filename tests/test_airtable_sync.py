@@ -0,0 +1,30 @@
+import threading
+import time
+
+from airtable_sync import CachedTable, TableSync
+
+
+class SlowTable:
+    def __init__(self):
+        self.calls = 0
+
+    def all(self, formula=None, fields=None):
+        self.calls += 1
+        time.sleep(0.05)
+        return [{"id": "rec1", "fields": {}}]
+
+
+def test_concurrent_blocking_refreshes_share_one_sync():
+    table = SlowTable()
+    cache = CachedTable(TableSync(lambda: table), ttl=60, stale_ttl=0)
+    threads = [threading.Thread(target=cache.ensure_fresh) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert table.calls == 1
+    assert list(cache.sync.records) == ["rec1"]
+    # An explicit full sync still fetches
+    cache.sync.sync(full=True)
+    assert table.calls == 2
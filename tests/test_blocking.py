@@ -0,0 +1,33 @@
+import asyncio
+import threading
+
+import blocking
+from blocking import run_blocking, set_rate_limit
+
+
+class RecordingBucket:
+    def __init__(self):
+        self.threads = []
+
+    def reserve(self, tokens=1):
+        self.threads.append(threading.get_ident())
+        return 0.0
+
+
+def test_rate_limit_is_reserved_off_the_event_loop():
+    bucket = RecordingBucket()
+    set_rate_limit("test", bucket)
+
+    async def main():
+        loop_thread = threading.get_ident()
+        results = await asyncio.gather(*(run_blocking("test", lambda n=n: n * 2) for n in range(5)))
+        return loop_thread, results
+
+    try:
+        loop_thread, results = asyncio.run(main())
+    finally:
+        blocking._rate_limits.pop("test", None)
+        blocking._semaphores.pop("test", None)
+    assert results == [0, 2, 4, 6, 8]
+    assert len(bucket.threads) == 5
+    assert loop_thread not in bucket.threads
@@ -0,0 +1,38 @@
+import posixpath
+
+from contract import contract_filename
+from contract_batch import resolve_batch_records
+
+
+def test_contract_filename_keeps_only_safe_characters():
+    filename = contract_filename({"contractor_name": "../../etc/Jane Doe\\x:\x00é"})
+    stem = filename[len("contract_"):]
+    assert "/" not in filename and "\\" not in filename
+    assert all(c.isascii() and (c.isalnum() or c in "._-") for c in filename)
+    assert stem.startswith(".._.._etc_Jane_Doe_x___")
+    # As a ZIP entry it stays at the top of the archive
+    entry = f"001_{filename}"
+    assert posixpath.normpath(entry) == entry
+
+
+def test_record_ids_fill_in_contractor_fields_or_report_errors():
+    contractors = {"recA": {"email": "a@x.test", "amount": "100", "po": "PO-1"}}
+    items = [
+        {"record_id": "recA", "contractor_name": "Ann"},
+        {"record_id": "recB", "contractor_name": "Bob"},
+        {"record_id": "recA"},
+        "not a record",
+    ]
+    resolved = resolve_batch_records(items, {"address": "1 Main St"}, contractors)
+    assert resolved[0]["fields"] == {
+        "address": "1 Main St", "email": "a@x.test", "amount": "100", "po": "PO-1", "contractor_name": "Ann",
+    }
+    assert [r.get("error") for r in resolved] == [
+        None, "Unknown Community Leaders record", "missing field 'contractor_name'", "record must be an object",
+    ]
+
+    # A failed contractor sync only fails the records that needed it
+    resolved = resolve_batch_records([{"record_id": "recA", "contractor_name": "Ann"}, {"contractor_name": "Cy"}],
+                                     {}, {}, lookup_error="timed out")
+    assert resolved[0]["error"] == "Community Leaders lookup failed: timed out"
+    assert "error" not in resolved[1]
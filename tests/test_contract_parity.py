@@ -0,0 +1,49 @@
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from clauses import InvalidFieldValue
+from contract import CLAUSES, contract_values, convert_number_to_words, get_contract_type
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE = os.path.join(TESTS_DIR, "fixtures", "contract_parity.json")
+FIELDS = {"contractor_name": "Bella Kotak", "address": "123 Main St", "email": "bella@example.com"}
+
+
+def python_paragraphs(fields):
+    values = contract_values(fields)
+    return [
+        {"text": p.render(values), "bold": p.bold, "space_before": p.space_before, "space_after": p.space_after}
+        for p in CLAUSES.plan(get_contract_type(fields)).paragraphs
+    ]
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="node is not installed")
+def test_python_and_js_render_the_same_contracts():
+    with open(FIXTURE) as f:
+        fixture = json.load(f)
+    proc = subprocess.run(
+        ["node", os.path.join(TESTS_DIR, "contract_parity.js"), FIXTURE],
+        capture_output=True, text=True, check=True,
+    )
+    js = json.loads(proc.stdout)
+
+    assert js["numbers"] == [convert_number_to_words(n) for n in fixture["numbers"]]
+    for fields, paragraphs in zip(fixture["records"], js["records"], strict=True):
+        assert paragraphs == python_paragraphs(fields)
+    # Lists and objects are refused by both, naming the same field
+    for fields, message in zip(fixture["rejected"], js["rejected"], strict=True):
+        with pytest.raises(InvalidFieldValue) as rejected:
+            contract_values(fields)
+        assert message == str(rejected.value)
+
+
+def test_numbers_print_as_in_javascript():
+    values = [1e-7, 1e-6, 0.00001, 0.1, 123.456, -2.5, 1e21, 1.5e22, 2.0, -0.0, 2 ** 53 + 1, 12345678901234567890]
+    assert [contract_values({**FIELDS, "amount": v})["amount"] for v in values] == [
+        "1e-7", "0.000001", "0.00001", "0.1", "123.456", "-2.5", "1e+21", "1.5e+22", "2", "0",
+        "9007199254740992", "12345678901234567000",
+    ]
@@ -0,0 +1,137 @@
+import itertools
+import os
+import time
+
+from contract import CLAUSES, contract_values, get_contract_type, render_contract
+from contract_engine import TEMPLATE_VERSION
+from contract_store import ORPHAN_GRACE, ContractStore, content_key
+
+BASE = {
+    "contractor_name": "Bella Kotak",
+    "address": "123 Main St",
+    "email": "bella@example.com",
+    "amount": "5000",
+    "number_of_content": "3",
+    "contract_type": "regular",
+}
+
+
+def store_key(fields):
+    return content_key(contract_values(fields), get_contract_type(fields), f"{TEMPLATE_VERSION}.{CLAUSES.digest}")
+
+
+def test_content_key_matches_rendered_bytes():
+    variants = [
+        BASE,
+        {**BASE, "signer_name": None},
+        {**BASE, "signer_name": ""},
+        {**BASE, "signer_name": "None"},
+        {**BASE, "address": " 123 Main St "},
+        {**BASE, "amount": 5000},
+        {**BASE, "amount": "5000.0"},
+        {**BASE, "number_of_content": 3},
+        {**BASE, "contract_type": "campfire"},
+        {**BASE, "contract_type": " Regular "},
+    ]
+    rendered = [(store_key(fields), render_contract(fields)) for fields in variants]
+    for (key_a, bytes_a), (key_b, bytes_b) in itertools.combinations(rendered, 2):
+        # Different documents must never share a key
+        if key_a == key_b:
+            assert bytes_a == bytes_b
+    # ...and the normalization is visible in both
+    assert rendered[1] == rendered[2]
+    assert rendered[1][0] != rendered[3][0] and rendered[1][1] != rendered[3][1]
+    assert rendered[0][1] != rendered[4][1] and rendered[0][0] != rendered[4][0]
+
+
+def age(path, seconds):
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+
+def make_store(tmp_path, **kwargs):
+    return ContractStore(str(tmp_path / "contracts"), str(tmp_path / "index.db"),
+                         max_bytes=kwargs.get("max_bytes", 1 << 20), max_age=kwargs.get("max_age", 3600))
+
+
+def test_sweep_only_deletes_store_files(tmp_path):
+    store = make_store(tmp_path)
+    kept = store.put("a" * 64, ".docx", b"stored")
+    root = store.root
+
+    legacy = os.path.join(root, "contract_Bella_Kotak_20250101_120000.docx")
+    unrelated = os.path.join(root, "notes.txt")
+    other_dir = os.path.join(root, "archive")
+    os.makedirs(other_dir)
+    archived = os.path.join(other_dir, "b" * 64 + ".docx")
+    orphan = store.path_for("c" * 64 + ".pdf")
+    partial = store.path_for("d" * 64 + ".docx") + ".1234.tmp"
+    fresh_orphan = store.path_for("e" * 64 + ".docx")
+    for path in (legacy, unrelated, archived, orphan, partial, fresh_orphan):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"x")
+    for path in (legacy, unrelated, archived, orphan, partial, kept):
+        age(path, ORPHAN_GRACE + 60)
+
+    assert store.sweep() == {"expired": 0, "evicted": 0, "orphans": 2}
+    assert not os.path.exists(orphan) and not os.path.exists(partial)
+    for path in (kept, legacy, unrelated, archived, fresh_orphan):
+        assert os.path.exists(path)
+
+
+def test_sweep_keeps_files_another_process_stored(tmp_path):
+    first, second = make_store(tmp_path), make_store(tmp_path)
+    first.open()
+    path = second.put("f" * 64, ".docx", b"from the other worker")
+    age(path, ORPHAN_GRACE + 60)
+
+    assert first.sweep()["orphans"] == 0
+    assert os.path.exists(path)
+
+
+def test_lookup_drops_entries_whose_file_is_gone(tmp_path):
+    first, second = make_store(tmp_path), make_store(tmp_path)
+    filename = "1" * 64 + ".docx"
+    first.put("1" * 64, ".docx", b"contract")
+    second.open()
+    assert second.lookup(filename)["stat"].st_size == len(b"contract")
+
+    # Evicted by the first worker; the second still lists it
+    os.remove(first.path_for(filename))
+    assert second.lookup(filename) is None
+    assert second.usage()["files"] == 0
+
+
+def test_download_names_resolve_to_aliases_and_legacy_files(tmp_path):
+    store = make_store(tmp_path)
+    stored = store.put("2" * 64, ".docx", b"stored")
+    store.alias("contract_Bella_Kotak_20260101_120000.docx", "2" * 64 + ".docx")
+    assert store.lookup("contract_Bella_Kotak_20260101_120000.docx")["path"] == stored
+
+    legacy = os.path.join(store.root, "contract_Old_Name_20250101_120000.docx")
+    with open(legacy, "wb") as f:
+        f.write(b"legacy")
+    entry = store.lookup("contract_Old_Name_20250101_120000.docx")
+    assert entry["path"] == legacy and entry["sha256"] is None
+
+    for name in ("contract_Nobody_20250101_120000.docx", "../contract_x_20250101_120000.docx", "notes.txt"):
+        assert store.lookup(name) is None
+
+    # Aliases go with the file they point at
+    os.remove(stored)
+    store.lookup("2" * 64 + ".docx")
+    store.sweep()
+    assert store.lookup("contract_Bella_Kotak_20260101_120000.docx") is None
+
+
+def test_access_times_are_written_in_batches(tmp_path):
+    store = make_store(tmp_path)
+    filename = "3" * 64 + ".docx"
+    store.put("3" * 64, ".docx", b"contract")
+    created = store._db.execute("SELECT accessed_at FROM contracts").fetchone()[0]
+
+    store.lookup(filename)
+    assert store._db.execute("SELECT accessed_at FROM contracts").fetchone()[0] == created
+    store.flush()
+    assert store._db.execute("SELECT accessed_at FROM contracts").fetchone()[0] > created
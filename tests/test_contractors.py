@@ -0,0 +1,41 @@
+import pytest
+
+from contractors import InvalidQuery, query_contractors
+
+
+def contractor(record_id, status="Active"):
+    return {"id": record_id, "summary": "", "email": f"{record_id}@x.test", "date": "", "status": status, "po": "", "amount": ""}
+
+
+def all_pages(contractors_by_call, limit):
+    """Pages through, taking the contractor list for each request from `contractors_by_call`"""
+    seen, cursor = [], None
+    for contractors in contractors_by_call:
+        page, cursor = query_contractors(contractors, cursor=cursor, limit=limit)
+        seen += [c["id"] for c in page]
+        if cursor is None:
+            break
+    return seen
+
+
+def test_pages_cover_every_contractor_once():
+    contractors = [contractor(f"rec{i:02d}") for i in (5, 3, 9, 1, 7)]
+    assert all_pages([contractors] * 5, limit=2) == ["rec01", "rec03", "rec05", "rec07", "rec09"]
+
+
+def test_cursor_survives_rows_added_and_removed_between_pages():
+    first = [contractor(f"rec{i:02d}") for i in (1, 2, 3, 4, 5, 6)]
+    # A sync between the first and second page drops rec01 and adds rec00 and rec04b
+    second = [c for c in first if c["id"] != "rec01"] + [contractor("rec00"), contractor("rec04b")]
+    assert all_pages([first, second, second, second], limit=2) == ["rec01", "rec02", "rec03", "rec04", "rec04b", "rec05", "rec06"]
+
+
+def test_unpaginated_response_keeps_cache_order():
+    contractors = [contractor("recB"), contractor("recA")]
+    page, cursor = query_contractors(contractors)
+    assert [c["id"] for c in page] == ["recB", "recA"] and cursor is None
+
+
+def test_invalid_cursor_is_rejected():
+    with pytest.raises(InvalidQuery):
+        query_contractors([contractor("rec1")], cursor="bm90LWEtY3Vyc29y", limit=1)
@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from idempotency import IdempotencyCache, IdempotencyConflict, IdempotencyError, request_key
+
+
+class Counter:
+    def __init__(self, delay=0.0, fail=False):
+        self.calls = 0
+        self.delay = delay
+        self.fail = fail
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("upstream failed")
+        return {"call": self.calls}
+
+
+def test_request_key_prefers_client_key_and_canonicalizes_body():
+    key, fingerprint, client_key = request_key("invoice", {"idempotency-key": " abc "}, b'{"a": 1, "b": 2}')
+    assert key == ("invoice", "key", "abc") and client_key == "abc"
+    body_key, same_fingerprint, _ = request_key("invoice", {}, b'{"b":2,"a":1}')
+    assert body_key == ("invoice", "body", fingerprint) and same_fingerprint == fingerprint
+    with pytest.raises(IdempotencyError):
+        request_key("invoice", {"idempotency-key": "x" * 256}, b"{}")
+
+
+def test_repeat_is_replayed_from_cache():
+    cache, fn = IdempotencyCache(), Counter()
+    key, fingerprint, _ = request_key("invoice", {"idempotency-key": "k1"}, b"{}")
+
+    async def main():
+        first = await cache.run(key, fingerprint, fn)
+        second = await cache.run(key, fingerprint, fn)
+        return first, second
+
+    (first, replayed_first), (second, replayed_second) = asyncio.run(main())
+    assert fn.calls == 1
+    assert first == second and not replayed_first and replayed_second
+
+
+def test_concurrent_duplicates_share_one_run():
+    cache, fn = IdempotencyCache(), Counter(delay=0.05)
+    key, fingerprint, _ = request_key("generate-contract", {}, b'{"record": {}}')
+
+    async def main():
+        return await asyncio.gather(*(cache.run(key, fingerprint, fn) for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert fn.calls == 1
+    assert [replayed for _, replayed in results].count(False) == 1
+    assert all(value == {"call": 1} for value, _ in results)
+
+
+def test_same_key_with_different_body_conflicts():
+    cache, fn = IdempotencyCache(), Counter()
+    key, fingerprint, _ = request_key("invoice", {"idempotency-key": "k1"}, b'{"amount": 1}')
+    _, other_fingerprint, _ = request_key("invoice", {"idempotency-key": "k1"}, b'{"amount": 2}')
+
+    async def main():
+        await cache.run(key, fingerprint, fn)
+        with pytest.raises(IdempotencyConflict):
+            await cache.run(key, other_fingerprint, fn)
+
+    asyncio.run(main())
+    assert fn.calls == 1
+
+
+def test_failures_and_invalid_results_run_again():
+    cache = IdempotencyCache()
+    key, fingerprint, _ = request_key("invoice", {"idempotency-key": "k1"}, b"{}")
+    failing, working = Counter(fail=True), Counter()
+
+    async def main():
+        with pytest.raises(RuntimeError):
+            await cache.run(key, fingerprint, failing)
+        await cache.run(key, fingerprint, working)
+        # valid() rejecting the cached value (e.g. the file was evicted) reruns it
+        return await cache.run(key, fingerprint, working, valid=lambda value: False)
+
+    value, replayed = asyncio.run(main())
+    assert failing.calls == 1 and working.calls == 2
+    assert value == {"call": 2} and not replayed
+
+
+def test_body_keys_expire_after_hash_ttl():
+    cache, fn = IdempotencyCache(ttl=600, hash_ttl=0), Counter()
+    key, fingerprint, _ = request_key("invoice", {}, b"{}")
+
+    async def main():
+        await cache.run(key, fingerprint, fn)
+        return await cache.run(key, fingerprint, fn)
+
+    _, replayed = asyncio.run(main())
+    assert fn.calls == 2 and not replayed
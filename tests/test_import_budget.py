@@ -0,0 +1,25 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+from import_budget import app_env  # noqa: E402
+
+
+@pytest.mark.slow
+def test_import_main_stays_within_budget():
+    proc = subprocess.run(
+        [sys.executable, os.path.join(ROOT, "bench", "import_budget.py")],
+        cwd=ROOT, capture_output=True, text=True, timeout=120,
+    )
+    assert proc.returncode == 0, proc.stdout + proc.stderr
+
+
+@pytest.mark.slow
+def test_import_main_opens_no_databases(tmp_path):
+    subprocess.run([sys.executable, "-c", "import main"], cwd=ROOT, env=app_env(str(tmp_path)), check=True, timeout=60)
+    assert os.listdir(tmp_path) == []
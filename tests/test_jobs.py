@@ -0,0 +1,72 @@
+import threading
+import time
+
+from jobs import JobQueue
+
+
+def test_concurrent_claims_hand_out_each_job_once(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+    # One queue per "process", all on the same database file
+    queues = [JobQueue(db_path) for _ in range(4)]
+    job_ids = {queues[0].enqueue("invoice", {"n": n}) for n in range(40)}
+
+    claimed = []
+    claimed_lock = threading.Lock()
+    start = threading.Barrier(len(queues))
+
+    def drain(queue):
+        start.wait()
+        while (job := queue.claim()) is not None:
+            with claimed_lock:
+                claimed.append(job["id"])
+
+    threads = [threading.Thread(target=drain, args=(queue,)) for queue in queues]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(claimed) == sorted(job_ids)
+
+
+def test_live_lease_is_not_requeued(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+    first, second = JobQueue(db_path), JobQueue(db_path)
+    first.enqueue("invoice", {})
+
+    job = first.claim()
+    assert second.claim() is None
+    assert first.heartbeat(job["id"], job["owner"])
+    assert second.claim() is None
+
+
+def test_expired_lease_is_reclaimed_and_stale_owner_ignored(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+    first = JobQueue(db_path, lease_seconds=0.05)
+    second = JobQueue(db_path, lease_seconds=60)
+    job_id = first.enqueue("invoice", {})
+
+    stale = first.claim()
+    time.sleep(0.1)
+    fresh = second.claim()
+    assert fresh["id"] == job_id
+    assert fresh["attempts"] == 2
+    assert fresh["owner"] != stale["owner"]
+
+    assert not first.heartbeat(job_id, stale["owner"])
+    assert not first.complete(job_id, stale["owner"], {"ok": "stale"})
+    assert second.complete(job_id, fresh["owner"], {"ok": "fresh"})
+    assert second.get(job_id)["result"] == {"ok": "fresh"}
+
+
+def test_expired_lease_on_last_attempt_fails_the_job(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"), max_attempts=2, lease_seconds=0.05)
+    job_id = queue.enqueue("invoice", {})
+
+    for _ in range(2):
+        assert queue.claim()["id"] == job_id
+        time.sleep(0.1)
+
+    assert queue.claim() is None
+    job = queue.get(job_id)
+    assert job["status"] == "failed" and job["attempts"] == 2
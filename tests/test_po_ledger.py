@@ -0,0 +1,185 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+import blocking
+import po_ledger
+from po_ledger import PoLedger
+
+
+class FakeTable:
+    """Balances keyed by record id; `fail_reads`/`fail_writes` make the next calls raise"""
+
+    def __init__(self, balances):
+        self.balances = dict(balances)
+        self.fail_reads = 0
+        self.fail_writes = 0
+        # Like fail_writes, but the update is applied before the call fails
+        self.fail_after_writes = 0
+        self.writes = 0
+
+    def all(self, formula, fields):
+        if self.fail_reads:
+            self.fail_reads -= 1
+            raise ConnectionError("airtable read failed")
+        return [{"id": r, "fields": {"Balance": b}} for r, b in self.balances.items() if f"'{r}'" in formula]
+
+    def batch_update(self, records):
+        if self.fail_writes:
+            self.fail_writes -= 1
+            raise ConnectionError("airtable write failed")
+        self.writes += 1
+        for record in records:
+            self.balances[record["id"]] = record["fields"]["Balance"]
+        if self.fail_after_writes:
+            self.fail_after_writes -= 1
+            raise ConnectionError("airtable response lost")
+
+
+async def call(fn, *args, **kwargs):
+    return fn(*args, **kwargs)
+
+
+@pytest.fixture(autouse=True)
+def fresh_semaphores():
+    # run_blocking's semaphores belong to the loop that first used them
+    blocking._semaphores.clear()
+    yield
+    blocking._semaphores.clear()
+
+
+def make_ledger(tmp_path, table):
+    return PoLedger(str(tmp_path / "ledger.db"), lambda: table, call, flush_delay=0.01)
+
+
+def test_debits_to_one_po_share_a_write(tmp_path):
+    table = FakeTable({"recPO": 100})
+
+    async def main():
+        ledger = make_ledger(tmp_path, table)
+        return await asyncio.gather(*(ledger.debit("recPO", 10) for _ in range(5)))
+
+    assert asyncio.run(main()) == [50] * 5
+    assert table.balances["recPO"] == 50
+    assert table.writes == 1
+
+
+@pytest.mark.parametrize("failure", ["fail_reads", "fail_writes"])
+def test_failed_flush_rolls_back_and_retry_charges_once(tmp_path, failure):
+    table = FakeTable({"recPO": 100})
+    setattr(table, failure, 1)
+
+    async def main():
+        ledger = make_ledger(tmp_path, table)
+        with pytest.raises(ConnectionError):
+            await ledger.debit("recPO", 30, ref="inv-1")
+        # The failed debit must not be applied by a later flush
+        assert await ledger.flush() == 0
+        assert table.balances["recPO"] == 100
+        assert ledger.stats()["failed"] == 1
+
+        # A retry with the same ref re-arms it; a second retry replays it
+        assert await ledger.debit("recPO", 30, ref="inv-1") == 70
+        assert await ledger.debit("recPO", 30, ref="inv-1") == 70
+        return ledger.stats()
+
+    stats = asyncio.run(main())
+    assert table.balances["recPO"] == 70
+    assert stats["debits"] == 1 and stats["failed"] == 0 and stats["pending_pos"] == 0
+
+
+def test_flush_skips_pos_claimed_by_another_process(tmp_path):
+    table = FakeTable({"recPO": 100})
+
+    async def main():
+        first, second = make_ledger(tmp_path, table), make_ledger(tmp_path, table)
+        await blocking.run_blocking("ledger", first._append_debit, "recPO", 10, None)
+        # `first` is mid-flush for recPO; `second` must not touch it
+        assert await blocking.run_blocking("ledger", first._claim, "first-claim") == {"recPO": (10, 1)}
+        await blocking.run_blocking("ledger", second._append_debit, "recPO", 5, None)
+        assert await second.flush() == 0
+
+        waiter = asyncio.ensure_future(second.debit("recPO", 1))
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        table.batch_update([{"id": "recPO", "fields": {"Balance": 90}}])
+        await blocking.run_blocking("ledger", first._record_write, "first-claim", "recPO", 1, 100, 90)
+        # Once the claim is released, second's pending debits go out together
+        return await asyncio.wait_for(waiter, 5)
+
+    assert asyncio.run(main()) == 84
+    assert table.balances["recPO"] == 84
+
+
+def test_write_that_landed_before_the_call_failed_is_recorded(tmp_path):
+    table = FakeTable({"recPO": 100})
+    table.fail_after_writes = 1
+
+    async def main():
+        ledger = make_ledger(tmp_path, table)
+        balance = await ledger.debit("recPO", 30, ref="inv-1")
+        # Nothing is left to re-apply
+        assert await ledger.flush() == 0
+        return balance, ledger.stats()
+
+    balance, stats = asyncio.run(main())
+    assert balance == 70 and table.balances["recPO"] == 70
+    assert stats["writes"] == 1 and stats["unknown"] == 0 and stats["failed"] == 0
+
+
+@pytest.mark.parametrize("landed", [True, False])
+def test_stale_claim_is_settled_against_airtable(tmp_path, monkeypatch, landed):
+    table = FakeTable({"recPO": 100})
+
+    async def main():
+        dead, ledger = make_ledger(tmp_path, table), make_ledger(tmp_path, table)
+        await blocking.run_blocking("ledger", dead._append_debit, "recPO", 30, "inv-1")
+        await blocking.run_blocking("ledger", dead._claim, "dead-claim")
+        await blocking.run_blocking("ledger", dead._record_intent, "dead-claim", [("recPO", 100, 70)])
+        if landed:
+            # The process died after Airtable applied its write
+            table.batch_update([{"id": "recPO", "fields": {"Balance": 70}}])
+        monkeypatch.setattr(po_ledger, "CLAIM_TIMEOUT", -1)
+        await ledger.flush()
+        await ledger.flush()
+        return ledger.stats()
+
+    stats = asyncio.run(main())
+    assert table.balances["recPO"] == 70
+    assert stats["writes"] == 1 and stats["unknown"] == 0 and stats["pending_pos"] == 0
+
+
+def test_stale_claim_that_never_sent_is_requeued(tmp_path, monkeypatch):
+    table = FakeTable({"recPO": 100})
+
+    async def main():
+        dead, ledger = make_ledger(tmp_path, table), make_ledger(tmp_path, table)
+        await blocking.run_blocking("ledger", dead._append_debit, "recPO", 30, "inv-1")
+        await blocking.run_blocking("ledger", dead._claim, "dead-claim")
+        monkeypatch.setattr(po_ledger, "CLAIM_TIMEOUT", -1)
+        return await ledger.flush()
+
+    assert asyncio.run(main()) == 1
+    assert table.balances["recPO"] == 70 and table.writes == 1
+
+
+def test_failed_write_record_is_retried(tmp_path, monkeypatch):
+    table = FakeTable({"recPO": 100})
+
+    async def main():
+        ledger = make_ledger(tmp_path, table)
+        record_write = ledger._record_write
+        failures = [sqlite3.OperationalError("database is locked")]
+
+        def flaky(*args):
+            if failures:
+                raise failures.pop()
+            return record_write(*args)
+
+        monkeypatch.setattr(ledger, "_record_write", flaky)
+        return await ledger.debit("recPO", 30), ledger.stats()
+
+    balance, stats = asyncio.run(main())
+    assert balance == 70 and table.writes == 1
+    assert stats["writes"] == 1 and stats["pending_pos"] == 0